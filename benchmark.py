@@ -0,0 +1,633 @@
+"""
+Benchmarks for loading, displaying, filtering and PDF generation at scale.
+
+Synthetic fee workbooks with the columns create_receipt_pdf expects are
+generated at each size (1k, 10k and 100k rows by default) and reused between
+runs. Each benchmark reports its wall time and, unless --no-memory is given,
+the peak Python memory it allocated (tracemalloc, measured in a second run)
+and the process's peak RSS so far.
+
+    python benchmark.py                              # run and compare with benchmark_baseline.json
+    python benchmark.py --sizes 1000,10000 --save-baseline
+    python benchmark.py --only filter --tolerance 0.5
+    python benchmark.py --only startup --no-memory   # time to first window, target STARTUP_TARGET_MS
+    python benchmark.py --check-renderers            # canvas renderer draws the same pages as platypus
+
+A benchmark is reported as a regression when it is slower than the baseline by
+more than the tolerance; the exit status is then 1. Qt benchmarks run on the
+offscreen platform, so no display is needed.
+"""
+import os
+import sys
+import gc
+import json
+import time
+import random
+import argparse
+import datetime
+import tempfile
+import platform
+import subprocess
+import tracemalloc
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+DEFAULT_SIZES = [1000, 10000, 100000]
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmark_baseline.json')
+COLUMNS = ['Name', 'Admission Number', 'Class', 'Bank Reference ID',
+           'Order ID', 'Transaction ID', 'Status', 'Amount', 'Date']
+# Receipts generated by the PDF benchmarks, independent of the sheet size
+PDF_SINGLE_COUNT = 50
+PDF_BATCH_COUNT = 200
+# Scanned codes looked up by the exact-key benchmark
+LOOKUP_COUNT = 1000
+# The legacy per-cell QTableWidget is skipped above this size; it takes minutes
+LEGACY_TABLE_MAX_ROWS = 10000
+# Fresh app launches timed by the startup benchmark, and the time to first window it should stay under
+STARTUP_RUNS = 5
+STARTUP_TARGET_MS = 500
+
+
+# --- Synthetic data ---
+
+def _synthetic_rows(rows):
+    """The rows of the synthetic fee sheet, the same every time for a given size."""
+    rng = random.Random(rows)
+    first_names = ['Aarav', 'Diya', 'Kabir', 'Meera', 'Rohan', 'Saanvi', 'Vihaan', 'Ananya', 'Arjun', 'Isha']
+    last_names = ['Sharma', 'Verma', 'Gupta', 'Singh', 'Rawal', 'Mehta', 'Kapoor', 'Jain', 'Nair', 'Iyer']
+    classes = ['BCA', 'BBA', 'MBA', 'MCA', 'B.Com']
+    statuses = ['Success'] * 18 + ['Pending', 'Failed']
+    start = datetime.datetime(2025, 4, 1)
+    for i in range(rows):
+        yield [
+            f"{rng.choice(first_names)} {rng.choice(last_names)} {i}",
+            100000 + i,
+            rng.choice(classes),
+            rng.randrange(10 ** 9, 10 ** 10),
+            f"ORD{i:08d}",
+            f"TXN{rng.randrange(10 ** 11, 10 ** 12)}",
+            rng.choice(statuses),
+            rng.choice([65000, 130000, 97500.5]),
+            start + datetime.timedelta(days=rng.randrange(180)),
+        ]
+
+
+def synthetic_workbook(rows, work_dir):
+    """Returns the path of a synthetic fee workbook with `rows` rows, creating it on first use."""
+    path = os.path.join(work_dir, f"fees_{rows}.xlsx")
+    if os.path.exists(path):
+        return path
+
+    from openpyxl import Workbook
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet()
+    sheet.append(COLUMNS)
+    for row in _synthetic_rows(rows):
+        sheet.append(row)
+    tmp_path = path + '.tmp.xlsx'
+    workbook.save(tmp_path)
+    os.replace(tmp_path, path)
+    return path
+
+
+def synthetic_csv(rows, work_dir):
+    """Returns the path of the synthetic fee sheet as a CSV export (same rows as synthetic_workbook)."""
+    path = os.path.join(work_dir, f"fees_{rows}.csv")
+    if os.path.exists(path):
+        return path
+
+    import csv
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(COLUMNS)
+        writer.writerows(_synthetic_rows(rows))
+    os.replace(tmp_path, path)
+    return path
+
+
+# --- Legacy baselines ---
+# The table and filter code the app used before the model/view rewrite, kept here
+# only so the benchmarks have something to compare the current paths against.
+
+def _legacy_display_table_widget(file_path, table_widget, selection_handler, print_handler):
+    """Loads a workbook into a QTableWidget with one widget or item per cell."""
+    from PyQt5.QtCore import Qt
+    from PyQt5.QtWidgets import QCheckBox, QHBoxLayout, QPushButton, QTableWidgetItem, QWidget
+    from excel_loader import load_excel
+
+    # Clear the table before loading new data to prevent old data from persisting
+    table_widget.setRowCount(0)
+    table_widget.setColumnCount(0)
+
+    df = load_excel(file_path, use_cache=False, schema=None)
+
+    # Set column count to be DataFrame columns + checkbox + print button
+    table_widget.setColumnCount(df.shape[1] + 2)
+    table_widget.setRowCount(df.shape[0])
+
+    # Set headers, including one for the checkbox column
+    headers = ["Select"] + list(df.columns) + ["Action"]
+    table_widget.setHorizontalHeaderLabels(headers)
+
+    for row_idx in range(df.shape[0]):
+        # --- Checkbox Column ---
+        checkbox = QCheckBox()
+        # Make the checkbox larger and easier to click
+        checkbox.setStyleSheet("QCheckBox::indicator { width: 25px; height: 25px; }")
+        checkbox.stateChanged.connect(lambda state, r=row_idx: selection_handler(state, r))
+
+        # To center the checkbox, we place it inside a container widget with a layout
+        container = QWidget()
+        layout = QHBoxLayout(container)
+        layout.addWidget(checkbox)
+        layout.setAlignment(Qt.AlignCenter)
+        layout.setContentsMargins(0, 0, 0, 0)
+        table_widget.setCellWidget(row_idx, 0, container)
+
+        # --- Data Columns ---
+        for col_idx in range(df.shape[1]):
+            item = QTableWidgetItem(str(df.iloc[row_idx, col_idx]))
+            # Shifted one column right, after the checkbox column
+            table_widget.setItem(row_idx, col_idx + 1, item)
+
+        # --- Print Button Column ---
+        print_button = QPushButton("Print")
+        print_button.setMinimumHeight(30) # Increase button height
+        print_button.clicked.connect(lambda checked, r=row_idx: print_handler(r))
+        # Place button in the last column
+        table_widget.setCellWidget(row_idx, df.shape[1] + 1, print_button)
+
+    # Resize columns to fit content for better viewing
+    table_widget.resizeColumnsToContents()
+
+    # Set a minimum row height to ensure our larger widgets fit well
+    for i in range(table_widget.rowCount()):
+        table_widget.setRowHeight(i, 40)
+
+    return df
+
+
+def _legacy_filter_by_name(table_view, search_text, name_column_index):
+    """Hides the rows of a model-backed view whose name does not contain the text, one row at a time."""
+    from PyQt5.QtCore import Qt
+    search_text = search_text.lower()
+    model = table_view.model()
+    for row_idx in range(model.rowCount()):
+        text = model.index(row_idx, name_column_index).data(Qt.DisplayRole)
+        table_view.setRowHidden(row_idx, not (text is not None and search_text in text.lower()))
+
+
+# --- Benchmarks ---
+# Each benchmark takes a context dict and returns a function that does the timed work.
+# Shared objects (the DataFrame, a Qt application) are prepared outside the timed function.
+
+_app = None
+
+
+def _qt_app():
+    global _app
+    from PyQt5.QtWidgets import QApplication
+    # Keep a reference, or the application is destroyed as soon as this returns
+    _app = QApplication.instance() or QApplication([])
+    return _app
+
+
+def _dataframe(ctx):
+    if 'df' not in ctx:
+        import pandas as pd
+        ctx['df'] = pd.read_excel(ctx['path'])
+    return ctx['df']
+
+
+def bench_read_excel(ctx):
+    import pandas as pd
+    return lambda: pd.read_excel(ctx['path'])
+
+
+def bench_load_all_columns(ctx):
+    """excel_loader.load_excel keeping every column as read (object dtypes)."""
+    from excel_loader import load_excel
+    return lambda: load_excel(ctx['path'], use_cache=False, schema=None)
+
+
+def bench_load_compact(ctx):
+    """excel_loader.load_excel with the receipt schema: projected columns, categoricals, numbers, dates."""
+    from excel_loader import load_excel
+    return lambda: load_excel(ctx['path'], use_cache=False)
+
+
+def bench_load_csv(ctx):
+    """excel_loader.load_excel on the same sheet exported as CSV (pyarrow, multithreaded), receipt schema."""
+    from excel_loader import load_excel
+    path = synthetic_csv(ctx['rows'], ctx['work_dir'])
+    return lambda: load_excel(path, use_cache=False)
+
+
+def bench_display_model(ctx):
+    """display_excel_data into a QTableView (DataFrame-backed model)."""
+    _qt_app()
+    from PyQt5.QtWidgets import QTableView
+    from excel_viewer import display_excel_data
+    view = QTableView()
+    return lambda: display_excel_data(ctx['path'], view, lambda *a: None, lambda *a: None)
+
+
+def bench_display_legacy(ctx):
+    """The legacy QTableWidget baseline (one widget per cell)."""
+    if ctx['rows'] > LEGACY_TABLE_MAX_ROWS:
+        return None
+    _qt_app()
+    from PyQt5.QtWidgets import QTableWidget
+    table = QTableWidget()
+    return lambda: _legacy_display_table_widget(ctx['path'], table, lambda *a: None, lambda *a: None)
+
+
+KEYSTROKES = "aarav sharma 1"
+
+
+def bench_filter_legacy(ctx):
+    """The legacy per-row filter per keystroke on a model-backed view."""
+    _qt_app()
+    from PyQt5.QtWidgets import QTableView
+    from excel_viewer import display_dataframe
+    view = QTableView()
+    display_dataframe(_dataframe(ctx), view, lambda *a: None, lambda *a: None)
+    name_column = _dataframe(ctx).columns.get_loc('Name') + 1
+
+    # The view owns the model; keep it alive for as long as the benchmark runs
+    ctx['_view'] = view
+
+    def run():
+        for i in range(1, len(KEYSTROKES) + 1):
+            _legacy_filter_by_name(view, KEYSTROKES[:i], name_column)
+    return run, len(KEYSTROKES)
+
+
+def bench_filter_indexed(ctx):
+    """NameSearchIndex + IndexFilterProxyModel per keystroke."""
+    _qt_app()
+    from PyQt5.QtWidgets import QTableView
+    from excel_viewer import display_dataframe
+    from table_filter import NameSearchIndex, IndexFilterProxyModel
+    view = QTableView()
+    proxy = IndexFilterProxyModel()
+    display_dataframe(_dataframe(ctx), view, lambda *a: None, lambda *a: None, proxy_model=proxy)
+    ctx['_view'] = view
+
+    def run():
+        index = NameSearchIndex(_dataframe(ctx)['Name'])
+        for i in range(1, len(KEYSTROKES) + 1):
+            proxy.set_visible_rows(index.match(KEYSTROKES[:i]))
+    return run, len(KEYSTROKES)
+
+
+def _key_index(ctx):
+    if 'key_index' not in ctx:
+        from table_filter import KeyLookupIndex
+        ctx['key_index'] = KeyLookupIndex(_dataframe(ctx))
+    return ctx['key_index']
+
+
+def bench_lookup_build(ctx):
+    """KeyLookupIndex over the identifier columns, built once per load."""
+    from table_filter import KeyLookupIndex
+    df = _dataframe(ctx)
+    return (lambda: KeyLookupIndex(df)), len(df)
+
+
+def bench_lookup_exact(ctx):
+    """KeyLookupIndex.lookup, one scanned transaction ID at a time."""
+    index = _key_index(ctx)
+    codes = _dataframe(ctx)['Transaction ID'].astype(str).sample(LOOKUP_COUNT, replace=True, random_state=0).tolist()
+
+    def run():
+        for code in codes:
+            index.lookup(code)
+    return run, len(codes)
+
+
+def bench_lookup_fuzzy(ctx):
+    """KeyLookupIndex.closest for a mistyped transaction ID (the fallback after a miss)."""
+    index = _key_index(ctx)
+    code = str(_dataframe(ctx)['Transaction ID'].iloc[-1])
+    mistyped = code[:-2] + code[-1] + code[-2]
+    return (lambda: index.closest(mistyped)), 1
+
+
+def bench_selection_bulk(ctx):
+    """Select all, invert, select a class and clear on the model behind a filtered view."""
+    _qt_app()
+    from PyQt5.QtWidgets import QTableView
+    from excel_viewer import display_dataframe
+    from table_filter import NameSearchIndex, IndexFilterProxyModel
+    view = QTableView()
+    proxy = IndexFilterProxyModel()
+    model = display_dataframe(_dataframe(ctx), view, None, lambda *a: None, proxy_model=proxy)
+    proxy.set_visible_rows(NameSearchIndex(_dataframe(ctx)['Name']).match(KEYSTROKES[:2]))
+    ctx['_view'] = view
+
+    def run():
+        model.select_all()
+        model.invert_selection(proxy.visible_source_rows())
+        model.select_matching('Class', 'BCA')
+        model.clear_selection()
+    return run, 4
+
+
+def _ledger(ctx, name):
+    from receipt_ledger import ReceiptLedger
+    return ReceiptLedger(os.path.join(tempfile.mkdtemp(dir=ctx['work_dir']), name))
+
+
+def bench_ledger_import(ctx):
+    """ReceiptLedger.import_frame of the whole sheet into an empty ledger (upserts keyed on transaction ID)."""
+    df = _dataframe(ctx)
+
+    def run():
+        ledger = _ledger(ctx, 'import.sqlite3')
+        ledger.import_frame(df, ctx['path'], 'Sheet1')
+        ledger.close()
+    return run, len(df)
+
+
+def bench_ledger_search(ctx):
+    """ReceiptLedger.count plus the first page, per keystroke, as the ledger window searches."""
+    ledger = _ledger(ctx, 'search.sqlite3')
+    ledger.import_frame(_dataframe(ctx), ctx['path'], 'Sheet1')
+    ctx['_ledger'] = ledger
+
+    def run():
+        for i in range(1, len(KEYSTROKES) + 1):
+            ledger.count(KEYSTROKES[:i])
+            ledger.page(KEYSTROKES[:i])
+    return run, len(KEYSTROKES)
+
+
+def bench_prepare_per_row(ctx):
+    """Receipt field text built row by row from to_dict('records'), as batches did before receipt_prepare."""
+    from pdf_generator import receipt_field_values
+    df = _dataframe(ctx)
+    return (lambda: [receipt_field_values(record) for record in df.to_dict('records')]), len(df)
+
+
+def bench_prepare_vectorized(ctx):
+    """receipt_prepare.prepare_receipts: every field formatted and every row checked, one pass per column."""
+    from receipt_prepare import prepare_receipts
+    df = _dataframe(ctx)
+    return (lambda: prepare_receipts(df)), len(df)
+
+
+def _records(ctx, count):
+    return _dataframe(ctx).head(count).to_dict('records')
+
+
+def bench_pdf_single(ctx):
+    """create_receipt_pdf, one file per receipt, in this process."""
+    from pdf_generator import create_receipt_pdf
+    records = _records(ctx, PDF_SINGLE_COUNT)
+    out_dir = tempfile.mkdtemp(dir=ctx['work_dir'])
+
+    def run():
+        for i, record in enumerate(records):
+            create_receipt_pdf(record, os.path.join(out_dir, f"receipt_{i}.pdf"))
+    return run, len(records)
+
+
+def bench_pdf_parallel(ctx):
+    """receipt_batch.generate_receipts across one process per core."""
+    from receipt_batch import generate_receipts, default_worker_count
+    records = _records(ctx, PDF_BATCH_COUNT)
+    out_dir = tempfile.mkdtemp(dir=ctx['work_dir'])
+    jobs = [(i, record, os.path.join(out_dir, f"receipt_{i}.pdf")) for i, record in enumerate(records)]
+    return (lambda: generate_receipts(jobs, max_workers=default_worker_count())), len(jobs)
+
+
+def bench_pdf_zip_archive(ctx):
+    """receipt_batch.generate_receipts rendering in memory into one ZIP archive."""
+    from receipt_batch import generate_receipts, default_worker_count
+    from receipt_sink import ZipSink
+    records = _records(ctx, PDF_BATCH_COUNT)
+    out_path = os.path.join(tempfile.mkdtemp(dir=ctx['work_dir']), "receipts.zip")
+    jobs = [(i, record, f"receipt_{i}.pdf") for i, record in enumerate(records)]
+
+    def run():
+        sink = ZipSink(out_path)
+        generate_receipts(jobs, max_workers=default_worker_count(), sink=sink)
+        sink.close()
+    return run, len(jobs)
+
+
+def bench_pdf_batch_document(ctx):
+    """create_receipts_batch_pdf, every receipt as a page of one file."""
+    from pdf_generator import create_receipts_batch_pdf
+    records = _records(ctx, PDF_BATCH_COUNT)
+    out_path = os.path.join(tempfile.mkdtemp(dir=ctx['work_dir']), "batch.pdf")
+    return (lambda: create_receipts_batch_pdf(records, out_path)), len(records)
+
+
+def _render_benchmark(renderer):
+    def bench_render(ctx):
+        from pdf_generator import default_template
+        import io
+        template = default_template(renderer)
+        records = _records(ctx, PDF_SINGLE_COUNT)
+
+        def run():
+            for record in records:
+                template.build(record, io.BytesIO())
+        return run, len(records)
+    bench_render.__doc__ = f"One receipt at a time into memory with the {renderer} renderer."
+    return bench_render
+
+
+def bench_preview_render(ctx):
+    """ReceiptPreviewRenderer painting one receipt into a QImage (no PDF, nothing on disk)."""
+    _qt_app()
+    from receipt_preview import ReceiptPreviewRenderer
+    renderer = ReceiptPreviewRenderer()
+    values = [renderer.field_values(record) for record in _records(ctx, PDF_SINGLE_COUNT)]
+    width, _ = renderer.size_for(600, 800)
+
+    def run():
+        for receipt in values:
+            renderer.render(receipt, width)
+    return run, len(values)
+
+
+def bench_startup(ctx):
+    """main.py launched in a fresh interpreter until its window is first painted."""
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'main.py')
+
+    def run():
+        for _ in range(STARTUP_RUNS):
+            output = subprocess.run([sys.executable, script, '--measure-startup'],
+                                    capture_output=True, text=True, check=True).stdout
+            first_paint_ms = json.loads(output.strip().splitlines()[-1])['first_paint_ms']
+            if first_paint_ms > STARTUP_TARGET_MS:
+                print(f"SLOW_STARTUP: first window after {first_paint_ms} ms (target {STARTUP_TARGET_MS} ms)",
+                      file=sys.stderr)
+    return run, STARTUP_RUNS
+
+
+# (name, setup function, whether it depends on the sheet size)
+BENCHMARKS = [
+    ('startup.first_paint', bench_startup, False),
+    ('read_excel', bench_read_excel, True),
+    ('load.all_columns', bench_load_all_columns, True),
+    ('load.compact', bench_load_compact, True),
+    ('load.csv', bench_load_csv, True),
+    ('display.model', bench_display_model, True),
+    ('display.legacy_widgets', bench_display_legacy, True),
+    ('filter.legacy_per_keystroke', bench_filter_legacy, True),
+    ('filter.indexed_per_keystroke', bench_filter_indexed, True),
+    ('selection.bulk_action', bench_selection_bulk, True),
+    ('lookup.build_index', bench_lookup_build, True),
+    ('lookup.exact_key', bench_lookup_exact, True),
+    ('lookup.fuzzy_fallback', bench_lookup_fuzzy, True),
+    ('ledger.import', bench_ledger_import, True),
+    ('ledger.search_per_keystroke', bench_ledger_search, True),
+    ('prepare.per_row', bench_prepare_per_row, True),
+    ('prepare.vectorized', bench_prepare_vectorized, True),
+    ('pdf.single', bench_pdf_single, False),
+    ('pdf.parallel_batch', bench_pdf_parallel, False),
+    ('pdf.zip_archive', bench_pdf_zip_archive, False),
+    ('pdf.batch_document', bench_pdf_batch_document, False),
+    ('pdf.render.platypus', _render_benchmark('platypus'), False),
+    ('pdf.render.canvas', _render_benchmark('canvas'), False),
+    ('preview.render', bench_preview_render, False),
+]
+
+
+# --- Runner ---
+
+def measure(setup, ctx, with_memory):
+    """Runs one benchmark. Returns a result dict, or None if the benchmark does not apply."""
+    prepared = setup(ctx)
+    if prepared is None:
+        return None
+    run, units = prepared if isinstance(prepared, tuple) else (prepared, 1)
+
+    gc.collect()
+    started = time.perf_counter()
+    run()
+    elapsed = time.perf_counter() - started
+    result = {'seconds': round(elapsed, 6), 'per_unit_ms': round(elapsed / units * 1000, 3), 'units': units}
+
+    if with_memory:
+        gc.collect()
+        tracemalloc.start()
+        run()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        result['peak_mb'] = round(peak / (1024 * 1024), 2)
+
+    try:
+        import resource
+        # High-water mark of the whole process so far, including Qt's C++ allocations
+        maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        result['process_peak_rss_mb'] = round(maxrss / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+    except ImportError:  # Windows
+        pass
+    return result
+
+
+# --- Renderer equivalence ---
+
+def check_renderers():
+    """
+    Runs tests/test_renderers.py, which checks pixel by pixel that the canvas
+    renderer draws exactly what the platypus renderer draws.
+
+    Returns:
+        int: pytest's exit code; 0 if every case matched.
+    """
+    import pytest
+    return int(pytest.main(['-q', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'tests', 'test_renderers.py')]))
+
+
+def compare(results, baseline, tolerance):
+    """Returns the names of benchmarks that got slower than the baseline by more than the tolerance."""
+    regressions = []
+    for name, result in results.items():
+        previous = baseline.get(name)
+        if previous is None:
+            continue
+        # Per-unit time is compared so runs with different receipt counts stay comparable
+        if result['per_unit_ms'] > previous['per_unit_ms'] * (1 + tolerance):
+            regressions.append(name)
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark loading, display, filtering and PDF generation.")
+    parser.add_argument('--sizes', default=','.join(map(str, DEFAULT_SIZES)),
+                        help="Comma-separated sheet sizes in rows (default: %(default)s).")
+    parser.add_argument('--only', help="Run only benchmarks whose name contains this text.")
+    parser.add_argument('--work-dir', default=os.path.join(tempfile.gettempdir(), 'fee-receipt-bench'),
+                        help="Where synthetic workbooks and output PDFs are kept (default: %(default)s).")
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help="Baseline file to compare with (default: %(default)s).")
+    parser.add_argument('--save-baseline', action='store_true', help="Write this run's results as the new baseline.")
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help="Allowed slowdown before a benchmark counts as a regression (default: %(default)s).")
+    parser.add_argument('--no-memory', action='store_true', help="Skip the peak memory measurement (halves the run time).")
+    parser.add_argument('--json', metavar='FILE', help="Also write the results to this file.")
+    parser.add_argument('--check-renderers', action='store_true',
+                        help="Only check that the canvas and platypus renderers produce identical pages.")
+    args = parser.parse_args(argv)
+
+    # Benchmark the modules next to this script, not an installed copy
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    if args.check_renderers:
+        return check_renderers()
+    os.makedirs(args.work_dir, exist_ok=True)
+    sizes = [int(size) for size in args.sizes.split(',') if size]
+    selected = [b for b in BENCHMARKS if not args.only or args.only in b[0]]
+
+    results = {}
+    for size in sizes:
+        ctx = {'rows': size, 'work_dir': args.work_dir, 'path': synthetic_workbook(size, args.work_dir)}
+        for name, setup, sized in selected:
+            # Size-independent benchmarks only need to run once
+            if not sized and size != sizes[0]:
+                continue
+            key = f"{name}@{size}" if sized else name
+            result = measure(setup, ctx, with_memory=not args.no_memory)
+            if result is None:
+                continue
+            results[key] = result
+            memory = f"{result['peak_mb']:>9.1f} MB" if 'peak_mb' in result else ''
+            print(f"{key:<42} {result['seconds']:>10.3f} s {result['per_unit_ms']:>12.3f} ms/unit {memory}", flush=True)
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f).get('results', {})
+
+    regressions = compare(results, baseline, args.tolerance)
+    for name in regressions:
+        print(f"REGRESSION: {name} took {results[name]['per_unit_ms']} ms/unit, "
+              f"baseline {baseline[name]['per_unit_ms']} ms/unit", file=sys.stderr)
+
+    report = {
+        'created': datetime.datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'machine': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'results': results,
+    }
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+    if args.save_baseline:
+        # Keep entries for benchmarks that were not part of this run
+        report['results'] = {**baseline, **results}
+        with open(args.baseline, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Baseline written to {args.baseline}")
+
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,344 @@
+import os
+from collections import namedtuple
+import pandas as pd
+import workbook_cache
+from receipt_schema import RECEIPT_SCHEMA, apply_schema, concat_frames
+from instrumentation import span
+
+# Rows per chunk once the first rows are on screen.
+DEFAULT_CHUNK_SIZE = 2000
+# The first chunk is kept small so the table can show data almost immediately.
+FIRST_CHUNK_SIZE = 200
+# Bytes of a CSV file parsed per block; pyarrow parses blocks on several threads.
+CSV_BLOCK_SIZE = 4 * 1024 * 1024
+
+
+def _column_names(header_row):
+    """Builds column names from the header row the same way pd.read_excel does for blank headers."""
+    return [str(name) if name not in (None, '') else f"Unnamed: {i}" for i, name in enumerate(header_row)]
+
+
+def _projection(columns, schema):
+    """The positions of the schema's columns in the sheet, or None to keep every column."""
+    if schema is None:
+        return None
+    keep = [i for i, name in enumerate(columns) if name in schema]
+    # A sheet with none of the expected headers is shown as it is rather than as an empty table
+    return keep or None
+
+
+def _to_frame(rows, columns, schema):
+    frame = pd.DataFrame(rows, columns=columns)
+    return apply_schema(frame, schema) if schema is not None else frame
+
+
+def _iter_worksheet_chunks(sheet, chunk_size, first_chunk_size, schema=None):
+    rows = sheet.iter_rows(values_only=True)
+    header = next(rows, None)
+    if header is None:
+        yield pd.DataFrame(), 0, 0
+        return
+
+    columns = _column_names(header)
+    keep = _projection(columns, schema)
+    if keep is None:
+        schema = None
+    else:
+        columns = [columns[i] for i in keep]
+    # max_row comes from the sheet's dimension record and may be missing
+    total_rows = max((sheet.max_row or 0) - 1, 0)
+    rows_read = 0
+    buffer = []
+    limit = first_chunk_size or chunk_size
+
+    for row in rows:
+        # Skip completely blank rows, as pd.read_excel does at the end of a sheet
+        if all(value is None for value in row):
+            continue
+        # Read-only sheets without a dimension record can yield ragged rows
+        if keep is not None:
+            # Only the projected cells are kept, so unused columns never become Python objects
+            width = len(row)
+            buffer.append(tuple(row[i] if i < width else None for i in keep))
+        else:
+            if len(row) < len(columns):
+                row = row + (None,) * (len(columns) - len(row))
+            buffer.append(row[:len(columns)])
+        if len(buffer) >= limit:
+            rows_read += len(buffer)
+            yield _to_frame(buffer, columns, schema), rows_read, max(total_rows, rows_read)
+            buffer = []
+            limit = chunk_size
+
+    if buffer or rows_read == 0:
+        rows_read += len(buffer)
+        yield _to_frame(buffer, columns, schema), rows_read, rows_read
+
+
+def _iter_xlsx_chunks(file_path, chunk_size, first_chunk_size, schema=None):
+    # openpyxl is only needed for the streamed path, so import it on first use
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        yield from _iter_worksheet_chunks(workbook.active, chunk_size, first_chunk_size, schema)
+    finally:
+        workbook.close()
+
+
+def _iter_xlsx_sheets(file_path, chunk_size, schema=None):
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        for sheet in workbook.worksheets:
+            for chunk, _, _ in _iter_worksheet_chunks(sheet, chunk_size, None, schema):
+                yield sheet.title, chunk
+    finally:
+        workbook.close()
+
+
+def _read_excel_frame(df, schema):
+    if _projection(list(df.columns), schema) is not None:
+        df = apply_schema(df, schema)
+    return df
+
+
+def _iter_read_excel_chunks(file_path, chunk_size, first_chunk_size, schema=None):
+    # pd.read_excel picks the engine from the extension (xlrd for .xls, odfpy for .ods)
+    df = _read_excel_frame(pd.read_excel(file_path), schema)
+    yield df, len(df), len(df)
+
+
+def _iter_read_excel_sheets(file_path, chunk_size, schema=None):
+    for sheet_name, df in pd.read_excel(file_path, sheet_name=None).items():
+        yield str(sheet_name), _read_excel_frame(df, schema)
+
+
+def _csv_header(file_path):
+    import csv
+    with open(file_path, newline='', encoding='utf-8-sig') as f:
+        return next(csv.reader(f), None)
+
+
+def _iter_csv_blocks(file_path, columns, keep):
+    """Yields a CSV file's rows as DataFrames of text (None for empty cells), one per parsed block."""
+    usecols = [columns[i] for i in keep] if keep is not None else None
+    try:
+        import pyarrow as pa
+        from pyarrow import csv as pa_csv
+    except ImportError:
+        pa_csv = None
+    if pa_csv is None:
+        # Without pyarrow, pandas' (single-threaded) parser reads the same text columns
+        yield from pd.read_csv(file_path, names=columns, header=0, usecols=usecols, dtype=str, keep_default_na=False,
+                               na_values=[''], encoding='utf-8-sig', chunksize=DEFAULT_CHUNK_SIZE * 10)
+        return
+
+    # Every cell is read as text, as typed; the schema gives the receipt columns their types afterwards
+    read_options = pa_csv.ReadOptions(use_threads=True, block_size=CSV_BLOCK_SIZE, skip_rows=1, column_names=columns)
+    convert_options = pa_csv.ConvertOptions(column_types={name: pa.string() for name in columns},
+                                            include_columns=usecols, strings_can_be_null=True)
+    for batch in pa_csv.open_csv(file_path, read_options=read_options, convert_options=convert_options):
+        yield batch.to_pandas()
+
+
+def _csv_frame(frame, schema):
+    """Types a block of CSV text like the same rows read from a workbook."""
+    # Skip completely blank rows, as the workbook readers do
+    frame = frame.dropna(how='all').reset_index(drop=True)
+    if schema is None:
+        return frame
+    columns = {}
+    for column in frame.columns:
+        values = frame[column]
+        if schema.get(column) == 'datetime':
+            # ISO dates become dates, as Excel stores them; other spellings are kept as text
+            dates = pd.to_datetime(values, errors='coerce', format='ISO8601')
+            if dates.count() == values.count():
+                values = dates
+        columns[column] = values
+    return apply_schema(pd.DataFrame(columns), schema)
+
+
+def _iter_csv_chunks(file_path, chunk_size, first_chunk_size, schema=None):
+    header = _csv_header(file_path)
+    if not header:
+        yield pd.DataFrame(), 0, 0
+        return
+
+    columns = _column_names(header)
+    keep = _projection(columns, schema)
+    if keep is None:
+        schema = None
+    total_bytes = max(os.path.getsize(file_path), 1)
+    rows_parsed = 0
+    bytes_parsed = 0
+    rows_read = 0
+    limit = first_chunk_size or chunk_size
+    buffer = None
+
+    for block in _iter_csv_blocks(file_path, columns, keep):
+        block = _csv_frame(block, schema)
+        rows_parsed += len(block)
+        bytes_parsed = min(bytes_parsed + CSV_BLOCK_SIZE, total_bytes)
+        # The total is estimated from the share of the file parsed so far
+        total_rows = int(rows_parsed * total_bytes / bytes_parsed)
+        buffer = block if buffer is None else concat_frames([buffer, block])
+        while len(buffer) >= limit:
+            chunk, buffer = buffer.iloc[:limit].reset_index(drop=True), buffer.iloc[limit:]
+            rows_read += len(chunk)
+            yield chunk, rows_read, max(total_rows, rows_read)
+            limit = chunk_size
+
+    if (buffer is not None and len(buffer)) or rows_read == 0:
+        chunk = buffer.reset_index(drop=True) if buffer is not None else pd.DataFrame(
+            columns=[columns[i] for i in keep] if keep is not None else columns)
+        rows_read += len(chunk)
+        yield chunk, rows_read, rows_read
+
+
+def _iter_csv_sheets(file_path, chunk_size, schema=None):
+    # A CSV file is a single sheet without a name
+    for chunk, _, _ in _iter_csv_chunks(file_path, chunk_size, None, schema):
+        yield '', chunk
+
+
+# --- Loaders by file extension ---
+
+# How a file format is read:
+#   iter_chunks(file_path, chunk_size, first_chunk_size, schema) yields (chunk, rows read, estimated total)
+#     for the first sheet;
+#   iter_sheets(file_path, chunk_size, schema) yields (sheet name, chunk) for every sheet;
+#   cacheable tells whether parsed copies are worth keeping in workbook_cache.
+Loader = namedtuple('Loader', ['description', 'extensions', 'iter_chunks', 'iter_sheets', 'cacheable'])
+
+LOADERS = {}  # Lowercase extension (".csv") -> Loader
+
+
+def register_loader(description, extensions, iter_chunks, iter_sheets, cacheable=True):
+    """
+    Makes iter_excel_chunks, load_excel and iter_sheet_chunks read files with these
+    extensions with the given functions (see Loader), replacing any earlier loader.
+
+    Args:
+        description (str): The format's name in file dialogs, e.g. "CSV Files".
+        extensions (tuple): File extensions with the dot, e.g. ('.csv',).
+        iter_chunks (callable): Reads the first sheet in chunks.
+        iter_sheets (callable): Reads every sheet.
+        cacheable (bool): False for formats that parse about as fast as the cache loads.
+    """
+    loader = Loader(description, tuple(extension.lower() for extension in extensions), iter_chunks, iter_sheets,
+                    cacheable)
+    for extension in loader.extensions:
+        LOADERS[extension] = loader
+
+
+register_loader("Excel Workbooks", ('.xlsx', '.xlsm'), _iter_xlsx_chunks, _iter_xlsx_sheets)
+register_loader("Excel 97-2003 Workbooks", ('.xls',), _iter_read_excel_chunks, _iter_read_excel_sheets)
+register_loader("OpenDocument Spreadsheets", ('.ods',), _iter_read_excel_chunks, _iter_read_excel_sheets)
+register_loader("CSV Files", ('.csv',), _iter_csv_chunks, _iter_csv_sheets, cacheable=False)
+
+
+def loader_for(file_path):
+    """
+    Returns the Loader for a file, chosen by its extension.
+
+    Raises:
+        ValueError: If no loader handles the file's extension.
+    """
+    extension = os.path.splitext(file_path)[1].lower()
+    loader = LOADERS.get(extension)
+    if loader is None:
+        raise ValueError(f"Unsupported file type '{extension or os.path.basename(file_path)}' "
+                         f"(expected one of: {', '.join(sorted(LOADERS))})")
+    return loader
+
+
+def file_dialog_filter():
+    """The name filters for a file dialog: every supported format together, then each format on its own."""
+    def patterns(extensions):
+        return ' '.join(f"*{extension}" for extension in extensions)
+
+    filters = [f"Fee Sheets ({patterns(LOADERS)})"]
+    filters += [f"{loader.description} ({patterns(loader.extensions)})" for loader in dict.fromkeys(LOADERS.values())]
+    return ';;'.join(filters)
+
+
+def iter_excel_chunks(file_path, chunk_size=DEFAULT_CHUNK_SIZE, first_chunk_size=FIRST_CHUNK_SIZE, use_cache=True,
+                      schema=RECEIPT_SCHEMA):
+    """
+    Reads the first sheet of a workbook (or a CSV export) in chunks without loading it all at once.
+
+    The reader is picked by the file's extension (see LOADERS): .xlsx files are
+    streamed with openpyxl in read-only mode, CSV files are parsed block by block
+    on several threads by pyarrow, and .xls/.ods files go through pd.read_excel
+    and arrive as a single chunk. With use_cache, a workbook that was parsed
+    before is served whole from its sidecar in workbook_cache, and a workbook
+    read to the end is written to the cache for next time.
+
+    With a schema (see receipt_schema) only its columns are kept, each with a
+    compact dtype; a sheet that has none of them is read as it is. Chunks read
+    this way should be joined with receipt_schema.concat_frames.
+
+    Args:
+        file_path (str): The path to the workbook or CSV file.
+        chunk_size (int): The number of rows per chunk.
+        first_chunk_size (int): The number of rows in the first chunk, or None to use chunk_size.
+        use_cache (bool): Whether to read from and write to the sidecar cache.
+        schema (dict, optional): Column name -> storage kind, or None to keep every column as read.
+    Yields:
+        tuple: (pd.DataFrame chunk, rows read so far, estimated total rows)
+    """
+    if not os.path.exists(file_path):
+        raise FileNotFoundError(file_path)
+
+    loader = loader_for(file_path)
+    if not use_cache or not loader.cacheable:
+        yield from loader.iter_chunks(file_path, chunk_size, first_chunk_size, schema)
+        return
+
+    with span('load.cache_lookup', 'load') as lookup_span:
+        # Compact and full reads of the same file are cached separately
+        key = workbook_cache.cache_key(file_path, variant=repr(sorted(schema.items())) if schema else '')
+        cached = workbook_cache.load_cached(file_path, key=key)
+        lookup_span.set(hit=cached is not None)
+    if cached is not None:
+        yield cached, len(cached), len(cached)
+        return
+
+    chunks = []
+    for chunk, rows_read, total_rows in loader.iter_chunks(file_path, chunk_size, first_chunk_size, schema):
+        chunks.append(chunk)
+        yield chunk, rows_read, total_rows
+    # Only reached when the caller consumed every chunk, so partial loads are never cached
+    with span('load.cache_store', 'load'):
+        workbook_cache.store(file_path, concat_frames(chunks), key=key)
+
+
+def load_excel(file_path, use_cache=True, schema=RECEIPT_SCHEMA):
+    """Reads the whole first sheet of a workbook (or a whole CSV file) into one DataFrame."""
+    chunks = [chunk for chunk, _, _ in iter_excel_chunks(file_path, first_chunk_size=None, use_cache=use_cache,
+                                                         schema=schema)]
+    return concat_frames(chunks)
+
+
+def iter_sheet_chunks(file_path, chunk_size=DEFAULT_CHUNK_SIZE, schema=RECEIPT_SCHEMA):
+    """
+    Reads every sheet of a workbook in chunks, one sheet after another.
+
+    Unlike iter_excel_chunks this does not use the sidecar cache, which only
+    holds the first sheet. Columns are kept as in iter_excel_chunks: with a
+    schema, a sheet that has none of its columns is read as it is.
+
+    Args:
+        file_path (str): The path to the workbook or CSV file (a single sheet named '').
+        chunk_size (int): The number of rows per chunk (.xlsx and CSV; other formats arrive a sheet at a time).
+        schema (dict, optional): Column name -> storage kind, or None to keep every column as read.
+    Yields:
+        tuple: (sheet name, pd.DataFrame chunk)
+    """
+    if not os.path.exists(file_path):
+        raise FileNotFoundError(file_path)
+
+    yield from loader_for(file_path).iter_sheets(file_path, chunk_size, schema)
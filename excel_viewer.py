@@ -1,15 +1,289 @@
+import numpy as np
 import pandas as pd
-from PyQt5.QtWidgets import QTableWidget, QTableWidgetItem, QMessageBox, QCheckBox, QPushButton, QWidget, QHBoxLayout
-from PyQt5.QtCore import Qt
+from PyQt5.QtWidgets import (QMessageBox, QStyledItemDelegate, QStyleOptionButton, QStyle, QApplication)
+from PyQt5.QtCore import Qt, QAbstractTableModel, QModelIndex, QVariant, QEvent, pyqtSignal
+from workbook_diff import merged_frame, runs
+from receipt_schema import concat_frames, cell_text
+from excel_loader import load_excel
+from selection_store import SelectionStore
 
-def display_excel_data(file_path, table_widget, selection_handler, print_handler):
+
+class DataFrameTableModel(QAbstractTableModel):
+    """
+    A read-only table model that serves cells straight from a DataFrame.
+
+    Column 0 is the "Select" checkbox column (Qt.CheckStateRole), the DataFrame
+    columns follow, and the last column is the "Action" column painted by
+    PrintButtonDelegate. Nothing is materialized per row, so the view only asks
+    for the cells that are actually visible.
+
+    The checkboxes are backed by a SelectionStore. The bulk selection methods
+    change any number of rows in one step and refresh the view once.
+
+    Signals:
+        selection_changed: Emitted after any change to which rows are checked.
+    """
+    selection_changed = pyqtSignal()
+
+    # More separate blocks of removed rows than this and apply_diff resets the model instead
+    MAX_REMOVAL_RUNS = 50
+
+    def __init__(self, df: pd.DataFrame, selection_handler=None, parent=None):
+        super().__init__(parent)
+        self._df = df
+        self.selection = SelectionStore(df.shape[0])
+        self._selection_handler = selection_handler
+
+    @property
+    def df(self):
+        return self._df
+
+    def append_frame(self, chunk: pd.DataFrame):
+        """Appends a block of rows with the same columns, e.g. the next chunk of a background load."""
+        if chunk.empty:
+            return
+        first = self._df.shape[0]
+        self.beginInsertRows(QModelIndex(), first, first + chunk.shape[0] - 1)
+        self._df = concat_frames([self._df, chunk])
+        self.selection.append(chunk.shape[0])
+        self.endInsertRows()
+
+    def apply_diff(self, new_df: pd.DataFrame, diff):
+        """
+        Brings the model up to date with a re-read sheet, touching only the rows that changed.
+
+        Removed rows are taken out, changed rows are refreshed in place and new rows
+        are appended, so checked rows stay checked and views keep their position.
+
+        Args:
+            new_df (pd.DataFrame): The re-read sheet.
+            diff (WorkbookDiff): The changes between the current rows and new_df.
+        """
+        merged = merged_frame(new_df, diff)
+        removal_runs = runs(diff.removed)
+        if len(removal_runs) > self.MAX_REMOVAL_RUNS:
+            # Too scattered to remove block by block; replace the rows in one go
+            kept = np.ones(len(self.selection), dtype=bool)
+            kept[diff.removed] = False
+            self.beginResetModel()
+            self.selection.keep(kept)
+            self.selection.append(len(diff.added))
+            self._df = merged
+            self.endResetModel()
+            self.selection_changed.emit()
+            return
+
+        # Remove the last block first so the positions of earlier blocks stay valid
+        for first, last in reversed(removal_runs):
+            self.beginRemoveRows(QModelIndex(), first, last)
+            self._df = self._df.drop(index=self._df.index[first:last + 1])
+            self.selection.remove(first, last)
+            self.endRemoveRows()
+
+        # The surviving rows now line up with the start of the merged frame
+        kept_count = len(diff.kept)
+        self._df = merged.iloc[:kept_count]
+        updated = diff.updated - np.searchsorted(diff.removed, diff.updated)
+        for first, last in runs(updated):
+            self.dataChanged.emit(self.index(first, 1), self.index(last, self._df.shape[1]), [Qt.DisplayRole])
+
+        if len(diff.added):
+            self.beginInsertRows(QModelIndex(), kept_count, merged.shape[0] - 1)
+            self._df = merged
+            self.selection.append(len(diff.added))
+            self.endInsertRows()
+        self._df = merged
+        if len(diff.removed):
+            self.selection_changed.emit()
+
+    # --- Bulk selection ---
+
+    def _selection_updated(self):
+        """Refreshes every checkbox with one signal, however many rows changed."""
+        if self.rowCount() > 0:
+            self.dataChanged.emit(self.index(0, 0), self.index(self.rowCount() - 1, 0), [Qt.CheckStateRole])
+        self.selection_changed.emit()
+
+    def select_all(self):
+        self.selection.select_all()
+        self._selection_updated()
+
+    def clear_selection(self):
+        self.selection.clear()
+        self._selection_updated()
+
+    def invert_selection(self, rows=None):
+        """Inverts the given rows (np.ndarray of positions), or every row."""
+        self.selection.invert(rows)
+        self._selection_updated()
+
+    def select_rows(self, rows, selected=True):
+        """Checks (or unchecks) the given rows: positions or a boolean mask over every row."""
+        self.selection.select(rows, selected)
+        self._selection_updated()
+
+    def select_matching(self, column, value, selected=True):
+        """Checks (or unchecks) every row whose value in `column` equals `value`. Returns how many matched."""
+        if column not in self._df.columns:
+            return 0
+        mask = (self._df[column] == value).to_numpy(dtype=bool, na_value=False)
+        self.select_rows(mask, selected)
+        return int(np.count_nonzero(mask))
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return self._df.shape[0]
+
+    def columnCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        # DataFrame columns + checkbox + print button
+        return self._df.shape[1] + 2
+
+    def action_column(self):
+        """Returns the index of the "Action" (print button) column."""
+        return self._df.shape[1] + 1
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return QVariant()
+
+        row, col = index.row(), index.column()
+        if col == 0:
+            if role == Qt.CheckStateRole:
+                return Qt.Checked if self.selection.is_selected(row) else Qt.Unchecked
+            return QVariant()
+
+        if col == self.action_column():
+            if role == Qt.DisplayRole:
+                return "Print"
+            return QVariant()
+
+        if role == Qt.DisplayRole:
+            # View column 0 is the checkbox, so view column `col` shows DataFrame column `col - 1`
+            return cell_text(self._df.iat[row, col - 1])
+        return QVariant()
+
+    def setData(self, index, value, role=Qt.EditRole):
+        if not index.isValid() or index.column() != 0 or role != Qt.CheckStateRole:
+            return False
+
+        row = index.row()
+        checked = value == Qt.Checked
+        if not self.selection.set(row, checked):
+            return True
+        self.dataChanged.emit(index, index, [Qt.CheckStateRole])
+        if self._selection_handler is not None:
+            self._selection_handler(Qt.Checked if checked else Qt.Unchecked, row)
+        self.selection_changed.emit()
+        return True
+
+    def flags(self, index):
+        if not index.isValid():
+            return Qt.NoItemFlags
+        if index.column() == 0:
+            return Qt.ItemIsEnabled | Qt.ItemIsUserCheckable
+        return Qt.ItemIsEnabled | Qt.ItemIsSelectable
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role != Qt.DisplayRole:
+            return QVariant()
+        if orientation == Qt.Horizontal:
+            if section == 0:
+                return "Select"
+            if section == self.action_column():
+                return "Action"
+            return str(self._df.columns[section - 1])
+        return str(section + 1)
+
+
+def _source_row(index):
+    """Returns the DataFrame row of an index, looking through a proxy model if there is one."""
+    model = index.model()
+    if hasattr(model, 'mapToSource'):
+        index = model.mapToSource(index)
+    return index.row()
+
+
+class PrintButtonDelegate(QStyledItemDelegate):
+    """
+    Paints a push button in the "Action" column and calls print_handler with
+    the DataFrame row index when it is clicked. One delegate serves every row.
+    """
+
+    def __init__(self, print_handler, parent=None):
+        super().__init__(parent)
+        self._print_handler = print_handler
+        self._pressed_row = -1
+
+    def paint(self, painter, option, index):
+        button = QStyleOptionButton()
+        # Leave a small margin so neighbouring buttons don't touch
+        button.rect = option.rect.adjusted(4, 4, -4, -4)
+        button.text = index.data(Qt.DisplayRole) or "Print"
+        button.state = QStyle.State_Enabled
+        if self._pressed_row == index.row():
+            button.state |= QStyle.State_Sunken
+        else:
+            button.state |= QStyle.State_Raised
+        style = option.widget.style() if option.widget else QApplication.style()
+        style.drawControl(QStyle.CE_PushButton, button, painter, option.widget)
+
+    def editorEvent(self, event, model, option, index):
+        if event.type() == QEvent.MouseButtonPress and event.button() == Qt.LeftButton:
+            self._pressed_row = index.row()
+            return True
+        if event.type() == QEvent.MouseButtonRelease and event.button() == Qt.LeftButton:
+            clicked = self._pressed_row == index.row() and option.rect.contains(event.pos())
+            self._pressed_row = -1
+            if clicked:
+                self._print_handler(_source_row(index))
+            return True
+        return super().editorEvent(event, model, option, index)
+
+
+def display_dataframe(df, table_view, selection_handler, print_handler, proxy_model=None):
+    """
+    Shows a DataFrame in a QTableView through a DataFrameTableModel.
+
+    Args:
+        df (pd.DataFrame): The data to display.
+        table_view (QTableView): The view to attach the model to.
+        selection_handler (callable): Called with (state, row_index) when a checkbox is toggled.
+        print_handler (callable): Called with (row_index) when a row's print button is clicked.
+        proxy_model (QAbstractProxyModel, optional): A proxy (e.g. for filtering) to place
+                                                     between the model and the view.
+    Returns:
+        DataFrameTableModel: The DataFrame model, whether or not it sits behind a proxy.
     """
-    Reads an Excel file, displays its data in a QTableWidget,
-    and connects row checkboxes to a handler.
+    model = DataFrameTableModel(df, selection_handler, parent=table_view)
+    if proxy_model is not None:
+        proxy_model.setSourceModel(model)
+        table_view.setModel(proxy_model)
+    else:
+        table_view.setModel(model)
+
+    # Keep a reference on the view so the delegate is not garbage collected
+    table_view.print_delegate = PrintButtonDelegate(print_handler, parent=table_view)
+    table_view.setItemDelegateForColumn(model.action_column(), table_view.print_delegate)
+
+    # Rows share one fixed height, so the view never has to measure them
+    table_view.verticalHeader().setDefaultSectionSize(40)
+    # Resize columns to fit content for better viewing (only a sample of rows is measured)
+    table_view.resizeColumnsToContents()
+    return model
+
+
+def display_excel_data(file_path, table_view, selection_handler, print_handler):
+    """
+    Reads a workbook or CSV file (any format in excel_loader.LOADERS), displays
+    its data in a QTableView through a DataFrameTableModel, and connects row
+    checkboxes to a handler.
 
     Args:
-        file_path (str): The path to the Excel file.
-        table_widget (QTableWidget): The table widget to display the data.
+        file_path (str): The path to the workbook or CSV file.
+        table_view (QTableView): The table to display the data in.
         selection_handler (callable): A function to call when a checkbox state changes.
                                       It receives (state, row_index).
         print_handler (callable): A function to call when a row's print button is clicked.
@@ -17,60 +291,14 @@ def display_excel_data(file_path, table_widget, selection_handler, print_handler
     Returns:
         pd.DataFrame: The loaded DataFrame, or an empty DataFrame on error.
     """
-    # Clear the table before loading new data to prevent old data from persisting
-    table_widget.setRowCount(0)
-    table_widget.setColumnCount(0)
-
+    # Detach the previous model so old data does not persist if loading fails
+    table_view.setModel(None)
     try:
-        df = pd.read_excel(file_path)
-
-        # Set column count to be DataFrame columns + checkbox + print button
-        table_widget.setColumnCount(df.shape[1] + 2)
-        table_widget.setRowCount(df.shape[0])
-
-        # Set headers, including one for the checkbox column
-        headers = ["Select"] + list(df.columns) + ["Action"]
-        table_widget.setHorizontalHeaderLabels(headers)
-
-        for row_idx in range(df.shape[0]):
-            # --- Checkbox Column ---
-            checkbox = QCheckBox()
-            # Make the checkbox larger and easier to click
-            checkbox.setStyleSheet("QCheckBox::indicator { width: 25px; height: 25px; }")
-            checkbox.stateChanged.connect(lambda state, r=row_idx: selection_handler(state, r))
-
-            # To center the checkbox, we place it inside a container widget with a layout
-            container = QWidget()
-            layout = QHBoxLayout(container)
-            layout.addWidget(checkbox)
-            layout.setAlignment(Qt.AlignCenter)
-            layout.setContentsMargins(0, 0, 0, 0)
-            table_widget.setCellWidget(row_idx, 0, container)
-
-            # --- Data Columns ---
-            for col_idx in range(df.shape[1]):
-                item = QTableWidgetItem(str(df.iloc[row_idx, col_idx]))
-                # Data is placed in column `col + 1` to make space for the checkbox
-                table_widget.setItem(row_idx, col_idx + 1, item)
-
-            # --- Print Button Column ---
-            print_button = QPushButton("Print")
-            print_button.setMinimumHeight(30) # Increase button height
-            print_button.clicked.connect(lambda checked, r=row_idx: print_handler(r))
-            # Place button in the last column
-            table_widget.setCellWidget(row_idx, df.shape[1] + 1, print_button)
-
-        # Resize columns to fit content for better viewing
-        table_widget.resizeColumnsToContents()
-
-        # Set a minimum row height to ensure our larger widgets fit well
-        for i in range(table_widget.rowCount()):
-            table_widget.setRowHeight(i, 40)
-
-        return df  # Return the dataframe for state management
+        df = load_excel(file_path, use_cache=False, schema=None)
+        display_dataframe(df, table_view, selection_handler, print_handler)
+        return df
     except FileNotFoundError:
         QMessageBox.critical(None, "Error", f"File not found:\n{file_path}")
     except Exception as e:
         QMessageBox.critical(None, "Error", f"Could not load data from Excel file:\n{e}")
-
-    return pd.DataFrame() # Return empty on failure
\ No newline at end of file
+    return pd.DataFrame()
@@ -1,12 +1,18 @@
 import os
 import pandas as pd
 from PyQt5.QtWidgets import QFileDialog, QMessageBox, QWidget
-from pdf_generator import create_receipt_pdf
+from pdf_generator import create_receipt_pdf, receipt_file_names
+from receipt_cache import ReceiptManifest, audit_details
+from receipt_prepare import prepare_receipts, describe_problems
 
-def print_single_receipt_from_df(parent: QWidget, df: pd.DataFrame, row_index: int, student_name_column: str, print_file_handler: callable):
+def print_single_receipt_from_df(parent: QWidget, df: pd.DataFrame, row_index: int, student_name_column: str, print_file_handler: callable,
+                                 save_dir: str = None):
     """
     Handles the logic for generating, saving, and printing a single receipt.
 
+    The row goes through the same formatting and checks as a batch (see
+    receipt_prepare); if it fails them, the user is asked before it is printed.
+
     Args:
         parent (QWidget): The parent widget for dialogs.
         df (pd.DataFrame): The DataFrame containing all the data.
@@ -14,31 +20,42 @@ def print_single_receipt_from_df(parent: QWidget, df: pd.DataFrame, row_index: i
         student_name_column (str): The name of the column containing student names.
         print_file_handler (callable): A function to call to print the generated PDF file.
                                        It receives the full file path.
+        save_dir (str, optional): The directory to save the receipt in; asked for when not given.
     """
     if df is None or df.empty:
         QMessageBox.warning(parent, "No Data", "No data loaded to print from.")
         return
 
-    save_dir = QFileDialog.getExistingDirectory(parent, "Select Directory to Save Receipt")
+    # Use .iloc to get the row by its integer position, as a one-row frame for the batch checks
+    row_frame = df.iloc[[row_index]]
+    prepared = prepare_receipts(row_frame)
+    if prepared.problems:
+        reply = QMessageBox.question(parent, "Check Receipt",
+                                     "This receipt has problems:\n\n" + "\n".join(describe_problems(prepared))
+                                     + "\n\nPrint it anyway?",
+                                     QMessageBox.Yes | QMessageBox.No, QMessageBox.No)
+        if reply != QMessageBox.Yes:
+            return
+    receipt = prepared.values[0]
+
+    save_dir = save_dir or QFileDialog.getExistingDirectory(parent, "Select Directory to Save Receipt")
     if not save_dir:
         return
 
-    # Use .iloc to get the row by its integer position from the DataFrame
-    row_data = df.iloc[row_index]
-    # The original DataFrame index is needed for a consistent filename
-    original_df_index = row_data.name
-
-    # Create filename
-    if student_name_column in row_data and pd.notna(row_data[student_name_column]):
-        student_name = str(row_data[student_name_column])
-        sanitized_name = "".join(c for c in student_name if c.isalnum() or c in (' ', '_')).rstrip()
-        file_name = f"receipt_{sanitized_name}_{original_df_index}.pdf"
-    else:
-        file_name = f"receipt_{original_df_index}.pdf"
-
+    # The original DataFrame index keeps the filename consistent
+    file_name = receipt_file_names(row_frame, student_name_column)[0]
     full_path = os.path.join(save_dir, file_name)
 
-    if create_receipt_pdf(row_data, full_path):
+    # Reuse the PDF if this exact receipt was already written to the folder
+    manifest = ReceiptManifest(save_dir)
+    digest = manifest.digest(receipt)
+    if manifest.lookup(full_path, digest):
+        manifest.save()
+        print_file_handler(full_path)
+        print(f"Reusing unchanged receipt: {os.path.basename(full_path)}")
+    elif create_receipt_pdf(receipt, full_path):
+        manifest.record(full_path, digest, **audit_details(receipt))
+        manifest.save()
         print_file_handler(full_path)
         print(f"Successfully saved receipt: {os.path.basename(full_path)}")
     else:
@@ -0,0 +1,158 @@
+"""
+Lightweight timing spans and counters, exported as a Chrome trace.
+
+Tracing is off by default and then costs one attribute check per span. Turn it
+on with the FEE_RECEIPT_TRACE environment variable (the trace is written to that
+path when the process exits) or from the app, and open the resulting JSON in
+chrome://tracing or https://ui.perfetto.dev.
+"""
+import os
+import json
+import time
+import atexit
+import threading
+import multiprocessing
+
+TRACE_ENV = 'FEE_RECEIPT_TRACE'
+
+
+def now_us():
+    """The current time in microseconds on the clock the trace uses (shared by all processes)."""
+    return time.perf_counter_ns() // 1000
+
+
+class _NullSpan:
+    """Returned when tracing is off, so `with span(...)` costs next to nothing."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def set(self, **args):
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    def __init__(self, tracer, name, category, args):
+        self._tracer = tracer
+        self._name = name
+        self._category = category
+        self._args = args
+
+    def __enter__(self):
+        self._start = now_us()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self._args['error'] = repr(exc)
+        self._tracer.add_complete(self._name, self._start, now_us() - self._start, self._category, **self._args)
+        return False
+
+    def set(self, **args):
+        """Attaches extra arguments (e.g. a row count known only at the end) to the span."""
+        self._args.update(args)
+
+
+class Tracer:
+    def __init__(self):
+        self.enabled = False
+        self.output_path = None
+        self._lock = threading.Lock()
+        self._events = []
+        self._counters = {}
+
+    def enable(self, output_path=None):
+        """Starts recording. output_path is where export() writes by default."""
+        self.output_path = output_path or self.output_path
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    def reset(self):
+        with self._lock:
+            self._events = []
+            self._counters = {}
+
+    def span(self, name, category='app', **args):
+        """A context manager that records how long its block took."""
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, name, category, args)
+
+    def add_complete(self, name, start_us, duration_us, category='app', pid=None, tid=None, **args):
+        """Records a finished span, e.g. one timed in a worker process and reported back."""
+        if not self.enabled:
+            return
+        event = {'name': name, 'cat': category, 'ph': 'X', 'ts': start_us, 'dur': duration_us,
+                 'pid': pid or os.getpid(), 'tid': tid or threading.get_ident(), 'args': args}
+        with self._lock:
+            self._events.append(event)
+
+    def count(self, name, value=1):
+        """Adds value to a named counter (successes, failures, bytes written...)."""
+        if not self.enabled:
+            return
+        with self._lock:
+            total = self._counters.get(name, 0) + value
+            self._counters[name] = total
+            self._events.append({'name': name, 'ph': 'C', 'ts': now_us(), 'pid': os.getpid(), 'args': {name: total}})
+
+    def counters(self):
+        with self._lock:
+            return dict(self._counters)
+
+    def summary(self):
+        """Total and mean duration per span name, in milliseconds."""
+        totals = {}
+        with self._lock:
+            for event in self._events:
+                if event['ph'] != 'X':
+                    continue
+                entry = totals.setdefault(event['name'], {'count': 0, 'total_ms': 0.0})
+                entry['count'] += 1
+                entry['total_ms'] += event['dur'] / 1000
+        for entry in totals.values():
+            entry['mean_ms'] = round(entry['total_ms'] / entry['count'], 3)
+            entry['total_ms'] = round(entry['total_ms'], 3)
+        return totals
+
+    def export(self, path=None):
+        """Writes the trace in Chrome trace-event format. Returns the path written, or None."""
+        path = path or self.output_path
+        if not path:
+            return None
+        with self._lock:
+            events = list(self._events)
+            counters = dict(self._counters)
+        trace = {
+            'traceEvents': events,
+            'displayTimeUnit': 'ms',
+            'otherData': {'counters': counters, 'summary': self.summary()},
+        }
+        with open(path, 'w') as f:
+            json.dump(trace, f)
+        return path
+
+
+# The tracer shared by the whole process.
+TRACER = Tracer()
+span = TRACER.span
+count = TRACER.count
+
+
+def _export_at_exit():
+    # Worker processes inherit the environment variable; only the main process writes the file
+    if multiprocessing.parent_process() is None:
+        TRACER.export()
+
+
+if os.environ.get(TRACE_ENV):
+    TRACER.enable(os.environ[TRACE_ENV])
+    atexit.register(_export_at_exit)
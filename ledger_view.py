@@ -0,0 +1,299 @@
+import os
+from PyQt5.QtWidgets import (QWidget, QPushButton, QVBoxLayout, QHBoxLayout, QLineEdit, QLabel, QTableView,
+                             QAbstractItemView, QFileDialog, QMessageBox)
+from PyQt5.QtCore import Qt, QAbstractTableModel, QModelIndex, QVariant, QTimer
+from receipt_ledger import PAGE_SIZE
+from receipt_schema import RECEIPT_FIELDS, cell_text
+from load_worker import create_ledger_import_thread
+
+
+class LedgerTableModel(QAbstractTableModel):
+    """
+    A read-only view of the receipts ledger, fetched from SQLite a page at a time.
+
+    Only the first page is read when a search is set; the view asks for more
+    (canFetchMore/fetchMore) as it is scrolled, so a ledger of any size opens
+    and searches instantly.
+    """
+    COLUMNS = RECEIPT_FIELDS + ['Generated', 'Printed', 'Source']
+
+    def __init__(self, ledger, parent=None):
+        super().__init__(parent)
+        self._ledger = ledger
+        self._search = ''
+        self._rows = []
+        self._exhausted = False
+        self.total = ledger.count()
+
+    @property
+    def search(self):
+        return self._search
+
+    def set_search(self, search):
+        """Shows the payments matching search (see ReceiptLedger.page), starting again from the first page."""
+        self._search = search
+        self.refresh()
+
+    def refresh(self):
+        """Reads the ledger again, e.g. after an import, and goes back to the first page."""
+        self.beginResetModel()
+        self._rows = []
+        self._exhausted = False
+        self.total = self._ledger.count(self._search)
+        self.endResetModel()
+
+    def refresh_loaded_rows(self):
+        """
+        Re-reads the rows already fetched, e.g. after receipts were generated or printed.
+
+        When the same rows come back only their cells are refreshed, so the
+        view keeps its scroll position and selection.
+        """
+        rows = self._ledger.page(self._search, limit=max(len(self._rows), 1))
+        if [row.rowid for row in rows] != [row.rowid for row in self._rows]:
+            self.refresh()
+            return
+        self._rows = rows
+        if rows:
+            self.dataChanged.emit(self.index(0, 0), self.index(len(rows) - 1, len(self.COLUMNS) - 1))
+
+    def rowids(self, rows):
+        """The ledger rowids of the given table rows."""
+        return [self._rows[row].rowid for row in rows]
+
+    def row_values(self, row):
+        """The receipt fields of one table row, in RECEIPT_FIELDS order."""
+        return self._rows[row].values
+
+    # --- Paging ---
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and not self._exhausted
+
+    def fetchMore(self, parent=QModelIndex()):
+        if parent.isValid() or self._exhausted:
+            return
+        after = self._rows[-1].rowid if self._rows else 0
+        page = self._ledger.page(self._search, after_rowid=after, limit=PAGE_SIZE)
+        self._exhausted = len(page) < PAGE_SIZE
+        if not page:
+            return
+        first = len(self._rows)
+        self.beginInsertRows(QModelIndex(), first, first + len(page) - 1)
+        self._rows.extend(page)
+        self.endInsertRows()
+
+    # --- QAbstractTableModel ---
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.COLUMNS)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or role not in (Qt.DisplayRole, Qt.ToolTipRole):
+            return QVariant()
+        row = self._rows[index.row()]
+        column = index.column()
+        if column < len(RECEIPT_FIELDS):
+            return cell_text(row.values[column])
+        if column == len(RECEIPT_FIELDS):
+            return row.generated_at or ''
+        if column == len(RECEIPT_FIELDS) + 1:
+            return row.printed_at or ''
+        if not row.source_sheet:
+            # CSV files have no sheets
+            return row.source_file if role == Qt.ToolTipRole else os.path.basename(row.source_file or '')
+        if role == Qt.ToolTipRole:
+            return f"{row.source_file} ({row.source_sheet})"
+        return f"{os.path.basename(row.source_file or '')} / {row.source_sheet}"
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role != Qt.DisplayRole:
+            return QVariant()
+        if orientation == Qt.Horizontal:
+            return self.COLUMNS[section]
+        return str(section + 1)
+
+
+class LedgerWindow(QWidget):
+    """
+    Looks up payments across every imported workbook and prints their receipts.
+
+    Args:
+        ledger (receipt_ledger.ReceiptLedger): The ledger, opened on the GUI thread.
+        print_handler (callable): Called with a pd.DataFrame of the receipts to print,
+                                  indexed by ledger rowid.
+        parent (QWidget, optional): The main window; the ledger opens as its own window.
+    """
+    # Milliseconds to wait after the last keystroke before searching
+    SEARCH_DEBOUNCE_MS = 200
+
+    def __init__(self, ledger, print_handler, parent=None):
+        super().__init__(parent, Qt.Window)
+        self.ledger = ledger
+        self._print_handler = print_handler
+        self._import_thread = None
+        self._import_worker = None
+        self._imported = []
+        self._import_failures = []
+        self.setWindowTitle("Receipts Ledger")
+        self.resize(1100, 700)
+
+        # --- Widgets ---
+        self.import_button = QPushButton("Import Workbooks...")
+        self.import_button.setToolTip("Add every sheet of one or more workbooks to the ledger.\n"
+                                      "Payments already in the ledger are updated, matched on their transaction ID.")
+        self.search_bar = QLineEdit()
+        self.search_bar.setPlaceholderText("Search by name (start of any word), admission number, transaction ID or order ID...")
+        self.count_label = QLabel()
+        self.status_label = QLabel()
+        self.model = LedgerTableModel(ledger, self)
+        self.table = QTableView()
+        self.table.setModel(self.model)
+        self.table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.table.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.table.setSelectionMode(QAbstractItemView.ExtendedSelection)
+        self.table.verticalHeader().setDefaultSectionSize(32)
+        self.history_button = QPushButton("Receipt History")
+        self.history_button.setToolTip("Every time the selected payment's receipt was generated or printed "
+                                       "(or double-click a payment).")
+        self.print_button = QPushButton("Print Selected Receipts")
+        self.search_timer = QTimer(self)
+        self.search_timer.setSingleShot(True)
+        self.search_timer.setInterval(self.SEARCH_DEBOUNCE_MS)
+
+        # --- Layout ---
+        layout = QVBoxLayout(self)
+        top_layout = QHBoxLayout()
+        top_layout.addWidget(self.import_button)
+        top_layout.addWidget(self.search_bar, 1)
+        top_layout.addWidget(self.count_label)
+        layout.addLayout(top_layout)
+        layout.addWidget(self.table, 1)
+        bottom_layout = QHBoxLayout()
+        bottom_layout.addWidget(self.status_label, 1)
+        bottom_layout.addWidget(self.history_button)
+        bottom_layout.addWidget(self.print_button)
+        layout.addLayout(bottom_layout)
+
+        # --- Connections ---
+        self.import_button.clicked.connect(self.import_workbooks)
+        self.search_bar.textChanged.connect(self.search_timer.start)
+        self.search_timer.timeout.connect(self.apply_search)
+        self.print_button.clicked.connect(self.print_selected)
+        self.history_button.clicked.connect(self.show_history)
+        self.table.doubleClicked.connect(lambda index: self.show_history())
+        self.model.modelReset.connect(self.update_count_label)
+        self.update_count_label()
+
+    def update_count_label(self):
+        what = "matching" if self.model.search else "in the ledger"
+        self.count_label.setText(f"{self.model.total} payment(s) {what}")
+
+    def apply_search(self):
+        self.model.set_search(self.search_bar.text().strip())
+
+    def refresh_receipt_status(self):
+        """Shows the latest Generated/Printed times; called when receipts are generated or printed."""
+        self.model.refresh_loaded_rows()
+
+    def show_history(self):
+        """Lists the receipt events recorded for the current payment (see ReceiptLedger.history)."""
+        index = self.table.currentIndex()
+        if not index.isValid():
+            QMessageBox.information(self, "Receipt History", "Select a payment first.")
+            return
+        values = self.model.row_values(index.row())
+        name = cell_text(values[RECEIPT_FIELDS.index('Name')]) or "this payment"
+        transaction_id = values[RECEIPT_FIELDS.index('Transaction ID')]
+        events = self.ledger.history(transaction_id)
+        if not events:
+            QMessageBox.information(self, "Receipt History", f"No receipt has been generated for {name} yet.")
+            return
+        lines = [f"{at}  {event.replace('_', ' ')}" + (f"  ({os.path.basename(file_path)})" if file_path else "")
+                 for event, file_path, at in events]
+        QMessageBox.information(self, "Receipt History", f"{name} ({transaction_id}):\n\n" + "\n".join(lines))
+
+    # --- Importing ---
+
+    def import_workbooks(self):
+        """Asks for workbooks and imports them in the background."""
+        from excel_loader import file_dialog_filter
+        file_paths, _ = QFileDialog.getOpenFileNames(self, "Import Workbooks", "", file_dialog_filter())
+        if not file_paths or self._import_worker is not None:
+            return
+        self._imported = []
+        self._import_failures = []
+        self.import_button.setEnabled(False)
+        self.status_label.setText(f"Importing {len(file_paths)} workbook(s)...")
+
+        self._import_thread, self._import_worker = create_ledger_import_thread(self.ledger.path, file_paths,
+                                                                               parent=self)
+        self._import_worker.progress.connect(self.on_import_progress)
+        self._import_worker.file_imported.connect(self._imported.append)
+        self._import_worker.file_failed.connect(lambda path, error: self._import_failures.append((path, error)))
+        self._import_worker.finished.connect(self.on_import_finished)
+        self._import_worker.failed.connect(self.on_import_failed)
+        self._import_thread.start()
+
+    def on_import_progress(self, file_name, rows):
+        self.status_label.setText(f"Importing {file_name}: {rows} row(s) read...")
+
+    def on_import_finished(self, completed):
+        """Shows the imported payments and reports what was added, merged and skipped."""
+        self._import_worker = None
+        self._import_thread = None
+        self.import_button.setEnabled(True)
+        self.model.refresh()
+
+        rows = sum(result.rows for result in self._imported)
+        added = sum(result.added for result in self._imported)
+        updated = sum(result.updated for result in self._imported)
+        duplicates = sum(result.duplicates for result in self._imported)
+        self.status_label.setText(f"Imported {rows} payment(s) from {len(self._imported)} workbook(s): "
+                                  f"{added} new, {updated} updated"
+                                  + (f", {duplicates} repeated transaction ID(s)" if duplicates else "")
+                                  + ("" if completed else " (cancelled)"))
+        notes = []
+        for result in self._imported:
+            name = os.path.basename(result.file_path)
+            if result.skipped_sheets:
+                notes.append(f"{name}: skipped sheet(s) without a Transaction ID column: "
+                             f"{', '.join(result.skipped_sheets)}")
+            if result.skipped_rows:
+                notes.append(f"{name}: {result.skipped_rows} row(s) without a transaction ID were left out")
+            if result.duplicates:
+                notes.append(f"{name}: {result.duplicates} row(s) repeated a transaction ID; the last one was kept")
+        notes += [f"{os.path.basename(path)}: {error}" for path, error in self._import_failures]
+        if notes:
+            QMessageBox.warning(self, "Import Finished With Problems", "\n".join(notes[:15]))
+
+    def on_import_failed(self, message):
+        self._import_worker = None
+        self._import_thread = None
+        self.import_button.setEnabled(True)
+        self.status_label.clear()
+        QMessageBox.critical(self, "Ledger Error", message)
+
+    # --- Printing ---
+
+    def print_selected(self):
+        """Hands the selected payments to the print handler as a DataFrame indexed by ledger rowid."""
+        import pandas as pd
+
+        rows = sorted(index.row() for index in self.table.selectionModel().selectedRows())
+        if not rows:
+            QMessageBox.information(self, "No Selection", "Please select one or more payments in the table.")
+            return
+        records = self.ledger.records(self.model.rowids(rows))
+        self._print_handler(pd.DataFrame(list(records.values()), index=list(records), columns=RECEIPT_FIELDS))
+
+    def closeEvent(self, event):
+        """Stops an import that is still running; the workbook being imported is rolled back."""
+        if self._import_worker is not None:
+            self._import_worker.cancel()
+            self._import_thread.quit()
+            self._import_thread.wait()
+        super().closeEvent(event)
@@ -0,0 +1,213 @@
+import os
+from PyQt5.QtCore import QObject, QThread, pyqtSignal
+from excel_loader import iter_excel_chunks, load_excel
+from workbook_diff import diff_frames
+from receipt_schema import RECEIPT_SCHEMA
+from instrumentation import span
+
+
+class ExcelLoadWorker(QObject):
+    """
+    Reads a workbook in chunks on a background thread.
+
+    Signals:
+        chunk_loaded (object): A pd.DataFrame with the next block of rows.
+        progress (int, int): Rows read so far and the estimated total.
+        finished (bool): Emitted once at the end; False if the load was cancelled.
+        failed (str): Emitted instead of finished if the file could not be read.
+    """
+    chunk_loaded = pyqtSignal(object)
+    progress = pyqtSignal(int, int)
+    finished = pyqtSignal(bool)
+    failed = pyqtSignal(str)
+
+    def __init__(self, file_path, schema=RECEIPT_SCHEMA):
+        super().__init__()
+        self.file_path = file_path
+        self.schema = schema
+        self._cancelled = False
+
+    def cancel(self):
+        """Asks the worker to stop after the current chunk."""
+        self._cancelled = True
+
+    def run(self):
+        try:
+            with span('load.workbook', 'load', file=os.path.basename(self.file_path)) as load_span:
+                chunks = iter_excel_chunks(self.file_path, schema=self.schema)
+                rows_read = 0
+                while not self._cancelled:
+                    with span('load.read_chunk', 'load'):
+                        item = next(chunks, None)
+                    if item is None:
+                        break
+                    chunk, rows_read, total_rows = item
+                    self.chunk_loaded.emit(chunk)
+                    self.progress.emit(rows_read, total_rows)
+                load_span.set(rows=rows_read, cancelled=self._cancelled)
+        except FileNotFoundError:
+            self.failed.emit(f"File not found:\n{self.file_path}")
+            return
+        except Exception as e:
+            self.failed.emit(f"Could not load data from the file:\n{e}")
+            return
+        self.finished.emit(not self._cancelled)
+
+
+class WorkbookReloadWorker(QObject):
+    """
+    Re-reads a workbook that is already shown and works out which rows changed.
+
+    Signals:
+        finished (object, object): The new pd.DataFrame and its WorkbookDiff against
+                                   the current rows (None if the rows cannot be
+                                   matched and the table must be replaced).
+        failed (str): Emitted instead of finished if the file could not be read.
+    """
+    finished = pyqtSignal(object, object)
+    failed = pyqtSignal(str)
+
+    def __init__(self, file_path, current_df, key_column=None, schema=RECEIPT_SCHEMA):
+        super().__init__()
+        self.file_path = file_path
+        self.current_df = current_df
+        self.key_column = key_column
+        self.schema = schema
+
+    def run(self):
+        try:
+            with span('load.reload', 'load', file=os.path.basename(self.file_path)) as reload_span:
+                new_df = load_excel(self.file_path, schema=self.schema)
+                with span('load.diff', 'load', rows=len(new_df)):
+                    diff = diff_frames(self.current_df, new_df, self.key_column)
+                if diff is not None:
+                    reload_span.set(removed=len(diff.removed), updated=len(diff.updated), added=len(diff.added))
+        except FileNotFoundError:
+            self.failed.emit(f"File not found:\n{self.file_path}")
+            return
+        except Exception as e:
+            self.failed.emit(f"Could not reload data from the file:\n{e}")
+            return
+        finally:
+            # Don't keep the old rows alive for as long as the worker object lives
+            self.current_df = None
+        self.finished.emit(new_df, diff)
+
+
+class LedgerImportWorker(QObject):
+    """
+    Imports workbooks into the receipts ledger on a background thread.
+
+    The worker opens its own connection to the ledger file, so the window can
+    keep reading the ledger meanwhile; each workbook is committed as a whole.
+
+    Signals:
+        progress (str, int): The workbook being imported and the rows read from it so far.
+        file_imported (object): A receipt_ledger.ImportResult for each workbook imported.
+        file_failed (str, str): A workbook that could not be imported and the reason.
+        finished (bool): Emitted once at the end; False if the import was cancelled.
+        failed (str): Emitted instead of finished if the ledger could not be opened.
+    """
+    progress = pyqtSignal(str, int)
+    file_imported = pyqtSignal(object)
+    file_failed = pyqtSignal(str, str)
+    finished = pyqtSignal(bool)
+    failed = pyqtSignal(str)
+
+    def __init__(self, ledger_path, file_paths):
+        super().__init__()
+        self.ledger_path = ledger_path
+        self.file_paths = list(file_paths)
+        self._cancelled = False
+
+    def cancel(self):
+        """Asks the worker to stop; the workbook being imported is rolled back."""
+        self._cancelled = True
+
+    def run(self):
+        # sqlite3 and the ledger are only needed once something is imported
+        import sqlite3
+        from receipt_ledger import ReceiptLedger
+
+        try:
+            ledger = ReceiptLedger(self.ledger_path)
+        except (OSError, sqlite3.Error) as e:
+            self.failed.emit(f"Could not open the receipts ledger:\n{e}")
+            return
+        try:
+            for file_path in self.file_paths:
+                if self._cancelled:
+                    break
+                name = os.path.basename(file_path)
+                try:
+                    with span('ledger.import', 'load', file=name) as import_span:
+                        result = ledger.import_workbook(
+                            file_path, on_progress=lambda sheet, rows: self.progress.emit(name, rows),
+                            should_cancel=lambda: self._cancelled)
+                        if result is not None:
+                            import_span.set(rows=result.rows, added=result.added)
+                except FileNotFoundError:
+                    self.file_failed.emit(file_path, "File not found")
+                    continue
+                except Exception as e:
+                    self.file_failed.emit(file_path, str(e))
+                    continue
+                if result is not None:
+                    self.file_imported.emit(result)
+        finally:
+            ledger.close()
+        self.finished.emit(not self._cancelled)
+
+
+def _move_to_thread(worker, parent):
+    thread = QThread(parent)
+    worker.moveToThread(thread)
+
+    thread.started.connect(worker.run)
+    worker.finished.connect(thread.quit)
+    worker.failed.connect(thread.quit)
+    thread.finished.connect(worker.deleteLater)
+    thread.finished.connect(thread.deleteLater)
+    return thread, worker
+
+
+def create_excel_load_thread(file_path, compact=True, parent=None):
+    """
+    Creates an ExcelLoadWorker on its own QThread.
+
+    Connect to the worker's signals first, then call thread.start(); the
+    signals are delivered on the GUI thread.
+
+    Args:
+        compact (bool): Keep only the receipt columns, stored with compact dtypes
+                        (receipt_schema.RECEIPT_SCHEMA), instead of every column as read.
+    Returns:
+        tuple: (QThread, ExcelLoadWorker)
+    """
+    return _move_to_thread(ExcelLoadWorker(file_path, RECEIPT_SCHEMA if compact else None), parent)
+
+
+def create_workbook_reload_thread(file_path, current_df, key_column=None, compact=True, parent=None):
+    """
+    Creates a WorkbookReloadWorker on its own QThread.
+
+    Connect to the worker's signals first, then call thread.start(). compact must
+    match how the current rows were loaded, or every reload replaces the table.
+
+    Returns:
+        tuple: (QThread, WorkbookReloadWorker)
+    """
+    return _move_to_thread(WorkbookReloadWorker(file_path, current_df, key_column,
+                                                 RECEIPT_SCHEMA if compact else None), parent)
+
+
+def create_ledger_import_thread(ledger_path, file_paths, parent=None):
+    """
+    Creates a LedgerImportWorker on its own QThread.
+
+    Connect to the worker's signals first, then call thread.start().
+
+    Returns:
+        tuple: (QThread, LedgerImportWorker)
+    """
+    return _move_to_thread(LedgerImportWorker(ledger_path, file_paths), parent)
@@ -1,16 +1,27 @@
 import sys
 import os
+import time
+# Startup is measured from here, before the GUI toolkit is imported
+_STARTED_AT = time.perf_counter()
+import json
+import threading
+import importlib
 import subprocess
-import pandas as pd
-from PyQt5.QtWidgets import (QApplication, QWidget, QPushButton, QVBoxLayout, QFileDialog, QTableWidget, QMessageBox, QFrame,
-                             QLineEdit, QGroupBox, QLabel, QHBoxLayout)
-from PyQt5.QtCore import Qt
+import multiprocessing
+from PyQt5.QtWidgets import (QApplication, QWidget, QPushButton, QVBoxLayout, QFileDialog, QTableView, QMessageBox, QFrame,
+                             QLineEdit, QGroupBox, QLabel, QHBoxLayout, QAbstractItemView, QProgressBar,
+                             QProgressDialog, QComboBox, QCheckBox, QToolButton, QMenu, QSplitter)
+from PyQt5.QtCore import Qt, QThread, QTimer, QFileSystemWatcher, pyqtSignal
 from PyQt5.QtGui import QPixmap, QFontMetrics, QFont
 from upload_excel import upload_file  # Import the function
-from excel_viewer import display_excel_data  # Import the new function
-from pdf_generator import create_receipt_pdf # Import the new PDF generator
-from table_filter import filter_table_by_name # Import the new filter function
-from individual_printer import print_single_receipt_from_df # Import the new individual print logic
+import workbook_cache  # Sidecar cache of parsed workbooks
+from print_spooler import PrintSpooler  # Background print queue
+from receipt_preview import ReceiptPreviewPane  # Receipt preview painted without writing a PDF
+from instrumentation import TRACER, span, now_us  # Optional timing trace
+
+# The modules below pull in pandas and reportlab, which take most of the startup time.
+# They are imported where they are first used, and preloaded on a background thread
+# once the window has been painted (see MainWindow.PRELOAD_MODULES).
 
 def resource_path(relative_path):
     """ Get absolute path to resource for PyInstaller """
@@ -23,16 +34,80 @@ class MainWindow(QWidget):
     # --- Class Level Configuration ---
     # IMPORTANT: Change this value to match the exact column header for student names in your Excel file.
     STUDENT_NAME_COLUMN = 'Name'
+    # Milliseconds to wait after the last keystroke before searching
+    SEARCH_DEBOUNCE_MS = 150
+    # Load only the receipt columns, with compact dtypes (see receipt_schema.RECEIPT_SCHEMA).
+    # Set to False to show every column of the sheet.
+    LOAD_RECEIPT_COLUMNS_ONLY = True
+    # The most values listed in the "Select > Class/Status" menus
+    MAX_MENU_VALUES = 50
+    # Milliseconds to wait after the loaded file last changed before reloading it
+    RELOAD_DEBOUNCE_MS = 1000
+    # Output modes for "Print Receipt(s)"
+    OUTPUT_SEPARATE_PDFS = 'separate'
+    OUTPUT_BATCH_PDF = 'batch'
+    OUTPUT_ZIP_ARCHIVE = 'zip'
+    # Seconds closing the window waits for queued files to reach the printer before abandoning them
+    PRINT_SHUTDOWN_TIMEOUT = 5
+    # Rows on each side of the current one whose previews are rendered in the background
+    PREVIEW_PREFETCH_ROWS = 3
+    # Rows that failed validation listed by name before printing; the rest are counted
+    INVALID_ROWS_SHOWN = 10
+    # Window logos, relative to the application directory
+    LOGO_LEFT_FILE = 'Jims_logo-removebg-preview.png'
+    LOGO_CENTER_FILE = 'Jims_name-removebg-preview.png'
+    # Imported on a background thread after the first paint, so they are ready when first used
+    PRELOAD_MODULES = ('pandas', 'load_worker', 'excel_viewer', 'table_filter', 'pdf_generator',
+                       'receipt_cache', 'receipt_worker', 'individual_printer')
+
+    # The print spooler reports from its own threads; these bring its reports to the GUI thread
+    files_printed = pyqtSignal(list)
+    files_print_failed = pyqtSignal(list)
 
-    def __init__(self):
+    def __init__(self, preload=True):
         super().__init__()
+        self._preload = preload
+        self._first_paint_done = False
+        self.startup_ms = None  # Milliseconds from startup to the first painted window
         self.setWindowTitle("Admission Reciept 2025")
         self.setMinimumSize(1120, 800)
 
         # --- State Management ---
-        self.name_column_table_index = -1  # The index of the name column in the QTableWidget
+        self.name_column_table_index = -1  # The index of the name column in the table view
         self.df = None
-        self.selected_rows = set()
+        self._load_thread = None  # The QThread of the workbook load in progress, if any
+        self._load_worker = None
+        self.loaded_file_path = None  # The workbook shown in the table, watched for changes
+        self._reload_thread = None  # The QThread of the incremental reload in progress, if any
+        self._reload_worker = None
+        self._reload_pending = False  # The file changed again while it was being reloaded
+        self.file_watcher = QFileSystemWatcher(self)
+        self.reload_timer = QTimer(self)
+        self.reload_timer.setSingleShot(True)
+        self.reload_timer.setInterval(self.RELOAD_DEBOUNCE_MS)
+        self.table_model = None  # The DataFrameTableModel behind the filter proxy
+        self.name_index = None  # NameSearchIndex over the name column
+        self.key_index = None  # KeyLookupIndex over the admission number, transaction ID and order ID
+        self._scan_save_dir = None  # Where "Print on Scan" saves receipts; asked for on the first scan
+        self.filter_proxy = None  # IndexFilterProxyModel, created with the first table
+        self._batch_thread = None  # The QThread of the receipt batch in progress, if any
+        self._closing = False  # Set by closeEvent; late batch results are no longer printed
+        self._batch_worker = None
+        self._batch_failures = []
+        self._batch_reused = 0  # Receipts of the running batch taken from the output cache
+        self._batch_file_path = None
+        self._batch_archive_path = None  # The ZIP archive the running batch writes to, if any
+        self._batch_archived = []  # Names of the receipts written to that archive
+        self.print_spooler = PrintSpooler(on_printed=self.files_printed.emit,
+                                          on_failure=lambda failure: self.files_print_failed.emit(failure.files))
+        self.ledger = None  # The ReceiptLedger, opened on first use
+        self.ledger_window = None
+        # Transaction IDs of the receipts in each generated file, until the file is printed
+        self._file_transactions = {}
+        self._clear_selection_after_batch = True  # False when the batch was printed from the ledger
+        self.search_timer = QTimer(self)
+        self.search_timer.setSingleShot(True)
+        self.search_timer.setInterval(self.SEARCH_DEBOUNCE_MS)
 
         # --- Widgets ---
         self.upload_button = QPushButton("Upload Excel File")
@@ -40,8 +115,67 @@ class MainWindow(QWidget):
         self.search_bar = QLineEdit()
         self.search_bar.setMinimumHeight(33)  # Increase search bar height
         self.search_bar.setPlaceholderText("Search by Name...")
+        # Exact lookup for barcode scanners: a scanner types the code and presses Enter
+        self.lookup_bar = QLineEdit()
+        self.lookup_bar.setMinimumHeight(33)
+        self.lookup_bar.setPlaceholderText("Scan or type an admission number, transaction ID or order ID and press Enter...")
+        self.print_on_scan_checkbox = QCheckBox("Print on Scan")
+        self.print_on_scan_checkbox.setToolTip("Print the receipt as soon as a scan matches exactly one row.\n"
+                                               "The folder for the receipts is asked for on the first scan.")
+        self.lookup_status_label = QLabel()
+        self.preview_checkbox = QCheckBox("Preview")
+        self.preview_checkbox.setToolTip("Show the receipt of the current row next to the table")
+        self.preview_checkbox.setChecked(True)
+        self.preview_pane = ReceiptPreviewPane()
+        # Bulk selection: each action changes every affected checkbox in one step
+        self.select_button = QToolButton()
+        self.select_button.setText("Select")
+        self.select_button.setMinimumHeight(33)
+        self.select_button.setPopupMode(QToolButton.InstantPopup)
+        self.select_menu = QMenu(self.select_button)
+        self.select_menu.addAction("All Rows", self.select_all_rows)
+        self.select_menu.addAction("Rows Matching the Search", self.select_shown_rows)
+        self.select_menu.addAction("Invert Selection", self.invert_selection)
+        self.select_menu.addAction("Clear Selection", self.clear_selection)
+        self.select_menu.addSeparator()
+        self.select_class_menu = self.select_menu.addMenu("Class")
+        self.select_status_menu = self.select_menu.addMenu("Status")
+        self.select_button.setMenu(self.select_menu)
+        self.select_button.setEnabled(False)
+        self.selection_label = QLabel()
         self.print_receipts_button = QPushButton("Print Receipt(s)")
         self.print_receipts_button.setMinimumHeight(40)  # Increase button height
+        self.output_mode_combo = QComboBox()
+        self.output_mode_combo.setMinimumHeight(40)
+        self.output_mode_combo.addItem("Separate PDF per receipt", self.OUTPUT_SEPARATE_PDFS)
+        self.output_mode_combo.addItem("Single PDF, one print job", self.OUTPUT_BATCH_PDF)
+        self.output_mode_combo.addItem("ZIP archive of PDFs (no printing)", self.OUTPUT_ZIP_ARCHIVE)
+        self.output_mode_combo.setItemData(2, "Writes every receipt into one archive in a single pass;\n"
+                                              "much faster than separate files on a network share.", Qt.ToolTipRole)
+        self.print_status_label = QLabel()
+        self.show_print_failures_button = QPushButton("Show Print Failures")
+        self.show_print_failures_button.hide()
+        self.print_status_timer = QTimer(self)
+        self.print_status_timer.setInterval(500)
+        self.load_progress = QProgressBar()
+        self.load_progress.hide()
+        self.cancel_load_button = QPushButton("Cancel")
+        self.cancel_load_button.hide()
+        self.ledger_button = QPushButton("Receipts Ledger")
+        self.ledger_button.setToolTip("Look up payments across every imported workbook and sheet,\n"
+                                      "and see which receipts were generated and printed.")
+        self.clear_cache_button = QPushButton("Clear Cache")
+        self.clear_cache_button.setToolTip("Forget the parsed copies of previously opened workbooks")
+        self.trace_checkbox = QCheckBox("Record Timing")
+        self.trace_checkbox.setToolTip("Record how long loading, searching, generating and printing take.\n"
+                                       "Unticking saves the recording as a trace file.")
+        self.trace_checkbox.setChecked(TRACER.enabled)
+        self.auto_reload_checkbox = QCheckBox("Reload When File Changes")
+        self.auto_reload_checkbox.setToolTip("Apply new, changed and removed rows when the workbook is saved again.\n"
+                                             "Selections and the search are kept.")
+        self.auto_reload_checkbox.setChecked(True)
+        # Start time of the running batch, for its span in the timing trace
+        self._batch_started_us = 0
 
         # --- Set Button Font ---
         button_font = QFont()
@@ -54,11 +188,13 @@ class MainWindow(QWidget):
         self.upload_button.setStyleSheet(button_style)
         self.print_receipts_button.setStyleSheet(button_style)
 
-        self.table_widget = QTableWidget()
+        # A model-backed view only renders the visible rows, however large the sheet is
+        self.table_widget = QTableView()
         # Make the table read-only to prevent accidental edits
-        self.table_widget.setEditTriggers(QTableWidget.NoEditTriggers)
-        # Add padding to all data cells for better readability
-        self.table_widget.setStyleSheet("QTableWidget::item { padding: 8px; }")
+        self.table_widget.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        # Add padding to all data cells and make the checkboxes larger and easier to click
+        self.table_widget.setStyleSheet("QTableView::item { padding: 8px; }"
+                                        "QTableView::indicator { width: 25px; height: 25px; }")
 
         # --- Layout ---
         main_layout = QVBoxLayout(self)
@@ -68,38 +204,29 @@ class MainWindow(QWidget):
         logo_layout = QHBoxLayout(logo_container)
         logo_layout.setContentsMargins(10, 10, 10, 10) # Add padding on all sides
 
+        # The pixmaps are decoded and scaled after the first paint (see _load_logos);
+        # the labels reserve their space now so the layout doesn't move when they appear.
         # --- Left Logo (Jims_logo.jpg) ---
-        logo_left_label = QLabel()
-        logo_left_path = resource_path('Jims_logo-removebg-preview.png')
-        pixmap_left = None
-        if os.path.exists(logo_left_path):
-            pixmap_left = QPixmap(logo_left_path)
-            # Scale to a height to keep proportions, as it's more square
-            logo_left_label.setPixmap(pixmap_left.scaledToHeight(125, Qt.SmoothTransformation))
-            logo_left_label.setAlignment(Qt.AlignLeft | Qt.AlignTop)
+        self.logo_left_label = QLabel()
+        self.logo_left_label.setMinimumHeight(125)
+        self.logo_left_label.setAlignment(Qt.AlignLeft | Qt.AlignTop)
+        logo_left_exists = os.path.exists(resource_path(self.LOGO_LEFT_FILE))
 
         # --- Center Logo (Jims_name.jpg) ---
-        logo_center_label = QLabel()
-        logo_center_path = resource_path('Jims_name-removebg-preview.png')
-        if os.path.exists(logo_center_path):
-            pixmap_center = QPixmap(logo_center_path)
-            # Define a fixed height for the logo, matching the left logo for alignment.
-            logo_height = 110
-            # Scale to a fixed width and height, ignoring the aspect ratio.
-            # This will distort the image if the new dimensions don't match the original ratio.
-            logo_center_label.setPixmap(pixmap_center.scaled(500, logo_height, Qt.IgnoreAspectRatio, Qt.SmoothTransformation))
-            logo_center_label.setAlignment(Qt.AlignCenter | Qt.AlignTop)
+        self.logo_center_label = QLabel()
+        self.logo_center_label.setMinimumSize(500, 110)
+        self.logo_center_label.setAlignment(Qt.AlignCenter | Qt.AlignTop)
 
         # Use a dummy widget on the right to balance the left logo, ensuring the center logo is truly centered.
         dummy_widget = QWidget()
-        if pixmap_left:
+        if logo_left_exists:
             # The dummy widget must have the same width as the visible pixmap on the left label.
             dummy_widget.setFixedWidth(80)
 
         # Add widgets to the layout to achieve the desired alignment.
-        logo_layout.addWidget(logo_left_label)
+        logo_layout.addWidget(self.logo_left_label)
         logo_layout.addStretch()
-        logo_layout.addWidget(logo_center_label)
+        logo_layout.addWidget(self.logo_center_label)
         logo_layout.addStretch()
         logo_layout.addWidget(dummy_widget)
 
@@ -146,14 +273,41 @@ class MainWindow(QWidget):
         upload_layout.addStretch() # Add stretch before to start centering
         upload_layout.addWidget(self.upload_button)
         upload_layout.addStretch() # Add stretch after to finish centering
+        upload_layout.addWidget(self.ledger_button)
+        upload_layout.addWidget(self.clear_cache_button)
+        upload_layout.addWidget(self.auto_reload_checkbox)
+        upload_layout.addWidget(self.trace_checkbox)
 
         main_layout.addWidget(upload_container)
 
+        # --- Load Progress (only visible while a workbook is loading) ---
+        progress_container = QWidget()
+        progress_layout = QHBoxLayout(progress_container)
+        progress_layout.setContentsMargins(0, 0, 0, 0)
+        progress_layout.addWidget(self.load_progress, 1)
+        progress_layout.addWidget(self.cancel_load_button)
+        main_layout.addWidget(progress_container)
+
         # Use a QGroupBox for a visually and structurally robust container
         table_group_box = QGroupBox("Data Table")
         table_layout = QVBoxLayout(table_group_box)
-        table_layout.addWidget(self.search_bar)
-        table_layout.addWidget(self.table_widget, 1)
+        search_layout = QHBoxLayout()
+        search_layout.addWidget(self.search_bar, 1)
+        search_layout.addWidget(self.select_button)
+        search_layout.addWidget(self.selection_label)
+        search_layout.addWidget(self.preview_checkbox)
+        table_layout.addLayout(search_layout)
+        lookup_layout = QHBoxLayout()
+        lookup_layout.addWidget(self.lookup_bar, 1)
+        lookup_layout.addWidget(self.print_on_scan_checkbox)
+        lookup_layout.addWidget(self.lookup_status_label)
+        table_layout.addLayout(lookup_layout)
+        table_splitter = QSplitter(Qt.Horizontal)
+        table_splitter.addWidget(self.table_widget)
+        table_splitter.addWidget(self.preview_pane)
+        table_splitter.setStretchFactor(0, 3)
+        table_splitter.setStretchFactor(1, 2)
+        table_layout.addWidget(table_splitter, 1)
 
         # Add the group box to the main layout with a stretch factor.
         # This makes the entire table area expand and shrink with the window.
@@ -165,167 +319,939 @@ class MainWindow(QWidget):
         print_layout.setContentsMargins(0, 0, 0, 0)
         print_layout.addStretch()
         print_layout.addWidget(self.print_receipts_button)
+        print_layout.addWidget(self.output_mode_combo)
+        print_layout.addWidget(self.print_status_label)
+        print_layout.addWidget(self.show_print_failures_button)
         print_layout.addStretch()
         main_layout.addWidget(print_container)
 
         # --- Connections ---
         self.upload_button.clicked.connect(self.upload_file)
+        self.cancel_load_button.clicked.connect(self.cancel_loading)
+        self.ledger_button.clicked.connect(self.open_ledger)
+        self.clear_cache_button.clicked.connect(self.clear_workbook_cache)
+        self.trace_checkbox.toggled.connect(self.on_trace_toggled)
         self.print_receipts_button.clicked.connect(self.print_receipts)
         self.search_bar.textChanged.connect(self.on_search_text_changed)
+        self.select_class_menu.aboutToShow.connect(lambda: self._fill_value_menu(self.select_class_menu, 'Class'))
+        self.select_status_menu.aboutToShow.connect(lambda: self._fill_value_menu(self.select_status_menu, 'Status'))
+        self.search_timer.timeout.connect(self.apply_search)
+        self.lookup_bar.returnPressed.connect(self.lookup_scanned_key)
+        self.print_on_scan_checkbox.toggled.connect(self.on_print_on_scan_toggled)
+        self.preview_checkbox.toggled.connect(self.on_preview_toggled)
+        self.file_watcher.fileChanged.connect(self.on_file_changed)
+        self.reload_timer.timeout.connect(self.reload_workbook)
+        self.print_status_timer.timeout.connect(self.update_print_status)
+        self.show_print_failures_button.clicked.connect(self.show_print_failures)
+        self.files_printed.connect(lambda files: self._record_receipt_event(files, 'printed'))
+        self.files_print_failed.connect(lambda files: self._record_receipt_event(files, 'print_failed'))
+        self.print_status_timer.start()
+
+    # --- Startup ---
+
+    def paintEvent(self, event):
+        super().paintEvent(event)
+        if not self._first_paint_done:
+            self._first_paint_done = True
+            self.startup_ms = (time.perf_counter() - _STARTED_AT) * 1000
+            TRACER.add_complete('startup.first_paint', now_us() - int(self.startup_ms * 1000),
+                                int(self.startup_ms * 1000), 'startup')
+            # Let this paint reach the screen before doing the deferred work
+            QTimer.singleShot(0, self._after_first_paint)
+
+    def _after_first_paint(self):
+        """Loads what the first frame doesn't need: the logos, then (optionally) the heavy modules."""
+        self._load_logos()
+        if self._preload:
+            threading.Thread(target=self._preload_modules, name='module-preload', daemon=True).start()
+
+    def _load_logos(self):
+        with span('startup.load_logos', 'startup'):
+            logo_left_path = resource_path(self.LOGO_LEFT_FILE)
+            if os.path.exists(logo_left_path):
+                pixmap_left = QPixmap(logo_left_path)
+                # Scale to a height to keep proportions, as it's more square
+                self.logo_left_label.setPixmap(pixmap_left.scaledToHeight(125, Qt.SmoothTransformation))
+
+            logo_center_path = resource_path(self.LOGO_CENTER_FILE)
+            if os.path.exists(logo_center_path):
+                pixmap_center = QPixmap(logo_center_path)
+                # Define a fixed height for the logo, matching the left logo for alignment.
+                logo_height = 110
+                # Scale to a fixed width and height, ignoring the aspect ratio.
+                # This will distort the image if the new dimensions don't match the original ratio.
+                self.logo_center_label.setPixmap(pixmap_center.scaled(500, logo_height, Qt.IgnoreAspectRatio,
+                                                                      Qt.SmoothTransformation))
+
+    def _preload_modules(self):
+        """Runs on a background thread; imports the modules the first upload and print will need."""
+        with span('startup.preload', 'startup'):
+            for name in self.PRELOAD_MODULES:
+                try:
+                    importlib.import_module(name)
+                except Exception as e:
+                    # The module is imported again (and the error shown) when it is actually used
+                    print(f"PRELOAD_WARNING: Could not preload '{name}'. Reason: {e}", file=sys.stderr)
 
     def upload_file(self):
-        """Handles file upload and triggers table population."""
+        """Handles file upload and starts loading the workbook in the background."""
+        file_path = upload_file(self)
+        if not file_path:
+            # The dialog was cancelled: keep the current workbook and everything tied to it
+            return
+        if file_path == self.loaded_file_path and self.table_model is not None \
+                and self._load_worker is None:
+            # Uploading the same workbook again only applies what changed
+            self.reload_workbook()
+            return
+        from load_worker import create_excel_load_thread
+
         # Clear previous state
+        self.cancel_loading()
+        self._cancel_reload()
+        self._watch_file(file_path)
         self.name_column_table_index = -1
-        self.selected_rows.clear()
         self.df = None
         self.search_bar.clear()
 
-        file_path = upload_file(self)
-        if file_path:
-            # Pass the selection handler method to the display function
-            # and store the returned DataFrame
-            self.df = display_excel_data(file_path, self.table_widget, self.on_selection_changed, self.print_single_receipt)
-            if self.df is not None and not self.df.empty:
-                if self.STUDENT_NAME_COLUMN in self.df.columns:
+        # Detach the previous model so old data does not persist while the new file loads
+        self._clear_table()
+        self.load_progress.setRange(0, 0)  # Busy indicator until the first chunk reports a total
+        self.load_progress.show()
+        self.cancel_load_button.show()
+
+        self._load_thread, self._load_worker = create_excel_load_thread(
+            file_path, compact=self.LOAD_RECEIPT_COLUMNS_ONLY, parent=self)
+        self._load_worker.chunk_loaded.connect(self.on_chunk_loaded)
+        self._load_worker.progress.connect(self.on_load_progress)
+        self._load_worker.finished.connect(self.on_load_finished)
+        self._load_worker.failed.connect(self.on_load_failed)
+        self._load_thread.start()
+
+    def cancel_loading(self):
+        """Stops a background load that is still running and discards its rows."""
+        if self._load_worker is None:
+            return
+        # Disconnect first so chunks that are already queued are ignored
+        self._load_worker.chunk_loaded.disconnect()
+        self._load_worker.progress.disconnect()
+        self._load_worker.finished.disconnect()
+        self._load_worker.failed.disconnect()
+        self._load_worker.cancel()
+        self._load_worker = None
+        self._load_thread = None
+
+        self._clear_table()
+        self.df = None
+        self.name_column_table_index = -1
+        self.load_progress.hide()
+        self.cancel_load_button.hide()
+        self._watch_file(None)
+
+    def _clear_table(self):
+        """Detaches the current data model and search index from the view."""
+        self.search_timer.stop()
+        self.table_widget.setModel(None)
+        if self.filter_proxy is not None:
+            self.filter_proxy.setSourceModel(None)
+        self.table_model = None
+        self.name_index = None
+        self.key_index = None
+        self.select_button.setEnabled(False)
+        self.selection_label.clear()
+        self.lookup_status_label.clear()
+        self.preview_pane.clear()
+
+    def on_chunk_loaded(self, chunk):
+        """Adds the next block of rows from the background loader to the table."""
+        with span('table.populate', 'table', rows=len(chunk)):
+            model = self.table_model
+            if model is None:
+                from excel_viewer import display_dataframe
+                from table_filter import NameSearchIndex, KeyLookupIndex, IndexFilterProxyModel
+                if self.filter_proxy is None:
+                    self.filter_proxy = IndexFilterProxyModel(self)
+                # Pass the selection handler method to the display function
+                model = display_dataframe(chunk, self.table_widget, None, self.print_single_receipt,
+                                          proxy_model=self.filter_proxy)
+                model.selection_changed.connect(self.update_selection_label)
+                self.table_widget.selectionModel().currentRowChanged.connect(self.update_preview)
+                self.table_model = model
+                self.select_button.setEnabled(True)
+                self.update_selection_label()
+                self.key_index = KeyLookupIndex(chunk)
+                if self.STUDENT_NAME_COLUMN in chunk.columns:
                     # Get the index from the DataFrame and add 1 for the "Select" column in the table
-                    self.name_column_table_index = self.df.columns.get_loc(self.STUDENT_NAME_COLUMN) + 1
+                    self.name_column_table_index = chunk.columns.get_loc(self.STUDENT_NAME_COLUMN) + 1
+                    self.name_index = NameSearchIndex(chunk[self.STUDENT_NAME_COLUMN])
                 else:
                     self.name_column_table_index = -1
                     QMessageBox.warning(self, "Column Not Found",
                                         f"The column '{self.STUDENT_NAME_COLUMN}' was not found.\n\n"
                                         "Search by name and PDF naming may not work as expected.")
+            else:
+                model.append_frame(chunk)
+                self.key_index.extend(chunk)
+                if self.name_index is not None:
+                    self.name_index.extend(chunk[self.STUDENT_NAME_COLUMN])
+                # Apply the current search to the rows that just arrived
+                if self.filter_proxy.is_filtered():
+                    self.apply_search()
+            self.df = model.df
 
-    def on_selection_changed(self, state, row_index):
-        """
-        This method is called from excel_viewer when a checkbox is toggled.
-        It manages the set of selected row indices.
-        """
-        if state == Qt.Checked:
-            self.selected_rows.add(row_index)
+    def on_load_progress(self, rows_read, total_rows):
+        self.load_progress.setRange(0, total_rows)
+        self.load_progress.setValue(rows_read)
+        self.load_progress.setFormat("Loaded %v of %m rows")
+
+    def on_load_finished(self, completed):
+        self._load_worker = None
+        self._load_thread = None
+        self.load_progress.hide()
+        self.cancel_load_button.hide()
+        if completed and self.df is not None:
+            from receipt_schema import format_memory_report
+            print(f"Loaded workbook: {format_memory_report(self.df)}")
+
+    def on_load_failed(self, message):
+        self.on_load_finished(False)
+        self._clear_table()
+        self._watch_file(None)
+        self.df = None
+        QMessageBox.critical(self, "Error", message)
+
+    # --- Incremental Reload ---
+
+    def _watch_file(self, file_path):
+        """Makes file_path the loaded workbook and watches it for changes (None stops watching)."""
+        self.reload_timer.stop()
+        watched = self.file_watcher.files()
+        if watched:
+            self.file_watcher.removePaths(watched)
+        self.loaded_file_path = file_path or None
+        if self.loaded_file_path:
+            self.file_watcher.addPath(self.loaded_file_path)
+
+    def on_file_changed(self, file_path):
+        """Called by the file watcher; waits for the export to finish writing before reloading."""
+        # Saving by replacing the file drops it from the watcher, so watch the new file
+        if file_path not in self.file_watcher.files() and os.path.exists(file_path):
+            self.file_watcher.addPath(file_path)
+        if self.auto_reload_checkbox.isChecked():
+            self.reload_timer.start()
+
+    def reload_workbook(self):
+        """Re-reads the loaded workbook in the background and applies only the rows that changed."""
+        if self.loaded_file_path is None or self.table_model is None or self._load_worker is not None:
+            return
+        if self._reload_worker is not None:
+            self._reload_pending = True
+            return
+        self._reload_pending = False
+        from load_worker import create_workbook_reload_thread
+        self._reload_thread, self._reload_worker = create_workbook_reload_thread(
+            self.loaded_file_path, self.table_model.df, compact=self.LOAD_RECEIPT_COLUMNS_ONLY, parent=self)
+        self._reload_worker.finished.connect(self.on_reload_finished)
+        self._reload_worker.failed.connect(self.on_reload_failed)
+        self._reload_thread.start()
+
+    def _cancel_reload(self):
+        """Discards the result of a reload that is still running."""
+        self.reload_timer.stop()
+        self._reload_pending = False
+        if self._reload_worker is None:
+            return
+        self._reload_worker.finished.disconnect()
+        self._reload_worker.failed.disconnect()
+        self._reload_worker = None
+        self._reload_thread = None
+
+    def on_reload_finished(self, new_df, diff):
+        """Applies a reloaded sheet to the table, keeping selections and the search."""
+        from workbook_diff import is_empty
+        from table_filter import NameSearchIndex, KeyLookupIndex
+        self._reload_worker = None
+        self._reload_thread = None
+        model = self.table_model
+        if model is None:
+            return
+
+        if diff is None:
+            # The rows can't be matched up (no unique Transaction/Order ID, or new columns): show the new sheet
+            print("Reloaded workbook: rows could not be matched, replacing the table.")
+            self._clear_table()
+            self.on_chunk_loaded(new_df)
+            self.apply_search()
+        elif not is_empty(diff):
+            with span('table.apply_diff', 'table', removed=len(diff.removed), updated=len(diff.updated),
+                      added=len(diff.added)):
+                old_df = self.df
+                model.apply_diff(new_df, diff)
+                self.df = model.df
+                # Update the indexes from the changed rows only
+                self.key_index.apply_diff(old_df, self.df, diff)
+                if self.name_index is not None:
+                    self.name_index.apply_diff(self.df[self.STUDENT_NAME_COLUMN], diff)
+                    # Filter the new rows too (and restore the filter if the model had to be reset)
+                    self.apply_search()
+                self.update_preview()
+            print(f"Reloaded workbook: {len(diff.added)} added, {len(diff.updated)} updated, "
+                  f"{len(diff.removed)} removed (matched on '{diff.key_column}').")
+
+        if self._reload_pending:
+            self.reload_workbook()
+
+    def on_reload_failed(self, message):
+        self._reload_worker = None
+        self._reload_thread = None
+        # The file may still be being written; the next change notification tries again
+        print(f"RELOAD_ERROR: {message}", file=sys.stderr)
+        if self._reload_pending:
+            self.reload_workbook()
+
+    def clear_workbook_cache(self):
+        """Deletes the cached copies of parsed workbooks so the next upload re-reads the file."""
+        removed = workbook_cache.clear_cache()
+        QMessageBox.information(self, "Cache Cleared", f"Removed {removed} cached workbook(s).")
+
+    def on_trace_toggled(self, checked):
+        """Starts recording a timing trace, or stops and offers to save the one recorded."""
+        if checked:
+            TRACER.reset()
+            TRACER.enable()
+            return
+        TRACER.disable()
+        file_path, _ = QFileDialog.getSaveFileName(self, "Save Timing Trace", "receipt_trace.json",
+                                                   "Trace Files (*.json)")
+        if not file_path:
+            return
+        try:
+            TRACER.export(file_path)
+        except OSError as e:
+            QMessageBox.warning(self, "Trace Error", f"Could not save the timing trace:\n{e}")
+            return
+        QMessageBox.information(self, "Trace Saved",
+                                f"Saved to {file_path}.\n\nOpen it in chrome://tracing or ui.perfetto.dev.")
+
+    def closeEvent(self, event):
+        """Stops background work before the window (and its threads) are destroyed."""
+        self._closing = True
+        self.cancel_loading()
+        self._cancel_reload()
+        if self._batch_worker is not None:
+            # Stop the batch and wait for it, so no receipt reaches the print queue after it has shut down.
+            # Its remaining reports are dropped; the thread is quit directly as its finished signal is blocked.
+            self._batch_worker.blockSignals(True)
+            self._batch_worker.cancel()
+            self._batch_thread.quit()
+            self._batch_thread.wait()
+        if self.ledger_window is not None:
+            self.ledger_window.close()
+        self.preview_pane.shutdown()
+        # Let the files that were already generated reach the printer, but don't hang on an unreachable one
+        if not self.print_spooler.shutdown(wait=True, timeout=self.PRINT_SHUTDOWN_TIMEOUT):
+            print(f"PRINTING_WARNING: {self.print_spooler.pending} queued file(s) were not sent to the printer within "
+                  f"{self.PRINT_SHUTDOWN_TIMEOUT} seconds of closing and were abandoned.", file=sys.stderr)
+        # Record the spooler's last reports in the ledger before it is closed
+        QApplication.sendPostedEvents(self)
+        if self.ledger is not None:
+            self.ledger.close()
+            self.ledger = None
+        for thread in self.findChildren(QThread):
+            thread.quit()
+            thread.wait()
+        super().closeEvent(event)
+
+    # --- Selection ---
+
+    def update_selection_label(self):
+        """Shows how many rows are checked; called after every selection change."""
+        model = self.table_model
+        self.selection_label.setText(f"{model.selection.count()} selected" if model is not None else "")
+
+    def select_all_rows(self):
+        if self.table_model is not None:
+            self.table_model.select_all()
+
+    def select_shown_rows(self):
+        """Checks every row the search currently shows (adding to the selection)."""
+        if self.table_model is None:
+            return
+        rows = self.filter_proxy.visible_source_rows()
+        if rows is None:
+            self.table_model.select_all()
         else:
-            self.selected_rows.discard(row_index)
+            self.table_model.select_rows(rows)
+
+    def invert_selection(self):
+        """Inverts the selection of the rows the search shows (every row without a search)."""
+        if self.table_model is not None:
+            self.table_model.invert_selection(self.filter_proxy.visible_source_rows())
+
+    def clear_selection(self):
+        if self.table_model is not None:
+            self.table_model.clear_selection()
+
+    def _fill_value_menu(self, menu, column):
+        """Lists a column's distinct values in a menu; picking one checks every row with that value."""
+        menu.clear()
+        if self.df is None or column not in self.df.columns:
+            menu.addAction(f"No '{column}' column").setEnabled(False)
+            return
+        values = self.df[column].dropna().unique()
+        for value in sorted(values, key=str)[:self.MAX_MENU_VALUES]:
+            menu.addAction(str(value), lambda value=value: self.table_model.select_matching(column, value))
 
     def on_search_text_changed(self, text):
         """
         Called when the text in the search bar changes.
-        Filters the table based on the new text.
+        Restarts the debounce timer so the search runs once typing pauses.
         """
+        self.search_timer.start()
+
+    def apply_search(self):
+        """Filters the table to the rows whose name matches the search bar text."""
         # Only filter if the name column was successfully found on upload
-        if self.name_column_table_index > 0:
-            filter_table_by_name(self.table_widget, text, name_column_index=self.name_column_table_index)
+        if self.name_index is None:
+            return
+        text = self.search_bar.text()
+        with span('filter.search', 'filter', query_length=len(text)):
+            self.filter_proxy.set_visible_rows(self.name_index.match(text) if text else None)
+
+    # --- Receipt Preview ---
+
+    def update_preview(self, *args):
+        """Previews the current row's receipt and queues its neighbours' for the background."""
+        current = self.table_widget.currentIndex()
+        if not self.preview_pane.isVisible() or self.table_model is None or self.df is None:
+            return
+        if not current.isValid():
+            self.preview_pane.clear()
+            return
+        proxy_row = current.row()
+        proxy_rows = self.filter_proxy.rowCount()
+        neighbours = []
+        for distance in range(1, self.PREVIEW_PREFETCH_ROWS + 1):
+            # The next rows first: that is the usual direction of travel
+            for row in (proxy_row + distance, proxy_row - distance):
+                if 0 <= row < proxy_rows:
+                    neighbours.append(self.filter_proxy.mapToSource(self.filter_proxy.index(row, 0)).row())
+        source_row = self.filter_proxy.mapToSource(current).row()
+        with span('preview.show', 'render'):
+            self.preview_pane.show_receipt(self.df.iloc[source_row], [self.df.iloc[row] for row in neighbours])
+
+    def on_preview_toggled(self, checked):
+        self.preview_pane.setVisible(checked)
+        if checked:
+            self.update_preview()
+
+    # --- Scanner Lookup ---
+
+    def lookup_scanned_key(self):
+        """
+        Jumps to the row whose admission number, transaction ID or order ID was
+        scanned or typed into the lookup bar (one dict lookup, however large the sheet).
+
+        A single exact match is selected, and printed if "Print on Scan" is ticked.
+        Several exact matches are shown in the table; with no exact match the
+        closest identifiers and names are shown instead.
+        """
+        text = self.lookup_bar.text().strip()
+        # Leave the code visible; the next scan replaces it
+        self.lookup_bar.selectAll()
+        if not text or self.key_index is None:
+            return
+        with span('lookup.key', 'filter'):
+            rows = self.key_index.lookup(text)
+
+        if len(rows) == 1:
+            row = int(rows[0])
+            if not self.filter_proxy.accepts_source_row(row):
+                self._show_rows(None)
+            self._select_table_row(row)
+            self.lookup_status_label.setText(f"Row {row + 1}")
+            if self.print_on_scan_checkbox.isChecked():
+                self._print_scanned_row(row)
+            return
+
+        if len(rows):
+            status = f"{len(rows)} rows match '{text}'"
+            if self.print_on_scan_checkbox.isChecked():
+                status += " (not printed)"
+        else:
+            with span('lookup.fuzzy', 'filter', rows=len(self.key_index)):
+                rows = self.key_index.closest(text)
+            if not len(rows):
+                self.lookup_status_label.setText(f"No match for '{text}'")
+                return
+            status = f"No exact match for '{text}'; showing {len(rows)} similar row(s)"
+        self._show_rows(rows)
+        self._select_table_row(int(rows[0]))
+        self.lookup_status_label.setText(status)
+
+    def _show_rows(self, rows):
+        """Shows only the given source rows (None for every row), clearing the name search."""
+        self.search_timer.stop()
+        self.search_bar.blockSignals(True)
+        self.search_bar.clear()
+        self.search_bar.blockSignals(False)
+        self.filter_proxy.set_visible_rows(rows)
+
+    def _select_table_row(self, row):
+        """Highlights a source row and scrolls it into view."""
+        index = self.filter_proxy.mapFromSource(self.table_model.index(row, 0))
+        if not index.isValid():
+            return
+        self.table_widget.selectRow(index.row())
+        self.table_widget.scrollTo(index, QAbstractItemView.PositionAtCenter)
+
+    def _print_scanned_row(self, row):
+        """Prints the receipt of a scanned row into the folder chosen for this scanning session."""
+        if self._scan_save_dir is None or not os.path.isdir(self._scan_save_dir):
+            save_dir = QFileDialog.getExistingDirectory(self, "Select Directory to Save Scanned Receipts")
+            if not save_dir:
+                return
+            self._scan_save_dir = save_dir
+        self.print_single_receipt(row, save_dir=self._scan_save_dir)
+        self.lookup_bar.setFocus()
+
+    def on_print_on_scan_toggled(self, checked):
+        # Ask for the folder again each time printing on scan is switched on
+        self._scan_save_dir = None
+        self.lookup_bar.setFocus()
 
     def _print_file(self, filepath):
         """
-        Sends a file to the default printer. If direct printing fails,
-        it logs the error to the terminal and opens the file for manual printing.
+        Queues a file for the default printer. Printing happens in the background;
+        files that still fail after the spooler's retries are listed by
+        show_print_failures.
         """
-        try:
-            if sys.platform == "win32":
-                # Use the default Windows shell command for printing.
-                os.startfile(filepath, "print")
-            elif sys.platform == "darwin":  # macOS
-                # lp is the standard printing command on macOS.
-                subprocess.run(["lp", filepath], check=True)
-            elif sys.platform.startswith("linux"):  # Linux
-                subprocess.run(["lp", filepath], check=True)
-            else:
-                raise NotImplementedError(f"Automatic printing not supported on {sys.platform}")
+        if self._closing:
+            # The print queue is shutting down with the window; the PDF stays on disk
+            return
+        self.print_spooler.submit(filepath)
+        self.update_print_status()
+
+    def update_print_status(self):
+        """Shows the print queue depth and failures below the print button."""
+        pending = self.print_spooler.pending
+        failed = sum(len(failure.files) for failure in self.print_spooler.failures)
+        parts = []
+        if pending:
+            parts.append(f"Print queue: {pending} file(s) pending")
+        if failed:
+            parts.append(f"{failed} file(s) failed to print")
+        self.print_status_label.setText(" \u2022 ".join(parts))
+        self.show_print_failures_button.setVisible(bool(failed))
 
-        except Exception as e:
-            # Automatic printing failed. Log the error to the terminal.
-            print(f"PRINTING_ERROR: Could not print '{os.path.basename(filepath)}' automatically. Reason: {e}", file=sys.stderr)
-            print("INFO: Fallback - attempting to open file for manual printing.", file=sys.stderr)
+    def show_print_failures(self):
+        """Lists the files that could not be printed and offers to open their folder for manual printing."""
+        failures = self.print_spooler.failures
+        if not failures:
+            return
+        files = [file_path for failure in failures for file_path in failure.files]
+        details = "\n".join(f"{os.path.basename(failure.files[0])}"
+                            f"{f' (+{len(failure.files) - 1} more)' if len(failure.files) > 1 else ''}: {failure.error}"
+                            for failure in failures[:10])
+        answer = QMessageBox.question(self, "Printing Failed",
+                                      f"{len(files)} file(s) could not be printed automatically:\n\n{details}\n\n"
+                                      "Open the folder containing them to print manually?",
+                                      QMessageBox.Open | QMessageBox.Close)
+        self.print_spooler.clear_failures()
+        self.update_print_status()
+        if answer == QMessageBox.Open:
+            folder = os.path.dirname(files[0])
             try:
-                # Cross-platform fallback to open the file in the default viewer.
+                # Cross-platform fallback to open the folder in the file manager.
                 if sys.platform == "win32":
-                    os.startfile(filepath)
+                    os.startfile(folder)
                 elif sys.platform == "darwin":
-                    subprocess.run(["open", filepath], check=True)
+                    subprocess.run(["open", folder], check=True)
                 else: # linux and other unix
-                    subprocess.run(["xdg-open", filepath], check=True)
+                    subprocess.run(["xdg-open", folder], check=True)
             except Exception as open_e:
-                # If opening the file also fails, log that critical error to the terminal.
-                print(f"CRITICAL_ERROR: Could not open '{filepath}' for manual printing. Reason: {open_e}", file=sys.stderr)
+                print(f"CRITICAL_ERROR: Could not open '{folder}' for manual printing. Reason: {open_e}", file=sys.stderr)
 
-    def print_single_receipt(self, row_index):
+    def print_single_receipt(self, row_index, save_dir=None):
         """Wrapper to call the individual receipt printing logic from the new file."""
+        from individual_printer import print_single_receipt_from_df
+        from receipt_schema import cell_text
+
+        def print_generated(file_path):
+            self._file_transactions[file_path] = [cell_text(self.df.iloc[row_index].get('Transaction ID'))]
+            self._record_receipt_event([file_path], 'generated')
+            self._print_file(file_path)
+
         print_single_receipt_from_df(
             parent=self,
             df=self.df,
             row_index=row_index,
             student_name_column=self.STUDENT_NAME_COLUMN,
-            print_file_handler=self._print_file
+            print_file_handler=print_generated,
+            save_dir=save_dir
         )
 
     def print_receipts(self):
-        """Converts selected row data into individual PDF receipts, saves, and prints them."""
+        """
+        Converts selected row data into PDF receipts, saves, and prints them.
+
+        Depending on the output mode, each receipt becomes its own PDF (generated in
+        parallel) or a page of one combined PDF that is printed as a single job.
+        """
         if self.df is None or self.df.empty:
             QMessageBox.warning(self, "No Data", "Please upload an Excel file first.")
             return
 
-        if not self.selected_rows:
+        selection = self.table_model.selection
+        if not selection.count():
             QMessageBox.information(self, "No Selection", "Please select one or more rows using the checkboxes.")
             return
 
-        # Ask user for a directory to save the files
-        save_dir = QFileDialog.getExistingDirectory(self, "Select Directory to Save Receipts")
-
-        if not save_dir:  # User cancelled the dialog
-            return
-
         # Filter the selected rows to only include those currently visible
-        visible_selected_rows = {
-            row_idx for row_idx in self.selected_rows
-            if not self.table_widget.isRowHidden(row_idx)
-        }
+        selected_rows = selection.rows()
+        visible_selected_rows = selected_rows[self.filter_proxy.accepts_source_rows(selected_rows)]
 
-        if not visible_selected_rows:
+        if not len(visible_selected_rows):
             QMessageBox.information(self, "No Visible Selection",
                                     "You have selected rows, but they are hidden by the current search filter.\n\n"
                                     "Please clear the search or change the filter to print receipts.")
             return
 
-        selected_df = self.df.iloc[sorted(list(visible_selected_rows))]
+        self._print_frame(self.df.iloc[visible_selected_rows])
 
-        success_count = 0
-        error_count = 0
+    def _print_frame(self, selected_df, clear_selection=True):
+        """
+        Formats and checks the receipts of selected_df, asks where to save them, then
+        generates and prints them in the chosen output mode. Rows that fail the checks
+        (see receipt_prepare) are listed first, and can be skipped.
 
-        for index, row in selected_df.iterrows():
-            # Create a filename from the student's name using the class constant
-            if self.STUDENT_NAME_COLUMN in row and pd.notna(row[self.STUDENT_NAME_COLUMN]):
-                student_name = str(row[self.STUDENT_NAME_COLUMN])
-                # Sanitize the name to make it a valid filename by removing invalid characters.
-                # This keeps letters, numbers, spaces, and underscores.
-                sanitized_name = "".join(c for c in student_name if c.isalnum() or c in (' ', '_')).rstrip()
-                # Add the original index to ensure the filename is unique.
-                file_name = f"receipt_{sanitized_name}_{index}.pdf"
-            else:
-                # Fallback to the old naming scheme if the name column is missing or empty.
-                file_name = f"receipt_{index}.pdf"
+        Args:
+            selected_df (pd.DataFrame): One row per receipt; the index keeps file names unique.
+            clear_selection (bool): Uncheck the table's rows once the batch is done.
+        """
+        if self._batch_worker is not None:
+            QMessageBox.information(self, "Printing in Progress", "Please wait for the current receipts to finish.")
+            return
 
-            full_path = os.path.join(save_dir, file_name)
+        # Format every receipt in one pass, and catch the rows that shouldn't get one before anything is written
+        from receipt_prepare import prepare_receipts
+        with span('batch.prepare', 'batch', rows=len(selected_df)):
+            prepared = prepare_receipts(selected_df)
+        receipts = prepared.values
+        if prepared.problems:
+            skip_invalid = self._confirm_invalid_rows(prepared)
+            if skip_invalid is None:
+                return
+            if skip_invalid:
+                keep = [position for position in range(len(receipts)) if position not in prepared.problems]
+                if not keep:
+                    QMessageBox.information(self, "Nothing to Print", "None of the selected rows can be printed.")
+                    return
+                selected_df = selected_df.iloc[keep]
+                receipts = [receipts[position] for position in keep]
 
-            if create_receipt_pdf(row, full_path):
-                success_count += 1
-                self._print_file(full_path)
-            else:
-                error_count += 1
+        output_mode = self.output_mode_combo.currentData()
+        if output_mode == self.OUTPUT_BATCH_PDF:
+            # Ask user where to save the combined document
+            save_path, _ = QFileDialog.getSaveFileName(self, "Save Receipts As", "receipts.pdf", "PDF Files (*.pdf)")
+        elif output_mode == self.OUTPUT_ZIP_ARCHIVE:
+            save_path, _ = QFileDialog.getSaveFileName(self, "Save Receipts As", "receipts.zip", "ZIP Archives (*.zip)")
+        else:
+            # Ask user for a directory to save the files
+            save_path = QFileDialog.getExistingDirectory(self, "Select Directory to Save Receipts")
+
+        if not save_path:  # User cancelled the dialog
+            return
+
+        self._clear_selection_after_batch = clear_selection
+        self._batch_archive_path = None
+        if output_mode == self.OUTPUT_BATCH_PDF:
+            self._start_batch_document(selected_df, receipts, save_path)
+        elif output_mode == self.OUTPUT_ZIP_ARCHIVE:
+            self._start_zip_archive(selected_df, receipts, save_path)
+        else:
+            self._start_separate_receipts(selected_df, receipts, save_path)
+
+    def _confirm_invalid_rows(self, prepared):
+        """
+        Lists the selected rows that failed validation and asks what to do with them.
+
+        Returns:
+            bool | None: True to skip them, False to print them anyway, None to cancel.
+        """
+        from receipt_prepare import describe_problems
+        count = len(prepared.problems)
+        details = describe_problems(prepared, limit=self.INVALID_ROWS_SHOWN)
+        if count > len(details):
+            details.append(f"... and {count - len(details)} more")
+        box = QMessageBox(QMessageBox.Warning, "Check Receipts",
+                          f"{count} of {len(prepared.values)} selected receipt(s) have problems:\n\n" + "\n".join(details),
+                          parent=self)
+        skip_button = box.addButton("Skip Invalid Rows", QMessageBox.AcceptRole)
+        print_all_button = box.addButton("Print All", QMessageBox.DestructiveRole)
+        box.addButton(QMessageBox.Cancel)
+        box.setDefaultButton(skip_button)
+        box.exec_()
+        if box.clickedButton() is skip_button:
+            return True
+        if box.clickedButton() is print_all_button:
+            return False
+        return None
+
+    def _transaction_ids(self, selected_df):
+        """The Transaction ID of each selected row as text ('' where there is none), for the ledger."""
+        from receipt_schema import cell_text
+        if 'Transaction ID' not in selected_df.columns:
+            return [''] * len(selected_df)
+        return [cell_text(value) for value in selected_df['Transaction ID'].tolist()]
+
+    def _show_batch_progress(self, label, maximum):
+        """Opens the modal progress dialog shared by both output modes."""
+        self.print_receipts_button.setEnabled(False)
+        self.batch_progress = QProgressDialog(label, "Cancel", 0, maximum, self)
+        self.batch_progress.setWindowTitle("Print Receipt(s)")
+        self.batch_progress.setWindowModality(Qt.WindowModal)
+        self.batch_progress.setMinimumDuration(0)
+        self.batch_progress.setAutoClose(False)
+        self.batch_progress.setAutoReset(False)
+
+    def _start_separate_receipts(self, selected_df, receipts, save_dir):
+        """Generates one PDF per selected row in parallel and prints each as it is ready."""
+        from pdf_generator import receipt_file_names
+        from receipt_batch import default_worker_count
+        from receipt_cache import ReceiptManifest
+        from receipt_worker import create_receipt_batch_thread
+        # Build the jobs up front; the worker processes only receive tuples of prepared strings
+        file_paths = [os.path.join(save_dir, name) for name in receipt_file_names(selected_df, self.STUDENT_NAME_COLUMN)]
+        jobs = list(zip(selected_df.index, receipts, file_paths))
+        for file_path, transaction_id in zip(file_paths, self._transaction_ids(selected_df)):
+            self._file_transactions[file_path] = [transaction_id]
+        # Small batches are not worth starting a process pool for
+        max_workers = min(default_worker_count(), max(1, len(jobs) // 4))
+
+        self._batch_failures = []
+        self._batch_reused = 0
+        self._batch_started_us = now_us()
+        self._show_batch_progress("Generating receipts...", len(jobs))
+
+        self._batch_thread, self._batch_worker = create_receipt_batch_thread(
+            jobs, max_workers, manifest=ReceiptManifest(save_dir), parent=self)
+        self._batch_worker.receipt_done.connect(self.on_receipt_done)
+        self._batch_worker.finished.connect(self.on_batch_finished)
+        self.batch_progress.canceled.connect(self._batch_worker.cancel)
+        self._batch_thread.start()
+
+    def _start_zip_archive(self, selected_df, receipts, archive_path):
+        """
+        Generates the selected receipts in memory, in parallel, and streams them into one
+        ZIP archive under their usual file names. Nothing is printed.
+        """
+        from pdf_generator import receipt_file_names
+        from receipt_batch import default_worker_count
+        from receipt_sink import ZipSink
+        from receipt_worker import create_receipt_batch_thread
+        try:
+            sink = ZipSink(archive_path)
+        except OSError as e:
+            QMessageBox.warning(self, "Archive Error", f"Could not create the archive:\n{e}")
+            return
+        # Each job's "file path" is the receipt's name inside the archive
+        names = receipt_file_names(selected_df, self.STUDENT_NAME_COLUMN)
+        jobs = list(zip(selected_df.index, receipts, names))
+        for name, transaction_id in zip(names, self._transaction_ids(selected_df)):
+            self._file_transactions[name] = [transaction_id]
+        max_workers = min(default_worker_count(), max(1, len(jobs) // 4))
+
+        self._batch_failures = []
+        self._batch_reused = 0
+        self._batch_archive_path = archive_path
+        self._batch_archived = []
+        self._batch_started_us = now_us()
+        self._show_batch_progress("Generating receipts...", len(jobs))
+
+        self._batch_thread, self._batch_worker = create_receipt_batch_thread(jobs, max_workers, sink=sink, parent=self)
+        self._batch_worker.receipt_done.connect(self.on_receipt_done)
+        self._batch_worker.finished.connect(self.on_batch_finished)
+        self.batch_progress.canceled.connect(self._batch_worker.cancel)
+        self._batch_thread.start()
+
+    def _start_batch_document(self, selected_df, receipts, file_path):
+        """Writes every selected row as a page of one PDF, then prints it as a single job."""
+        from receipt_cache import ReceiptManifest
+        from receipt_worker import create_batch_document_thread
+        self._batch_file_path = file_path
+        if 'Transaction ID' in selected_df.columns:
+            self._file_transactions[file_path] = self._transaction_ids(selected_df)
+        self._batch_started_us = now_us()
+        self._show_batch_progress("Writing receipts...", len(receipts))
+
+        self._batch_thread, self._batch_worker = create_batch_document_thread(
+            receipts, file_path, manifest=ReceiptManifest(os.path.dirname(file_path)),
+            parent=self)
+        self._batch_worker.progress.connect(self.batch_progress.setValue)
+        self._batch_worker.finished.connect(self.on_batch_document_finished)
+        self.batch_progress.canceled.connect(self._batch_worker.cancel)
+        self._batch_thread.start()
+
+    def on_batch_document_finished(self, ok, cancelled):
+        """Prints the combined document once it has been written."""
+        TRACER.add_complete('batch.document', self._batch_started_us, now_us() - self._batch_started_us, 'batch',
+                            receipts=self.batch_progress.maximum(), ok=ok, cancelled=cancelled)
+        self.batch_progress.close()
+        self.print_receipts_button.setEnabled(True)
+        self._batch_worker = None
+        self._batch_thread = None
+
+        if ok:
+            print(f"PDF Generation Complete. Saved: {os.path.basename(self._batch_file_path)}")
+            self._record_receipt_event([self._batch_file_path], 'generated')
+            self._print_file(self._batch_file_path)
+            self._clear_printed_selection()
+        else:
+            self._file_transactions.pop(self._batch_file_path, None)
+            if not cancelled:
+                QMessageBox.warning(self, "PDF Error", "Failed to create the combined PDF.")
+
+    def on_receipt_done(self, result):
+        """Called for each receipt of a batch as soon as its PDF is generated (or fails)."""
+        if result.ok and self._batch_archive_path is not None:
+            # Written into the archive; it is recorded once the archive is complete
+            self._batch_archived.append(result.file_path)
+        elif result.ok:
+            self._record_receipt_event([result.file_path], 'generated')
+            self._print_file(result.file_path)
+            if result.cached:
+                self._batch_reused += 1
+        else:
+            self._file_transactions.pop(result.file_path, None)
+            self._batch_failures.append(result)
+        done = self.batch_progress.value() + 1
+        self.batch_progress.setValue(done)
+        self.batch_progress.setLabelText(f"Generated {done - len(self._batch_failures)} of {self.batch_progress.maximum()} "
+                                         f"receipt(s) ({self._batch_reused} unchanged), "
+                                         f"{len(self._batch_failures)} failed")
+
+    def on_batch_finished(self, success_count, error_count, cancelled):
+        """Closes the progress dialog and reports the outcome of a batch."""
+        TRACER.add_complete('batch.receipts', self._batch_started_us, now_us() - self._batch_started_us, 'batch',
+                            success=success_count, failed=error_count, cancelled=cancelled)
+        self.batch_progress.close()
+        self.print_receipts_button.setEnabled(True)
+        self._batch_worker = None
+        self._batch_thread = None
 
         # Provide feedback to the user
-        print(f"PDF Generation Complete. Success: {success_count}, Failed: {error_count}")
+        print(f"PDF Generation Complete. Success: {success_count} ({self._batch_reused} reused), Failed: {error_count}"
+              + (" (cancelled)" if cancelled else ""))
+        if self._batch_archive_path is not None:
+            self._finish_zip_archive(success_count, error_count, cancelled)
+        elif self._batch_failures:
+            details = "\n".join(f"{os.path.basename(r.file_path)}: {r.error}" for r in self._batch_failures[:10])
+            QMessageBox.warning(self, "Some Receipts Failed",
+                                f"{error_count} receipt(s) could not be generated:\n\n{details}")
+
+        self._clear_printed_selection()
+
+    def _finish_zip_archive(self, success_count, error_count, cancelled):
+        """Reports a ZIP archive batch and records its receipts in the ledger."""
+        archive_path = self._batch_archive_path
+        names, self._batch_archived = self._batch_archived, []
+        self._batch_archive_path = None
+        transaction_ids = [transaction_id for name in names
+                           for transaction_id in self._file_transactions.pop(name, [])]
+        if cancelled:
+            return
+        if success_count:
+            print(f"Saved {success_count} receipt(s) to {archive_path}")
+            ledger = self._receipt_ledger() if transaction_ids else None
+            if ledger is not None:
+                ledger.record_event(transaction_ids, 'generated', archive_path)
+                if self.ledger_window is not None and self.ledger_window.isVisible():
+                    self.ledger_window.refresh_receipt_status()
+        if error_count:
+            details = "\n".join(f"{r.file_path}: {r.error}" for r in self._batch_failures[:10])
+            QMessageBox.warning(self, "Some Receipts Failed",
+                                f"{error_count} receipt(s) could not be written to {os.path.basename(archive_path)}"
+                                + (f":\n\n{details}" if details else ".\nSee the console output for details."))
+
+    def _clear_printed_selection(self):
+        """Unselects all checkboxes after a print operation is complete."""
+        if not self._clear_selection_after_batch:
+            return
+        # One bulk update instead of a signal per checked row
+        self.clear_selection()
+
+    # --- Receipts ledger ---
+
+    def _receipt_ledger(self):
+        """Returns the ReceiptLedger, opening it on first use; None if it cannot be opened."""
+        if self.ledger is None:
+            import sqlite3
+            from receipt_ledger import ReceiptLedger
+            try:
+                self.ledger = ReceiptLedger()
+            except (OSError, sqlite3.Error) as e:
+                print(f"LEDGER_WARNING: Could not open the receipts ledger. Reason: {e}", file=sys.stderr)
+                return None
+        return self.ledger
+
+    def open_ledger(self):
+        """Shows the receipts ledger window, where workbooks are imported and payments looked up."""
+        if self.ledger_window is None:
+            ledger = self._receipt_ledger()
+            if ledger is None:
+                QMessageBox.critical(self, "Ledger Error", "Could not open the receipts ledger.\n"
+                                                           "See the console output for details.")
+                return
+            from ledger_view import LedgerWindow
+            self.ledger_window = LedgerWindow(ledger, self.print_ledger_receipts, parent=self)
+        self.ledger_window.show()
+        self.ledger_window.raise_()
+        self.ledger_window.activateWindow()
+
+    def print_ledger_receipts(self, records_df):
+        """Prints receipts chosen in the ledger window, leaving the table's selection alone."""
+        self._print_frame(records_df, clear_selection=False)
+
+    def _record_receipt_event(self, files, event):
+        """
+        Records in the ledger that the receipts in these files were generated, printed or failed to print.
+
+        Files that were printed (or failed) are forgotten; a reprint registers them again.
+        """
+        recorded = False
+        for file_path in files:
+            if event == 'generated':
+                transaction_ids = self._file_transactions.get(file_path)
+            else:
+                transaction_ids = self._file_transactions.pop(file_path, None)
+            ledger = self._receipt_ledger() if transaction_ids else None
+            if ledger is not None:
+                ledger.record_event(transaction_ids, event, file_path)
+                recorded = True
+        if not recorded:
+            return
+        if self.ledger_window is not None and self.ledger_window.isVisible():
+            self.ledger_window.refresh_receipt_status()
 
-        # Unselect all checkboxes after the operation is complete.
-        # We iterate over a copy of the set because unchecking the box will
-        # trigger on_selection_changed, which modifies the set.
-        for row_index in list(self.selected_rows):
-            checkbox = self.table_widget.cellWidget(row_index, 0)
-            if checkbox:
-                checkbox.setChecked(False)
+def _report_startup(window, app):
+    """For --measure-startup: prints the startup time as JSON once the window is painted, then quits."""
+    if window.startup_ms is None:
+        QTimer.singleShot(10, lambda: _report_startup(window, app))
+        return
+    heavy = [name for name in ('pandas', 'reportlab', 'openpyxl') if name in sys.modules]
+    print(json.dumps({'first_paint_ms': round(window.startup_ms, 1), 'heavy_modules_loaded': heavy}))
+    app.quit()
 
 
 if __name__ == '__main__': 
+    # Needed for the receipt worker processes in the frozen (PyInstaller) build
+    multiprocessing.freeze_support()
+    # --measure-startup prints how long the first window took to appear and exits
+    measure_startup = '--measure-startup' in sys.argv
     app = QApplication(sys.argv) 
-    window = MainWindow() 
+    window = MainWindow(preload=not measure_startup) 
     window.show() 
+    if measure_startup:
+        _report_startup(window, app)
     sys.exit(app.exec())
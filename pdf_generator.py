@@ -1,13 +1,18 @@
 import os
 import sys
+import threading
 import pandas as pd
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Image
-from reportlab.lib.styles import getSampleStyleSheet
+from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Flowable, PageBreak
+from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib.units import inch
 from reportlab.lib.enums import TA_CENTER
 from reportlab.platypus import Table, TableStyle
 from reportlab.lib import colors
 from reportlab.lib.pagesizes import letter
+from reportlab.pdfgen import canvas
+from reportlab import rl_config
+from receipt_schema import RECEIPT_FIELDS, cell_text
+from instrumentation import TRACER, span
 
 
 # --- Configuration ---
@@ -20,77 +25,155 @@ def resource_path(relative_path):
 LOGO_LEFT_PATH = resource_path('Jims_logo.jpg')
 LOGO_CENTER_PATH = resource_path('Jims_name.jpg') 
 
+# Bump this whenever the receipt layout changes, so cached receipts are generated again.
+TEMPLATE_VERSION = 1
 
-def create_receipt_pdf(data_row: pd.Series, file_path: str):
+# (width, height) of the logos on a receipt
+LOGO_LEFT_SIZE = (1.4 * inch, 1 * inch)
+LOGO_CENTER_SIZE = (3.6 * inch, 1.5 * inch)
+
+
+def receipt_field_values(data_row):
     """
-    Creates a single PDF receipt from a row of data.
+    Returns the receipt's values as strings, using 'N/A' for columns that are missing or empty.
+
+    A tuple is taken to be values already formatted by receipt_prepare.prepare_receipts
+    and is returned as it is.
+    """
+    if isinstance(data_row, tuple):
+        return list(data_row)
+    return [cell_text(data_row.get(field), missing='N/A') for field in RECEIPT_FIELDS]
+
+
+def receipt_file_name(data_row, index, student_name_column: str = 'Name'):
+    """
+    Builds the PDF file name for a receipt from the student's name and the row index.
 
     Args:
-        data_row (pd.Series): The data for one receipt.
-        file_path (str): The full path where the PDF will be saved.
+        data_row (pd.Series | dict): The data for one receipt.
+        index: The original DataFrame index of the row, which keeps names unique.
+        student_name_column (str): The name of the column containing student names.
+    """
+    if student_name_column in data_row and pd.notna(data_row[student_name_column]):
+        student_name = str(data_row[student_name_column])
+        # Sanitize the name to make it a valid filename by removing invalid characters.
+        # This keeps letters, numbers, spaces, and underscores.
+        sanitized_name = "".join(c for c in student_name if c.isalnum() or c in (' ', '_')).rstrip()
+        # Add the original index to ensure the filename is unique.
+        return f"receipt_{sanitized_name}_{index}.pdf"
+    # Fallback to the old naming scheme if the name column is missing or empty.
+    return f"receipt_{index}.pdf"
 
-    Returns:
-        bool: True if successful, False otherwise.
+
+def receipt_file_names(df, student_name_column: str = 'Name'):
+    """receipt_file_name() for every row of a DataFrame, in order, without building a row object per receipt."""
+    names = df[student_name_column].tolist() if student_name_column in df.columns else [None] * len(df)
+    return [receipt_file_name({student_name_column: name}, index, student_name_column)
+            for index, name in zip(df.index, names)]
+
+
+class _LogoImage(Flowable):
+    """Draws a logo file at a fixed size."""
+
+    def __init__(self, logo, width, height):
+        super().__init__()
+        self.logo = logo
+        self.width = width
+        self.height = height
+
+    def wrap(self, availWidth, availHeight):
+        return self.width, self.height
+
+    def draw(self):
+        _draw_logo(self.canv, self.logo, 0, 0, self.width, self.height)
+
+
+# _draw_logo changes rl_config while it draws, so logos are drawn one at a time
+_draw_lock = threading.Lock()
+
+
+def _draw_logo(canv, logo, x, y, width, height):
     """
-    try:
-        doc = SimpleDocTemplate(file_path, pagesize=letter, rightMargin=inch, leftMargin=inch, topMargin=inch, bottomMargin=inch)
-        styles = getSampleStyleSheet()
+    Draws a logo file on a canvas.
+
+    A JPEG is copied into the PDF as it is, without being decoded, and drawImage
+    embeds a file once per document and reuses it on every later page, so a
+    multi-page document holds one copy.
+    """
+    with _draw_lock:
+        # Embed the logo as binary instead of ASCII85 text, which was most of a receipt's
+        # save time; every PDF reader takes binary. Other reportlab output keeps the setting.
+        use_a85 = rl_config.useA85
+        rl_config.useA85 = 0
+        try:
+            canv.drawImage(logo, x, y, width=width, height=height)
+        finally:
+            rl_config.useA85 = use_a85
 
-        flowables = []
 
-        # --- Add Header with Logos ---
-        logo_left = Image(LOGO_LEFT_PATH, width=1.4*inch, height=1*inch) if os.path.exists(LOGO_LEFT_PATH) else ""
-        logo_center = Image(LOGO_CENTER_PATH, width=3.6*inch, height=1.5*inch) if os.path.exists(LOGO_CENTER_PATH) else ""
-
-        # Use a three-column table for left and center alignment.
-        # The third column is an empty placeholder to balance the layout.
-        header_data = [[logo_left, logo_center, ""]]
-
-        # Define column widths. The center column takes up the remaining space.
-        # The left and right columns act as margins.
-        side_width = 2 * inch
-        center_width = doc.width - (2 * side_width)
-
-        header_table = Table(header_data, colWidths=[side_width, center_width, side_width])
-        header_table.setStyle(TableStyle([
-            # Align the left image to the left of its cell
-            ('ALIGN', (0, 0), (0, 0), 'LEFT'),
-            # Align the center image to the center of its cell
-            ('ALIGN', (1, 0), (1, 0), 'CENTER'),
-            # Vertically align all images to the middle
-            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-        ]))
+def _load_logo(path):
+    """Returns the logo's path, or None if the file is missing."""
+    return path if os.path.exists(path) else None
 
+
+class ReceiptTemplate:
+    """
+    The fixed parts of a receipt: styles, logos and the header layout.
+
+    Build one per batch and pass it to create_receipt_pdf, so each receipt only
+    fills in the field values.
+
+    This is the platypus renderer: every receipt is laid out by reportlab's
+    flowable engine. A renderer is any object with build() and build_many()
+    as below (see RENDERERS).
+    """
+    name = 'platypus'
+
+    def __init__(self, logo_left_path: str = LOGO_LEFT_PATH, logo_center_path: str = LOGO_CENTER_PATH,
+                 pagesize=letter, margin=inch):
+        self.pagesize = pagesize
+        self.margin = margin
+        # The flowables below are shared, so only one receipt can be laid out at a time
+        self._lock = threading.Lock()
+
+        styles = getSampleStyleSheet()
+        # Derive the title style instead of changing the sample style sheet's own h1
+        self.title_style = ParagraphStyle('ReceiptTitle', parent=styles['h1'], alignment=TA_CENTER)
+
+        # --- Header with Logos ---
+        self.logo_left = _load_logo(logo_left_path)
+        self.logo_center = _load_logo(logo_center_path)
+        logo_left = _LogoImage(self.logo_left, *LOGO_LEFT_SIZE) if self.logo_left else ""
+        logo_center = _LogoImage(self.logo_center, *LOGO_CENTER_SIZE) if self.logo_center else ""
+
+        self.header_flowables = []
         # Only add the header table if at least one logo exists
         if logo_left or logo_center:
-            flowables.append(header_table)
-            flowables.append(Spacer(1, 0.25 * inch))
+            # Use a three-column table for left and center alignment.
+            # The third column is an empty placeholder to balance the layout.
+            header_data = [[logo_left, logo_center, ""]]
 
-        # Title
-        title_style = styles['h1']
-        title_style.alignment = TA_CENTER
-        flowables.append(Paragraph("Fee Receipt", title_style))
-        flowables.append(Spacer(1, 0.25 * inch))
-
-        # --- New Table Format ---
-        # IMPORTANT: These column names must exactly match the headers in your Excel file.
-        receipt_fields = [
-            'Name', 'Admission Number', 'Class', 'Bank Reference ID',
-            'Order ID', 'Transaction ID', 'Status', 'Amount', 'Date'
-        ]
+            # Define column widths. The center column takes up the remaining space.
+            # The left and right columns act as margins.
+            side_width = 2 * inch
+            center_width = (pagesize[0] - 2 * margin) - (2 * side_width)
 
-        # Prepare data for the table: a list of [label, value] pairs
-        table_data = []
-        for field in receipt_fields:
-            # Safely get the value, using 'N/A' if the column doesn't exist in the data
-            value = data_row.get(field, 'N/A')
-            table_data.append([field, str(value)])
+            header_table = Table(header_data, colWidths=[side_width, center_width, side_width])
+            header_table.setStyle(TableStyle([
+                # Align the left image to the left of its cell
+                ('ALIGN', (0, 0), (0, 0), 'LEFT'),
+                # Align the center image to the center of its cell
+                ('ALIGN', (1, 0), (1, 0), 'CENTER'),
+                # Vertically align all images to the middle
+                ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+            ]))
+            self.header_flowables += [header_table, Spacer(1, 0.25 * inch)]
 
-        # Create the table with specified column widths
-        receipt_table = Table(table_data, colWidths=[2 * inch, 4 * inch])
+        # Title
+        self.header_flowables += [Paragraph("Fee Receipt", self.title_style), Spacer(1, 0.25 * inch)]
 
-        # Define and apply a professional table style
-        style = TableStyle([
+        # --- Field Table Style ---
+        self.table_style = TableStyle([
             ('ALIGN', (0, 0), (0, -1), 'LEFT'),          # Left-align the labels (first column)
             ('ALIGN', (1, 0), (1, -1), 'LEFT'),          # Left-align the values (second column)
             ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'), # Bold the labels
@@ -98,13 +181,278 @@ def create_receipt_pdf(data_row: pd.Series, file_path: str):
             ('TOPPADDING', (0, 0), (-1, -1), 8),         # Add padding to all cells
             ('GRID', (0, 0), (-1, -1), 1, colors.black)  # Add a grid to all cells
         ])
-        receipt_table.setStyle(style)
 
-        flowables.append(receipt_table)
-        # --- End of Table Format ---
+    def field_values(self, data_row):
+        """Returns the receipt's values as strings, using 'N/A' for columns that don't exist in the data."""
+        return receipt_field_values(data_row)
+
+    def receipt_flowables(self, data_row):
+        """Returns the flowables for one receipt: the shared header plus this row's field table."""
+        # Prepare data for the table: a list of [label, value] pairs
+        table_data = [[field, value] for field, value in zip(RECEIPT_FIELDS, self.field_values(data_row))]
+        # Create the table with specified column widths
+        receipt_table = Table(table_data, colWidths=[2 * inch, 4 * inch])
+        receipt_table.setStyle(self.table_style)
+        return self.header_flowables + [receipt_table]
+
+    def _doc_template(self, file_path):
+        return SimpleDocTemplate(file_path, pagesize=self.pagesize, rightMargin=self.margin, leftMargin=self.margin,
+                                 topMargin=self.margin, bottomMargin=self.margin)
+
+    def build(self, data_row, file_path):
+        """Writes one receipt to file_path (a path or a writable binary file object)."""
+        doc = self._doc_template(file_path)
+        with span('pdf.build', 'render', renderer=self.name), self._lock:
+            doc.build(self.receipt_flowables(data_row))
+
+    def build_many(self, data_rows, file_path, on_page=None):
+        """
+        Writes several receipts to one document, one receipt per page.
+
+        The logos are embedded once and shared by every page.
+
+        Args:
+            data_rows (iterable): The data for each receipt (pd.Series, dict or prepared tuple).
+            file_path (str): The path (or writable binary file object) of the document.
+            on_page (callable, optional): Called with the number of pages finished so far.
+                                          Raising from it stops the build.
+        """
+        flowables = []
+        receipt_count = 0
+        for data_row in data_rows:
+            if flowables:
+                flowables.append(PageBreak())
+            flowables += self.receipt_flowables(data_row)
+            receipt_count += 1
+
+        doc = self._doc_template(file_path)
+        if on_page is not None:
+            doc.setProgressCallBack(lambda kind, value: on_page(value) if kind == 'PAGE' else None)
+        with span('pdf.build_many', 'render', receipts=receipt_count, renderer=self.name), self._lock:
+            doc.build(flowables)
+
 
-        doc.build(flowables)
+class CanvasReceiptTemplate(ReceiptTemplate):
+    """
+    The canvas renderer: draws the same receipt as ReceiptTemplate straight onto a
+    reportlab.pdfgen.canvas at fixed coordinates, skipping the platypus layout pass.
+
+    The coordinates are worked out once, from the page size, margins, logos and
+    styles, exactly as platypus would place them. A receipt with a line break in
+    one of its values (which would make its row taller) is left to platypus.
+    """
+    name = 'canvas'
+
+    # Platypus spacing that the fixed layout reproduces
+    _FRAME_PADDING = 6
+    _CELL_PADDING = 6  # Left/right padding of a table cell
+    _HEADER_CELL_PADDING = 3  # Top/bottom padding of the header table's cells
+    _FIELD_PADDING = 8  # Top/bottom padding of the field table's cells (table_style)
+    _FIELD_FONT = ('Helvetica', 10, 12)  # Table cell font, size and leading
+    _LABEL_FONT = 'Helvetica-Bold'
+    _LABEL_WIDTH = 2 * inch
+    _VALUE_WIDTH = 4 * inch
+    _SPACER = 0.25 * inch
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        page_width, page_height = self.pagesize
+        frame_x = self.margin + self._FRAME_PADDING
+        frame_width = page_width - 2 * self.margin - 2 * self._FRAME_PADDING
+        top = page_height - self.margin - self._FRAME_PADDING
+
+        # --- Header with Logos: one table row, each logo vertically centered in it ---
+        self.logo_positions = []
+        logos = [(logo, size) for logo, size in ((self.logo_left, LOGO_LEFT_SIZE), (self.logo_center, LOGO_CENTER_SIZE))
+                 if logo is not None]
+        if logos:
+            side_width = 2 * inch
+            center_width = (page_width - 2 * self.margin) - (2 * side_width)
+            table_x = frame_x + (frame_width - (2 * side_width + center_width)) / 2
+            row_height = max(height for _, (_, height) in logos) + 2 * self._HEADER_CELL_PADDING
+            header_bottom = top - row_height
+            for logo, (width, height) in logos:
+                y = header_bottom + self._HEADER_CELL_PADDING + (row_height - 2 * self._HEADER_CELL_PADDING - height) / 2
+                if logo is self.logo_left:
+                    x = table_x + self._CELL_PADDING
+                else:
+                    x = table_x + side_width + (center_width - width) / 2
+                self.logo_positions.append((logo, x, y, width, height))
+            top = header_bottom - self._SPACER
+
+        # --- Title ---
+        self.title_x = frame_x + frame_width / 2
+        self.title_y = top - self.title_style.fontSize
+        top -= self.title_style.leading + self.title_style.spaceAfter + self._SPACER
+
+        # --- Field Table ---
+        font_name, font_size, leading = self._FIELD_FONT
+        self.row_height = leading + 2 * self._FIELD_PADDING
+        self.table_x = frame_x + (frame_width - self._LABEL_WIDTH - self._VALUE_WIDTH) / 2
+        self.table_top = top
+        self.table_bottom = top - self.row_height * len(RECEIPT_FIELDS)
+        # Baseline of the first row's text, from the bottom of its row as platypus aligns it
+        self.first_baseline = top - self.row_height + self._FIELD_PADDING + (leading - font_size)
+
+    def _fits(self, values):
+        return not any('\n' in value for value in values)
+
+    def draw_receipt(self, canv, values):
+        """Draws one receipt with the given field values (strings, in RECEIPT_FIELDS order) on the current page."""
+        for logo, x, y, width, height in self.logo_positions:
+            _draw_logo(canv, logo, x, y, width, height)
+
+        canv.setFillColor(colors.black)
+        canv.setFont(self.title_style.fontName, self.title_style.fontSize)
+        canv.drawCentredString(self.title_x, self.title_y, "Fee Receipt")
+
+        # The table is drawn from its bottom-left corner, as platypus draws it
+        font_name, font_size, _ = self._FIELD_FONT
+        width = self._LABEL_WIDTH + self._VALUE_WIDTH
+        height = self.table_top - self.table_bottom
+        canv.saveState()
+        canv.translate(self.table_x, self.table_bottom)
+        for i, (field, value) in enumerate(zip(RECEIPT_FIELDS, values)):
+            y = self.first_baseline - self.table_bottom - i * self.row_height
+            canv.setFont(self._LABEL_FONT, font_size)
+            canv.drawString(self._CELL_PADDING, y, field)
+            canv.setFont(font_name, font_size)
+            canv.drawString(self._LABEL_WIDTH + self._CELL_PADDING, y, value)
+
+        # The grid, in the order the table style's GRID draws it (outline, then inner lines),
+        # so anti-aliased overlaps render the same
+        canv.setLineCap(1)
+        canv.setLineJoin(1)
+        canv.setStrokeColor(colors.black)
+        canv.setLineWidth(1)
+        canv.line(0, height, width, height)
+        canv.line(0, 0, width, 0)
+        canv.line(0, 0, 0, height)
+        canv.line(width, 0, width, height)
+        for i in range(1, len(RECEIPT_FIELDS)):
+            y = height - i * self.row_height
+            canv.line(0, y, width, y)
+        canv.line(self._LABEL_WIDTH, 0, self._LABEL_WIDTH, height)
+        canv.restoreState()
+
+    def build(self, data_row, file_path):
+        """Writes one receipt to file_path (a path or a writable binary file object)."""
+        values = self.field_values(data_row)
+        if not self._fits(values):
+            return super().build(data_row, file_path)
+        with span('pdf.build', 'render', renderer=self.name):
+            canv = canvas.Canvas(file_path, pagesize=self.pagesize)
+            self.draw_receipt(canv, values)
+            canv.showPage()
+            canv.save()
+
+    def build_many(self, data_rows, file_path, on_page=None):
+        """
+        Writes several receipts to one document, one receipt per page.
+
+        Args:
+            data_rows (iterable): The data for each receipt (pd.Series, dict or prepared tuple).
+            file_path (str): The path (or writable binary file object) of the document.
+            on_page (callable, optional): Called with the number of pages finished so far.
+                                          Raising from it stops the build.
+        """
+        data_rows = list(data_rows)
+        pages = [self.field_values(data_row) for data_row in data_rows]
+        if not all(self._fits(values) for values in pages):
+            return super().build_many(data_rows, file_path, on_page=on_page)
+        with span('pdf.build_many', 'render', receipts=len(pages), renderer=self.name):
+            canv = canvas.Canvas(file_path, pagesize=self.pagesize)
+            for page_count, values in enumerate(pages, 1):
+                self.draw_receipt(canv, values)
+                canv.showPage()
+                if on_page is not None:
+                    on_page(page_count)
+            canv.save()
+
+
+# Receipt renderers by name. FEE_RECEIPT_RENDERER picks the one default_template builds:
+# platypus unless FEE_RECEIPT_RENDERER=canvas opts in to the faster fixed-coordinate renderer.
+RENDERERS = {
+    ReceiptTemplate.name: ReceiptTemplate,
+    CanvasReceiptTemplate.name: CanvasReceiptTemplate,
+}
+DEFAULT_RENDERER = os.environ.get('FEE_RECEIPT_RENDERER', ReceiptTemplate.name)
+
+_default_templates = {}
+_default_template_lock = threading.Lock()
+
+
+def default_template(renderer=None):
+    """
+    Returns the template of a renderer shared by this process, building it on first use.
+
+    Args:
+        renderer (str, optional): A name from RENDERERS. Defaults to DEFAULT_RENDERER.
+    """
+    renderer = renderer or DEFAULT_RENDERER
+    if renderer not in RENDERERS:
+        raise ValueError(f"Unknown receipt renderer '{renderer}' (expected one of: {', '.join(RENDERERS)})")
+    with _default_template_lock:
+        if renderer not in _default_templates:
+            _default_templates[renderer] = RENDERERS[renderer]()
+        return _default_templates[renderer]
+
+
+def create_receipt_pdf(data_row: pd.Series, file_path: str, template: ReceiptTemplate = None):
+    """
+    Creates a single PDF receipt from a row of data.
+
+    Args:
+        data_row (pd.Series | dict | tuple): The data for one receipt, or its prepared values.
+        file_path (str): The full path where the PDF will be saved.
+        template (ReceiptTemplate, optional): The prebuilt fixed parts of the receipt (any renderer).
+                                              Defaults to the DEFAULT_RENDERER one shared by the whole process.
+
+    Returns:
+        bool: True if successful, False otherwise.
+    """
+    try:
+        (template or default_template()).build(data_row, file_path)
+    except Exception as e:
+        print(f"Error creating PDF {file_path}: {e}")
+        TRACER.count('receipts.failed')
+        return False
+
+    if TRACER.enabled:
+        TRACER.count('receipts.generated')
+        if isinstance(file_path, str):
+            TRACER.count('pdf.bytes_written', os.path.getsize(file_path))
+    return True
+
+
+class BatchCancelled(Exception):
+    """Raised from an on_page callback to stop create_receipts_batch_pdf."""
+
+
+def create_receipts_batch_pdf(data_rows, file_path: str, template: ReceiptTemplate = None, on_page=None):
+    """
+    Creates one multi-page PDF with a receipt per page.
+
+    Args:
+        data_rows (iterable): The data for each receipt (pd.Series, dict or prepared tuple).
+        file_path (str): The full path where the PDF will be saved.
+        template (ReceiptTemplate, optional): The prebuilt fixed parts of the receipt.
+        on_page (callable, optional): Called with the number of receipts written so far.
+                                      It may raise BatchCancelled to stop; the partial file is removed.
+
+    Returns:
+        bool: True if successful, False otherwise (including when cancelled).
+    """
+    try:
+        (template or default_template()).build_many(data_rows, file_path, on_page=on_page)
+        if TRACER.enabled and isinstance(file_path, str):
+            TRACER.count('pdf.bytes_written', os.path.getsize(file_path))
         return True
+    except BatchCancelled:
+        print(f"Cancelled creating PDF {file_path}")
     except Exception as e:
         print(f"Error creating PDF {file_path}: {e}")
-        return False
\ No newline at end of file
+
+    if os.path.exists(file_path):
+        os.remove(file_path)
+    return False
@@ -0,0 +1,255 @@
+import os
+import sys
+import time
+import queue
+import shlex
+import threading
+import subprocess
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from instrumentation import TRACER, span
+
+# A print job that still failed after every retry.
+PrintFailure = namedtuple('PrintFailure', ['files', 'error'])
+
+
+class PrintSpooler:
+    """
+    A background print queue.
+
+    Files are accepted as soon as they are generated. A dispatcher thread groups
+    them into batches that are sent with one `lp` call each, at most
+    max_concurrent_jobs calls run at once, and failed calls are retried with
+    exponential backoff. Nothing here blocks the caller.
+
+    The print command can be replaced (e.g. with a stub script) through the
+    lp_command argument or the FEE_RECEIPT_LP environment variable.
+    """
+
+    def __init__(self, lp_command=None, batch_size=20, batch_window=0.5, max_concurrent_jobs=2,
+                 max_retries=3, retry_delay=1.0, job_timeout=120, on_failure=None, on_printed=None):
+        """
+        Args:
+            lp_command (str | list, optional): The print command; the file paths are appended to it.
+            batch_size (int): The most files passed to one print command.
+            batch_window (float): Seconds to wait for more files before sending a partial batch.
+            max_concurrent_jobs (int): The most print commands running at once.
+            max_retries (int): Retries after the first failed attempt.
+            retry_delay (float): Seconds before the first retry; doubled for each later one.
+            job_timeout (float): Seconds before a print command is considered hung.
+            on_failure (callable, optional): Called with a PrintFailure, from a background thread.
+            on_printed (callable, optional): Called with the list of files of each successful
+                                             print command, from a background thread.
+        """
+        lp_command = lp_command or os.environ.get('FEE_RECEIPT_LP', 'lp')
+        self.lp_command = shlex.split(lp_command) if isinstance(lp_command, str) else list(lp_command)
+        self.batch_size = batch_size
+        self.batch_window = batch_window
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self.job_timeout = job_timeout
+        self.on_failure = on_failure
+        self.on_printed = on_printed
+
+        self._queue = queue.Queue()
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrent_jobs, thread_name_prefix='print-job')
+        self._lock = threading.Lock()
+        self._idle = threading.Condition(self._lock)
+        self._outstanding = 0  # Files submitted but not yet printed or failed
+        self._failures = []
+        self._printed_count = 0
+        self._dispatcher = None
+        self._stopping = False
+        self._abandoned = threading.Event()  # Set when shutdown gave up waiting
+        self._processes = set()  # The print commands running now
+
+    # --- Public interface ---
+
+    def submit(self, file_path):
+        """Adds a file to the print queue and returns immediately."""
+        with self._lock:
+            if self._stopping:
+                raise RuntimeError("The print spooler has been shut down")
+            self._outstanding += 1
+            if self._dispatcher is None:
+                self._dispatcher = threading.Thread(target=self._dispatch, name='print-dispatcher', daemon=True)
+                self._dispatcher.start()
+        self._queue.put(file_path)
+
+    @property
+    def pending(self):
+        """The number of files waiting to be printed, including those being sent right now."""
+        with self._lock:
+            return self._outstanding
+
+    @property
+    def printed_count(self):
+        """The number of files handed to the printer successfully."""
+        with self._lock:
+            return self._printed_count
+
+    @property
+    def failures(self):
+        """The print jobs that failed after every retry, oldest first."""
+        with self._lock:
+            return list(self._failures)
+
+    def clear_failures(self):
+        with self._lock:
+            self._failures.clear()
+
+    def wait(self, timeout=None):
+        """Blocks until every submitted file has been printed or has failed. Returns False on timeout."""
+        with self._idle:
+            return self._idle.wait_for(lambda: self._outstanding == 0, timeout)
+
+    def shutdown(self, wait=True, timeout=None):
+        """
+        Stops accepting files. With wait, the files already queued are still sent first.
+
+        Args:
+            wait (bool): Whether to wait for the queued files to be printed.
+            timeout (float, optional): With wait, the most seconds to wait. The files that
+                                       are still queued then are abandoned: running print
+                                       commands are killed and no retries are made.
+        Returns:
+            bool: False if queued files were abandoned, True otherwise.
+        """
+        with self._lock:
+            self._stopping = True
+        finished = self.wait(timeout) if wait else True
+        self._queue.put(None)
+        if not finished:
+            self._abandon()
+        self._executor.shutdown(wait=wait and finished, cancel_futures=not finished)
+        return finished
+
+    def _abandon(self):
+        self._abandoned.set()
+        with self._lock:
+            processes = list(self._processes)
+        for process in processes:
+            process.kill()
+
+    # --- Background work ---
+
+    def _next_batch(self):
+        """Blocks for the first file, then collects more until the batch is full or the window closes."""
+        first = self._queue.get()
+        if first is None:
+            return None
+        batch = [first]
+        deadline = time.monotonic() + self.batch_window
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                file_path = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if file_path is None:
+                # Shutting down: send what we have, then stop
+                self._queue.put(None)
+                break
+            batch.append(file_path)
+        return batch
+
+    def _dispatch(self):
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+            try:
+                self._executor.submit(self._send, batch)
+            except RuntimeError:
+                # The executor was shut down without waiting
+                return
+
+    def _print_command(self, files):
+        """Sends one batch to the printer, raising on failure."""
+        if sys.platform == "win32":
+            # The Windows shell has no multi-file print verb, so each file is its own job.
+            for file_path in files:
+                os.startfile(file_path, "print")
+        elif sys.platform == "darwin" or sys.platform.startswith("linux"):
+            # lp is the standard printing command on macOS and Linux, and accepts several files.
+            self._run(self.lp_command + list(files))
+        else:
+            raise NotImplementedError(f"Automatic printing not supported on {sys.platform}")
+
+    def _run(self, command):
+        """subprocess.run(command, check=True) that shutdown can kill when it gives up waiting."""
+        if self._abandoned.is_set():
+            raise RuntimeError("The print spooler was shut down before this job was sent")
+        process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        with self._lock:
+            self._processes.add(process)
+        try:
+            if self._abandoned.is_set():
+                process.kill()
+            try:
+                stdout, stderr = process.communicate(timeout=self.job_timeout)
+            except subprocess.TimeoutExpired:
+                process.kill()
+                process.communicate()
+                raise
+        finally:
+            with self._lock:
+                self._processes.discard(process)
+        if process.returncode:
+            raise subprocess.CalledProcessError(process.returncode, command, stdout, stderr)
+
+    def _attempt(self, files, retries):
+        """Runs the print command with retries. Returns None on success, else the last error message."""
+        error = None
+        for attempt in range(retries + 1):
+            if attempt:
+                TRACER.count('print.retries')
+                # Returns early, without retrying, once shutdown has given up on the queue
+                if self._abandoned.wait(self.retry_delay * 2 ** (attempt - 1)):
+                    break
+            try:
+                with span('print.job', 'print', files=len(files), attempt=attempt):
+                    self._print_command(files)
+                return None
+            except NotImplementedError as e:
+                return str(e)
+            except subprocess.CalledProcessError as e:
+                stderr = e.stderr.decode(errors='replace').strip() if e.stderr else ''
+                error = f"{e}{': ' + stderr if stderr else ''}"
+            except Exception as e:
+                error = str(e)
+        return error
+
+    def _send(self, files):
+        error = self._attempt(files, self.max_retries)
+        if error is not None and len(files) > 1:
+            # One bad file fails the whole command, so give each file one more try on its own
+            for file_path in files:
+                self._finish([file_path], self._attempt([file_path], 0))
+        else:
+            self._finish(files, error)
+
+    def _finish(self, files, error):
+        failure = None
+        with self._lock:
+            if error is None:
+                self._printed_count += len(files)
+            else:
+                failure = PrintFailure(list(files), error)
+                self._failures.append(failure)
+            self._outstanding -= len(files)
+            self._idle.notify_all()
+        TRACER.count('print.files_printed' if error is None else 'print.files_failed', len(files))
+
+        if self._abandoned.is_set():
+            # The owner stopped listening when it shut the spooler down
+            return
+        if failure is not None:
+            names = ", ".join(os.path.basename(f) for f in files)
+            print(f"PRINTING_ERROR: Could not print {names} automatically. Reason: {failure.error}", file=sys.stderr)
+            if self.on_failure is not None:
+                self.on_failure(failure)
+        elif self.on_printed is not None:
+            self.on_printed(list(files))
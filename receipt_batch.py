@@ -0,0 +1,206 @@
+import os
+import io
+import multiprocessing
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from pdf_generator import create_receipt_pdf
+from receipt_cache import audit_details
+from instrumentation import TRACER, span, now_us
+
+# The outcome of one receipt. `key` is whatever the caller passed in with the job (e.g. the row index).
+# `cached` is True when an identical PDF already existed and was reused.
+ReceiptResult = namedtuple('ReceiptResult', ['key', 'file_path', 'ok', 'error', 'cached'], defaults=(False,))
+
+
+def default_worker_count():
+    """The number of worker processes to use: one per CPU core."""
+    return os.cpu_count() or 1
+
+
+def _render_receipt(record, file_path):
+    """
+    Runs in a worker process.
+
+    Returns:
+        tuple: (ok, error message, timing) where timing is (pid, start in µs, duration in µs, bytes written),
+               so the parent can trace receipts generated in other processes.
+    """
+    start = now_us()
+    try:
+        ok = create_receipt_pdf(record, file_path)
+        error = None if ok else "PDF generation failed"
+    except Exception as e:
+        ok, error = False, str(e)
+    size = os.path.getsize(file_path) if ok else 0
+    return ok, error, (os.getpid(), start, now_us() - start, size)
+
+
+def _render_receipt_data(record):
+    """
+    Runs in a worker process. Renders one receipt into memory instead of a file.
+
+    Returns:
+        tuple: (ok, error message, timing, PDF bytes or None), timing as for _render_receipt.
+    """
+    start = now_us()
+    buffer = io.BytesIO()
+    try:
+        ok = create_receipt_pdf(record, buffer)
+        error = None if ok else "PDF generation failed"
+    except Exception as e:
+        ok, error = False, str(e)
+    data = buffer.getvalue() if ok else None
+    return ok, error, (os.getpid(), start, now_us() - start, len(data) if ok else 0), data
+
+
+def generate_receipts(jobs, max_workers=None, on_result=None, should_cancel=None, max_pending=None,
+                      manifest=None, sink=None):
+    """
+    Generates receipt PDFs in parallel across a pool of worker processes.
+
+    Jobs are pulled from the iterable lazily and at most max_pending are in flight
+    at once, so a generator of rows is never read into memory all at once.
+
+    With a sink (see receipt_sink), the workers render each receipt into memory
+    and this thread writes the bytes to the sink as they arrive, so at most
+    max_pending PDFs are buffered at a time. The job's file_path is then the
+    receipt's name in the sink. The caller closes the sink.
+
+    Args:
+        jobs (iterable): (key, record, file_path) tuples. `record` is a dict or
+                         pd.Series with the receipt fields, or a tuple of values
+                         prepared by receipt_prepare (the cheapest to send to a worker).
+        max_workers (int, optional): Worker processes; defaults to the CPU count.
+                                     With 1 the receipts are generated in this process.
+        on_result (callable, optional): Called with a ReceiptResult as each receipt finishes,
+                                        in completion order.
+        should_cancel (callable, optional): Polled between receipts; return True to stop.
+                                            Receipts that already started still finish.
+        max_pending (int, optional): The most jobs submitted but not finished at once.
+        manifest (ReceiptManifest, optional): The output cache. Receipts it already holds
+                                              are reused instead of generated, and new
+                                              ones are recorded; it is saved at the end.
+                                              Not used with a sink.
+        sink (optional): Where to write the receipts instead of their file paths, e.g. a ZipSink.
+    Returns:
+        tuple: (success count, failure count, cancelled flag)
+    """
+    max_workers = max_workers or default_worker_count()
+    if sink is not None:
+        manifest = None
+    max_pending = max_pending or max_workers * 4
+    should_cancel = should_cancel or (lambda: False)
+    success_count = 0
+    error_count = 0
+    digests = {}  # file_path -> digest of the receipts being generated, to record once they succeed
+
+    def reuse_cached(key, record, file_path):
+        """Reports the job straight away if the manifest already holds this exact receipt."""
+        if manifest is None:
+            return False
+        digest = manifest.digest(record)
+        if manifest.lookup(file_path, digest):
+            TRACER.count('receipts.reused')
+            report(key, file_path, True, None, cached=True)
+            return True
+        digests[file_path] = (digest, audit_details(record))
+        return False
+
+    def report(key, file_path, ok, error, timing=None, cached=False):
+        nonlocal success_count, error_count
+        if ok:
+            success_count += 1
+        else:
+            error_count += 1
+        if timing is not None and timing[0] != os.getpid() and TRACER.enabled:
+            # Generated in a worker process, whose own trace is never exported
+            pid, start, duration, size = timing
+            TRACER.add_complete('pdf.build', start, duration, 'render', pid=pid, tid=pid,
+                                file=os.path.basename(file_path))
+            TRACER.count('receipts.generated' if ok else 'receipts.failed')
+            TRACER.count('pdf.bytes_written', size)
+        if manifest is not None and file_path in digests:
+            digest, details = digests.pop(file_path)
+            if ok:
+                manifest.record(file_path, digest, **details)
+        if on_result is not None:
+            on_result(ReceiptResult(key, file_path, ok, error, cached))
+
+    def deliver(key, file_path, ok, error, timing=None, data=None):
+        """Writes a receipt rendered in memory to the sink, then reports it."""
+        if ok and sink is not None:
+            try:
+                with span('sink.write', 'render', bytes=len(data)):
+                    sink.write(file_path, data)
+            except (OSError, ValueError) as e:
+                ok, error = False, f"Could not write {file_path}: {e}"
+        report(key, file_path, ok, error, timing)
+
+    def submit(executor, record, file_path):
+        if sink is not None:
+            return executor.submit(_render_receipt_data, record)
+        return executor.submit(_render_receipt, record, file_path)
+
+    if max_workers == 1:
+        try:
+            for key, record, file_path in jobs:
+                if should_cancel():
+                    return success_count, error_count, True
+                if reuse_cached(key, record, file_path):
+                    continue
+                if sink is not None:
+                    deliver(key, file_path, *_render_receipt_data(record))
+                else:
+                    report(key, file_path, *_render_receipt(record, file_path))
+            return success_count, error_count, False
+        finally:
+            if manifest is not None:
+                manifest.save()
+
+    jobs = iter(jobs)
+    pending = {}
+    exhausted = False
+    cancelled = False
+    # Spawn fresh workers instead of forking: batches start from a QThread in a process with other
+    # live threads, and a forked child can inherit their locks held and deadlock on them
+    executor = ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context('spawn'))
+    try:
+        while True:
+            # Keep the pool busy without queueing every job up front
+            while not exhausted and not cancelled and len(pending) < max_pending:
+                job = next(jobs, None)
+                if job is None:
+                    exhausted = True
+                    break
+                key, record, file_path = job
+                if reuse_cached(key, record, file_path):
+                    continue
+                pending[submit(executor, record, file_path)] = (key, file_path)
+
+            if not pending:
+                break
+
+            done, _ = wait(pending, timeout=0.2, return_when=FIRST_COMPLETED)
+            for future in done:
+                key, file_path = pending.pop(future)
+                if future.cancelled():
+                    continue
+                try:
+                    result = future.result()
+                except Exception as e:
+                    # The worker process itself died (e.g. out of memory)
+                    result = (False, str(e), None)
+                deliver(key, file_path, *result)
+
+            if not cancelled and should_cancel():
+                cancelled = True
+                # Drop the jobs that have not started; the running ones are still reported
+                for future in list(pending):
+                    if future.cancel():
+                        del pending[future]
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+        if manifest is not None:
+            manifest.save()
+
+    return success_count, error_count, cancelled
@@ -0,0 +1,188 @@
+"""
+A manifest of the receipts already written to an output directory.
+
+Each PDF is recorded with a hash of what went into it: the receipt's field
+values, the template version, the renderer and the logo files. When a receipt is asked for
+again with the same hash and the file on disk is still the one that was
+written, the existing PDF is reused instead of being generated again.
+
+The manifest (.receipt_manifest.json) lives next to the PDFs and doubles as a
+record of what was produced and when.
+"""
+import os
+import sys
+import json
+import hashlib
+import threading
+from datetime import datetime
+from pdf_generator import (TEMPLATE_VERSION, DEFAULT_RENDERER, LOGO_LEFT_PATH, LOGO_CENTER_PATH, RECEIPT_FIELDS,
+                           receipt_field_values)
+
+MANIFEST_NAME = '.receipt_manifest.json'
+_MANIFEST_VERSION = 1
+
+# Logo hashes by (path, size, mtime), so each logo is read once per process
+_logo_hashes = {}
+
+
+def _file_hash(file_path):
+    stat = os.stat(file_path)
+    key = (file_path, stat.st_size, stat.st_mtime_ns)
+    if key not in _logo_hashes:
+        digest = hashlib.sha256()
+        with open(file_path, 'rb') as f:
+            for block in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(block)
+        _logo_hashes[key] = digest.hexdigest()
+    return _logo_hashes[key]
+
+
+def template_fingerprint(renderer=None, logo_paths=(LOGO_LEFT_PATH, LOGO_CENTER_PATH)):
+    """
+    Hashes everything about a receipt that does not come from its row: the template
+    version, the renderer that draws it and the logos.
+
+    Args:
+        renderer (str, optional): A name from pdf_generator.RENDERERS. Defaults to DEFAULT_RENDERER,
+                                  so switching renderers (FEE_RECEIPT_RENDERER) regenerates receipts.
+    """
+    parts = [f"template={TEMPLATE_VERSION}", f"renderer={renderer or DEFAULT_RENDERER}",
+             "fields=" + "|".join(RECEIPT_FIELDS)]
+    for path in logo_paths:
+        parts.append(_file_hash(path) if os.path.exists(path) else "missing")
+    return hashlib.sha256("\n".join(parts).encode('utf-8')).hexdigest()
+
+
+def _now():
+    return datetime.now().isoformat(timespec='seconds')
+
+
+class ReceiptManifest:
+    """
+    The output cache for one directory.
+
+    Only files directly inside the directory are cached. The methods are
+    thread-safe; call save() when a batch is done to write the manifest.
+    """
+
+    def __init__(self, directory, fingerprint=None):
+        self.directory = os.path.abspath(directory)
+        self.path = os.path.join(self.directory, MANIFEST_NAME)
+        self.fingerprint = fingerprint or template_fingerprint()
+        self._lock = threading.Lock()
+        self._entries = self._read()
+        self._changed = set()
+
+    def _read(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            print(f"CACHE_WARNING: Ignoring unreadable receipt manifest '{self.path}'. Reason: {e}", file=sys.stderr)
+            return {}
+        if data.get('version') != _MANIFEST_VERSION:
+            return {}
+        return data.get('receipts', {})
+
+    def _name(self, file_path):
+        """The manifest entry name of a file, or None if the file is not in this directory."""
+        file_path = os.path.abspath(file_path)
+        if os.path.dirname(file_path) != self.directory:
+            return None
+        return os.path.basename(file_path)
+
+    def digest(self, data_row):
+        """Hashes one receipt: its field values as printed, plus the template fingerprint."""
+        values = "\x1f".join(receipt_field_values(data_row))
+        return hashlib.sha256(f"{self.fingerprint}\n{values}".encode('utf-8')).hexdigest()
+
+    def batch_digest(self, data_rows):
+        """Hashes a multi-page document from the digests of its receipts, in page order."""
+        digest = hashlib.sha256(f"{self.fingerprint}\nbatch".encode('utf-8'))
+        for data_row in data_rows:
+            digest.update(self.digest(data_row).encode('ascii'))
+        return digest.hexdigest()
+
+    def lookup(self, file_path, digest):
+        """
+        Returns True if file_path holds the receipt with this digest and can be reused as is.
+
+        The file must still have the size and modification time it was recorded with,
+        so a PDF that was replaced or edited since is generated again.
+        """
+        name = self._name(file_path)
+        if name is None:
+            return False
+        with self._lock:
+            entry = self._entries.get(name)
+        if entry is None or entry.get('hash') != digest:
+            return False
+        try:
+            stat = os.stat(file_path)
+        except OSError:
+            return False
+        if stat.st_size != entry.get('size') or stat.st_mtime_ns != entry.get('mtime_ns'):
+            return False
+        with self._lock:
+            entry['reused'] = entry.get('reused', 0) + 1
+            entry['last_reused_at'] = _now()
+            self._changed.add(name)
+        return True
+
+    def record(self, file_path, digest, **details):
+        """Records a freshly generated file. details (e.g. the transaction ID) are kept for auditing."""
+        name = self._name(file_path)
+        if name is None:
+            return
+        try:
+            stat = os.stat(file_path)
+        except OSError:
+            return
+        entry = {'hash': digest, 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns,
+                 'generated_at': _now(), 'reused': 0, **details}
+        with self._lock:
+            self._entries[name] = entry
+            self._changed.add(name)
+
+    def save(self):
+        """
+        Writes the manifest. Entries written meanwhile by another manifest for the
+        same directory (e.g. a single reprint during a batch) are kept.
+
+        Returns:
+            bool: True if the manifest was written (or had nothing to write).
+        """
+        with self._lock:
+            if not self._changed:
+                return True
+            changed = {name: dict(self._entries[name]) for name in self._changed}
+            self._changed = set()
+        entries = self._read()
+        entries.update(changed)
+        tmp_path = self.path + '.tmp'
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({'version': _MANIFEST_VERSION, 'receipts': entries}, f, indent=1, sort_keys=True)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            print(f"CACHE_WARNING: Could not write receipt manifest '{self.path}'. Reason: {e}", file=sys.stderr)
+            return False
+        with self._lock:
+            entries.update(self._entries)
+            self._entries = entries
+        return True
+
+
+def audit_details(data_row):
+    """The fields kept with each manifest entry to show what a file was generated from."""
+    if isinstance(data_row, tuple):
+        # Values prepared by receipt_prepare, in RECEIPT_FIELDS order
+        data_row = {field: None if value == 'N/A' else value for field, value in zip(RECEIPT_FIELDS, data_row)}
+    details = {}
+    for field, key in (('Transaction ID', 'transaction_id'), ('Name', 'name')):
+        value = data_row.get(field)
+        if value is not None:
+            details[key] = str(value)
+    return details
@@ -0,0 +1,254 @@
+"""
+Generate fee receipts from a workbook without the GUI.
+
+Examples:
+    python receipt_cli.py fees.xlsx -o receipts/
+    python receipt_cli.py fees.xlsx -o receipts/ --class BCA --status Success --date-from 2025-07-01
+    python receipt_cli.py fees.xlsx -o receipts/ --rows 1-50,75 --workers 8 --print
+    python receipt_cli.py fees.xlsx -o receipts/ --class BCA --zip bca.zip
+    python receipt_cli.py gateway_export.csv -o receipts/ --status Success
+    python receipt_cli.py fees.xlsx -o receipts/ --skip-invalid
+
+Rows are streamed from the workbook chunk by chunk, so memory use stays bounded
+however large the sheet is. Receipts that are already in the output directory
+unchanged (see receipt_cache) are reused unless --force is given. Each chunk's
+receipts are formatted and checked in one pass (see receipt_prepare); rows that
+fail the checks are listed in the summary, and left out with --skip-invalid.
+A JSON summary is written to stdout. This module must not import PyQt5.
+
+--batch-pdf is the exception to bounded memory: a single document is laid out
+as a whole, so it is refused for more than BATCH_PDF_MAX_ROWS receipts (use
+--zip, or narrow the rows, for larger runs).
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import itertools
+import multiprocessing
+import pandas as pd
+from excel_loader import iter_excel_chunks, loader_for, DEFAULT_CHUNK_SIZE
+from receipt_schema import RECEIPT_SCHEMA
+from pdf_generator import receipt_file_names, create_receipts_batch_pdf
+from receipt_batch import generate_receipts, default_worker_count
+from receipt_cache import ReceiptManifest
+from receipt_prepare import prepare_receipts, RECEIPT_STATUSES
+from receipt_sink import ZipSink
+
+# The most receipts --batch-pdf puts in one document, which is built in memory
+BATCH_PDF_MAX_ROWS = int(os.environ.get('FEE_RECEIPT_BATCH_PDF_MAX_ROWS', 5000))
+
+
+def parse_row_list(text):
+    """Parses a row list like "1-50,75" (1-based, as numbered in the app's table) into a set of row positions."""
+    rows = set()
+    for part in text.split(','):
+        part = part.strip()
+        if not part:
+            continue
+        if '-' in part:
+            first, last = part.split('-', 1)
+            rows.update(range(int(first) - 1, int(last)))
+        else:
+            rows.add(int(part) - 1)
+    return rows
+
+
+def filter_chunk(chunk, args):
+    """Applies the command-line filters to one chunk of rows."""
+    mask = pd.Series(True, index=chunk.index)
+    if args.rows is not None:
+        mask &= chunk.index.isin(list(args.rows))
+    if args.classes:
+        wanted = {value.lower() for value in args.classes}
+        mask &= chunk.get('Class', pd.Series('', index=chunk.index)).astype(str).str.lower().isin(wanted)
+    if args.statuses:
+        wanted = {value.lower() for value in args.statuses}
+        mask &= chunk.get('Status', pd.Series('', index=chunk.index)).astype(str).str.lower().isin(wanted)
+    if args.date_from or args.date_to:
+        dates = pd.to_datetime(chunk.get('Date', pd.Series(None, index=chunk.index)), errors='coerce')
+        if args.date_from:
+            mask &= dates >= args.date_from
+        if args.date_to:
+            mask &= dates <= args.date_to
+    return chunk[mask]
+
+
+def iter_selected_rows(args, stats):
+    """
+    Streams the rows that pass the filters as (index, receipt values, file name) tuples,
+    keeping a running count and the rows that failed validation in stats.
+    """
+    offset = 0
+    last_row = max(args.rows) if args.rows else None
+    for chunk, _, _ in iter_excel_chunks(args.workbook, chunk_size=args.chunk_size, first_chunk_size=None,
+                                         use_cache=args.use_cache, schema=None if args.all_columns else RECEIPT_SCHEMA):
+        # Chunks are numbered from 0; give them their position in the whole sheet
+        chunk.index = pd.RangeIndex(offset, offset + len(chunk))
+        offset += len(chunk)
+        stats['rows_read'] = offset
+
+        selected = filter_chunk(chunk, args)
+        stats['rows_selected'] += len(selected)
+        prepared = prepare_receipts(selected, args.receipt_statuses)
+        for position, problems in sorted(prepared.problems.items()):
+            stats['invalid_rows'].append({'row': int(selected.index[position]) + 1, 'problems': problems})
+        rows = zip(selected.index, prepared.values, receipt_file_names(selected, args.name_column))
+        if args.skip_invalid and prepared.problems:
+            rows = (row for position, row in enumerate(rows) if position not in prepared.problems)
+        yield from rows
+        if last_row is not None and offset > last_row:
+            # Every requested row has been read; no need to parse the rest of the sheet
+            break
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Generate fee receipt PDFs from a workbook without the GUI.")
+    parser.add_argument('workbook', help="The workbook (first sheet) or CSV export to read.")
+    parser.add_argument('-o', '--output-dir', required=True, help="Directory for the generated PDFs.")
+    parser.add_argument('--class', dest='classes', action='append', metavar='CLASS',
+                        help="Only rows of this class (repeatable).")
+    parser.add_argument('--status', dest='statuses', action='append', metavar='STATUS',
+                        help="Only rows with this status (repeatable).")
+    parser.add_argument('--date-from', type=pd.Timestamp, metavar='YYYY-MM-DD', help="Only rows on or after this date.")
+    parser.add_argument('--date-to', type=pd.Timestamp, metavar='YYYY-MM-DD', help="Only rows on or before this date.")
+    parser.add_argument('--rows', type=parse_row_list, metavar='LIST',
+                        help='Only these rows, numbered from 1 as in the app, e.g. "1-50,75".')
+    parser.add_argument('--workers', type=int, default=default_worker_count(),
+                        help="Worker processes for PDF generation (default: one per CPU core).")
+    parser.add_argument('--batch-pdf', metavar='FILE',
+                        help="Write all receipts as pages of this single PDF (inside the output directory); "
+                             f"at most {BATCH_PDF_MAX_ROWS} receipts.")
+    parser.add_argument('--zip', dest='zip_archive', metavar='FILE',
+                        help="Write all receipts into this ZIP archive (inside the output directory), "
+                             "rendered in memory instead of as separate files.")
+    parser.add_argument('--name-column', default='Name', help="The column with student names, used in file names.")
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE, help="Rows read from the workbook at a time.")
+    parser.add_argument('--all-columns', action='store_true',
+                        help="Read every column as it is instead of only the receipt columns with compact types.")
+    parser.add_argument('--use-cache', action='store_true',
+                        help="Use the parsed-workbook cache (loads the whole sheet into memory on a cache hit).")
+    parser.add_argument('--skip-invalid', action='store_true',
+                        help="Leave out rows with a missing Transaction ID or Amount, an Amount that is not "
+                             "a number, or a Status a receipt can't be issued for (they are always reported).")
+    parser.add_argument('--receipt-status', dest='receipt_statuses', action='append', metavar='STATUS',
+                        help="A payment status receipts can be issued for (repeatable; default: "
+                             f"{', '.join(RECEIPT_STATUSES)}, or FEE_RECEIPT_STATUSES).")
+    parser.add_argument('--force', action='store_true',
+                        help="Generate every receipt again, even if an identical PDF is already in the output directory.")
+    parser.add_argument('--print', dest='send_to_printer', action='store_true',
+                        help="Send the generated PDFs to the default printer.")
+    return parser
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.zip_archive and (args.batch_pdf or args.send_to_printer):
+        parser.error("--zip cannot be combined with --batch-pdf or --print")
+    try:
+        loader_for(args.workbook)
+    except ValueError as e:
+        parser.error(str(e))
+    os.makedirs(args.output_dir, exist_ok=True)
+    started = time.monotonic()
+    stats = {'rows_read': 0, 'rows_selected': 0, 'invalid_rows': []}
+    summary = {'workbook': os.path.abspath(args.workbook), 'output_dir': os.path.abspath(args.output_dir)}
+    generated = []
+    failures = []
+    reused = 0
+    manifest = None if args.force else ReceiptManifest(args.output_dir)
+
+    try:
+        rows = iter_selected_rows(args, stats)
+        if args.batch_pdf:
+            file_path = os.path.join(args.output_dir, args.batch_pdf)
+            # Stop reading as soon as the document would be too large
+            records = [values for _, values, _ in itertools.islice(rows, BATCH_PDF_MAX_ROWS + 1)]
+            if len(records) > BATCH_PDF_MAX_ROWS:
+                print(json.dumps({**summary, 'error': f"--batch-pdf takes at most {BATCH_PDF_MAX_ROWS} receipts "
+                                                      "(FEE_RECEIPT_BATCH_PDF_MAX_ROWS); use --zip or select fewer rows"}))
+                return 2
+            success_count, error_count = 0, 0
+            digest = manifest.batch_digest(records) if manifest is not None else None
+            if records and digest is not None and manifest.lookup(file_path, digest):
+                generated.append(file_path)
+                success_count = reused = len(records)
+                manifest.save()
+            elif records and create_receipts_batch_pdf(records, file_path):
+                generated.append(file_path)
+                success_count = len(records)
+                if manifest is not None:
+                    manifest.record(file_path, digest, receipts=len(records))
+                    manifest.save()
+            elif records:
+                failures.append({'row': None, 'file': file_path, 'error': "PDF generation failed"})
+                error_count = len(records)
+        elif args.zip_archive:
+            file_path = os.path.join(args.output_dir, args.zip_archive)
+            # Each job's "file path" is the receipt's name inside the archive
+            jobs = rows
+
+            def on_result(result):
+                if not result.ok:
+                    failures.append({'row': int(result.key) + 1, 'file': result.file_path, 'error': result.error})
+
+            sink = ZipSink(file_path)
+            try:
+                success_count, error_count, _ = generate_receipts(jobs, max_workers=args.workers, on_result=on_result,
+                                                                  sink=sink)
+            except BaseException:
+                sink.abort()
+                raise
+            if sink.close():
+                generated.append(file_path)
+            else:
+                failures.append({'row': None, 'file': file_path, 'error': "Could not write the archive"})
+                success_count, error_count = 0, success_count + error_count
+        else:
+            jobs = ((index, values, os.path.join(args.output_dir, name)) for index, values, name in rows)
+
+            def on_result(result):
+                nonlocal reused
+                if result.ok:
+                    generated.append(result.file_path)
+                    reused += result.cached
+                else:
+                    failures.append({'row': int(result.key) + 1, 'file': result.file_path, 'error': result.error})
+
+            success_count, error_count, _ = generate_receipts(jobs, max_workers=args.workers, on_result=on_result,
+                                                              manifest=manifest)
+    except FileNotFoundError:
+        print(json.dumps({**summary, 'error': f"File not found: {args.workbook}"}))
+        return 2
+
+    if args.send_to_printer and generated:
+        # Imported here so the queue's threads only exist when printing was asked for
+        from print_spooler import PrintSpooler
+        spooler = PrintSpooler()
+        for file_path in generated:
+            spooler.submit(file_path)
+        spooler.shutdown(wait=True)
+        summary['printed'] = spooler.printed_count
+        summary['print_failures'] = [failure._asdict() for failure in spooler.failures]
+
+    summary.update({
+        'rows_read': stats['rows_read'],
+        'rows_selected': stats['rows_selected'],
+        'invalid_rows': stats['invalid_rows'],
+        'invalid_rows_skipped': len(stats['invalid_rows']) if args.skip_invalid else 0,
+        'receipts_generated': success_count - reused,
+        'receipts_reused': reused,
+        'receipts_failed': error_count,
+        'failures': failures,
+        'elapsed_seconds': round(time.monotonic() - started, 3),
+    })
+    print(json.dumps(summary, indent=2))
+    return 1 if failures or summary.get('print_failures') else 0
+
+
+if __name__ == '__main__':
+    # Needed for the receipt worker processes on Windows and in frozen builds
+    multiprocessing.freeze_support()
+    sys.exit(main())
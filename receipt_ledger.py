@@ -0,0 +1,416 @@
+"""
+A local SQLite ledger of every payment imported from the monthly fee exports.
+
+Workbooks are imported whole, every sheet of them, and merged on the
+transaction ID: a payment that appears in several exports is stored once and
+updated from the latest import. The ledger also records which receipts were
+generated and printed, so any student can be looked up across all exports
+without loading a workbook into memory.
+
+A ReceiptLedger holds one SQLite connection and must be used from the thread
+that opened it; open another one (on the same file) for background imports.
+"""
+import os
+import re
+import sys
+import sqlite3
+from collections import namedtuple
+from datetime import datetime
+from receipt_schema import RECEIPT_FIELDS, RECEIPT_SCHEMA, cell_text
+
+LEDGER_PATH = os.environ.get('FEE_RECEIPT_LEDGER') or os.path.join(
+    os.environ.get('LOCALAPPDATA') or os.path.join(os.path.expanduser('~'), '.cache'), 'fee-receipt-manager',
+    'ledger.sqlite3')
+
+# Rows returned per page by ReceiptLedger.page
+PAGE_SIZE = 200
+
+# Receipt field -> ledger column
+FIELD_COLUMNS = {
+    'Name': 'name',
+    'Admission Number': 'admission_number',
+    'Class': 'class',
+    'Bank Reference ID': 'bank_reference_id',
+    'Order ID': 'order_id',
+    'Transaction ID': 'transaction_id',
+    'Status': 'status',
+    'Amount': 'amount',
+    'Date': 'date',
+}
+
+# Events recorded against a payment's receipt
+EVENTS = ('generated', 'printed', 'print_failed')
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS payments (
+    transaction_id TEXT PRIMARY KEY,
+    name TEXT,
+    admission_number TEXT,
+    class TEXT,
+    bank_reference_id TEXT,
+    order_id TEXT,
+    status TEXT,
+    amount,
+    date TEXT,
+    source_file TEXT,
+    source_sheet TEXT,
+    imported_at TEXT,
+    updated_at TEXT,
+    generated_at TEXT,
+    printed_at TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_payments_name ON payments (name COLLATE NOCASE);
+CREATE INDEX IF NOT EXISTS idx_payments_admission_number ON payments (admission_number);
+CREATE INDEX IF NOT EXISTS idx_payments_order_id ON payments (order_id);
+CREATE INDEX IF NOT EXISTS idx_payments_date ON payments (date);
+CREATE TABLE IF NOT EXISTS receipt_events (
+    transaction_id TEXT NOT NULL,
+    event TEXT NOT NULL,
+    file_path TEXT,
+    at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_receipt_events_transaction ON receipt_events (transaction_id);
+"""
+
+# A full-text index of the names, kept in step with payments by triggers, so a name
+# search finds words anywhere in a name without scanning the table
+_NAME_SEARCH_SCHEMA = """
+CREATE VIRTUAL TABLE payments_name_search USING fts5 (name, content='payments', content_rowid='rowid');
+CREATE TRIGGER payments_name_search_insert AFTER INSERT ON payments BEGIN
+    INSERT INTO payments_name_search (rowid, name) VALUES (new.rowid, new.name);
+END;
+CREATE TRIGGER payments_name_search_delete AFTER DELETE ON payments BEGIN
+    INSERT INTO payments_name_search (payments_name_search, rowid, name) VALUES ('delete', old.rowid, old.name);
+END;
+CREATE TRIGGER payments_name_search_update AFTER UPDATE OF name ON payments BEGIN
+    INSERT INTO payments_name_search (payments_name_search, rowid, name) VALUES ('delete', old.rowid, old.name);
+    INSERT INTO payments_name_search (rowid, name) VALUES (new.rowid, new.name);
+END;
+INSERT INTO payments_name_search (payments_name_search) VALUES ('rebuild');
+"""
+
+_COLUMNS = [FIELD_COLUMNS[field] for field in RECEIPT_FIELDS]
+_IMPORT_COLUMNS = _COLUMNS + ['source_file', 'source_sheet', 'imported_at', 'updated_at']
+_UPSERT = (
+    f"INSERT INTO payments ({', '.join(_IMPORT_COLUMNS)}) VALUES ({', '.join('?' * len(_IMPORT_COLUMNS))}) "
+    f"ON CONFLICT (transaction_id) DO UPDATE SET "
+    + ", ".join(f"{column} = excluded.{column}"
+                for column in _IMPORT_COLUMNS if column not in ('transaction_id', 'imported_at'))
+)
+
+# file_path: the workbook. sheets: the sheets imported. skipped_sheets: sheets without a Transaction ID column.
+# rows: payments read. added / updated: of those, new to the ledger and merged into ones it already held.
+# duplicates: rows repeating a transaction ID read earlier in the same import (the last one is kept).
+# skipped_rows: rows without a transaction ID, which cannot be merged and are left out.
+ImportResult = namedtuple('ImportResult', ['file_path', 'sheets', 'skipped_sheets', 'rows', 'added', 'updated',
+                                           'duplicates', 'skipped_rows'])
+
+# Transaction IDs looked up per query by ReceiptLedger._existing (below SQLite's parameter limit)
+_LOOKUP_BATCH = 500
+
+# One ledger row as shown in the ledger window: its rowid, the receipt fields
+# (in RECEIPT_FIELDS order), where it was last imported from and its receipt history.
+LedgerRow = namedtuple('LedgerRow', ['rowid', 'values', 'source_file', 'source_sheet', 'generated_at', 'printed_at'])
+
+
+def _now():
+    return datetime.now().isoformat(sep=' ', timespec='seconds')
+
+
+def _column_values(series, field):
+    """The values of one column as SQLite parameters: amounts stay numbers, everything else is stored as shown."""
+    if field == 'Amount' and series.dtype.kind in 'iuf':
+        return [None if value != value else value for value in series.astype(float).tolist()]
+    return [cell_text(value) or None for value in series.tolist()]
+
+
+def _search_clause(search, full_text=True):
+    """
+    The WHERE condition and its parameters for a search: a name matching it (see
+    ReceiptLedger.page), or an exact ID. Every part of the condition uses an index.
+    """
+    search = (search or '').strip()
+    if not search:
+        return "1", []
+    words = re.findall(r'\w+', search)
+    if full_text and words:
+        # Each searched word is a prefix of some word of the name
+        name_clause = "rowid IN (SELECT rowid FROM payments_name_search WHERE payments_name_search MATCH ?)"
+        name_param = " ".join(f'"{word}"*' for word in words)
+    else:
+        # A prefix without wildcards before it can use idx_payments_name
+        name_clause = "name LIKE ? ESCAPE '\\'"
+        name_param = search.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+    return (f"({name_clause} OR admission_number = ? OR transaction_id = ? OR order_id = ?)",
+            [name_param, search, search, search])
+
+
+class ReceiptLedger:
+    """
+    The ledger database.
+
+    Args:
+        path (str): The SQLite file; created with its tables if it does not exist.
+    """
+
+    def __init__(self, path=LEDGER_PATH):
+        self.path = path
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._db = sqlite3.connect(path)
+        # WAL lets the window keep reading while an import writes from another connection
+        self._db.execute("PRAGMA journal_mode = WAL")
+        self._db.execute("PRAGMA synchronous = NORMAL")
+        self._db.executescript(_SCHEMA)
+        self._full_text = self._create_name_search()
+        self._db.commit()
+
+    def _create_name_search(self):
+        """Creates the full-text name index if it is missing. Returns False if SQLite was built without FTS5."""
+        exists = self._db.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'payments_name_search'").fetchone()
+        if exists:
+            return True
+        try:
+            self._db.executescript("BEGIN;" + _NAME_SEARCH_SCHEMA + "COMMIT;")
+        except sqlite3.OperationalError as e:
+            self._db.rollback()
+            if self._db.execute("SELECT 1 FROM sqlite_master WHERE name = 'payments_name_search'").fetchone():
+                # Created by another connection in the meantime
+                return True
+            print(f"LEDGER_WARNING: Name search only matches the start of names (no full-text index). Reason: {e}",
+                  file=sys.stderr)
+            return False
+        return True
+
+    def close(self):
+        self._db.close()
+
+    # --- Importing ---
+
+    def import_workbook(self, file_path, on_progress=None, should_cancel=None):
+        """
+        Imports every sheet of a workbook, merging payments on their transaction ID.
+
+        The whole workbook is imported in one transaction, so a failed or
+        cancelled import leaves the ledger as it was.
+
+        Args:
+            file_path (str): The workbook.
+            on_progress (callable, optional): Called with (sheet name, rows read so far) after each chunk.
+            should_cancel (callable, optional): Returns True to stop; the import is then rolled back.
+        Returns:
+            ImportResult | None: What was imported, or None if the import was cancelled.
+        """
+        # The loader pulls in pandas and openpyxl, which only imports need
+        from excel_loader import iter_sheet_chunks
+
+        source_file = os.path.abspath(file_path)
+        sheets, skipped_sheets = [], []
+        rows = added = updated = duplicates = skipped_rows = 0
+        seen = set()
+        now = _now()
+        try:
+            for sheet_name, chunk in iter_sheet_chunks(file_path, schema=RECEIPT_SCHEMA):
+                if should_cancel is not None and should_cancel():
+                    self._db.rollback()
+                    return None
+                if 'Transaction ID' not in chunk.columns:
+                    if sheet_name not in skipped_sheets:
+                        skipped_sheets.append(sheet_name)
+                    continue
+                if sheet_name not in sheets:
+                    sheets.append(sheet_name)
+                upserted, chunk_added, chunk_updated, chunk_duplicates = self._upsert(chunk, source_file, sheet_name,
+                                                                                      now, seen)
+                rows += upserted
+                added += chunk_added
+                updated += chunk_updated
+                duplicates += chunk_duplicates
+                skipped_rows += len(chunk) - upserted
+                if on_progress is not None:
+                    on_progress(sheet_name, rows)
+            self._db.commit()
+        except BaseException:
+            self._db.rollback()
+            raise
+        return ImportResult(file_path, sheets, skipped_sheets, rows, added, updated, duplicates, skipped_rows)
+
+    def import_frame(self, df, source_file, sheet_name=''):
+        """
+        Imports the rows of an already loaded sheet, merging payments on their transaction ID.
+
+        Args:
+            df (pd.DataFrame): The rows, with the receipt columns (see receipt_schema).
+            source_file (str): The workbook the rows came from, recorded with each payment.
+            sheet_name (str): The sheet the rows came from.
+        Returns:
+            ImportResult: What was imported.
+        """
+        if 'Transaction ID' not in df.columns:
+            return ImportResult(source_file, [], [sheet_name], 0, 0, 0, 0, 0)
+        try:
+            rows, added, updated, duplicates = self._upsert(df, source_file, sheet_name, _now(), set())
+            self._db.commit()
+        except BaseException:
+            self._db.rollback()
+            raise
+        return ImportResult(source_file, [sheet_name], [], rows, added, updated, duplicates, len(df) - rows)
+
+    def _upsert(self, chunk, source_file, sheet_name, now, seen):
+        """
+        Inserts or updates the rows of one chunk.
+
+        Args:
+            seen (set): The transaction IDs read so far in this import; this chunk's are added to it.
+        Returns:
+            tuple: (rows with a transaction ID, new payments, payments the ledger already held,
+                    rows repeating a transaction ID seen earlier in the import)
+        """
+        n = len(chunk)
+        columns = [_column_values(chunk[field], field) if field in chunk.columns else [None] * n
+                   for field in RECEIPT_FIELDS]
+        key = RECEIPT_FIELDS.index('Transaction ID')
+        records = [values + (source_file, sheet_name, now, now)
+                   for values in zip(*columns) if values[key] is not None]
+        first_seen = []
+        for record in records:
+            if record[key] not in seen:
+                seen.add(record[key])
+                first_seen.append(record[key])
+        # Looked up before the upsert, which would add the new ones
+        existing = self._existing(first_seen)
+        self._db.executemany(_UPSERT, records)
+        return len(records), len(first_seen) - existing, existing, len(records) - len(first_seen)
+
+    def _existing(self, transaction_ids):
+        """The number of these (distinct) transaction IDs the ledger holds."""
+        count = 0
+        for start in range(0, len(transaction_ids), _LOOKUP_BATCH):
+            batch = transaction_ids[start:start + _LOOKUP_BATCH]
+            count += self._db.execute(f"SELECT COUNT(*) FROM payments WHERE transaction_id IN "
+                                      f"({', '.join('?' * len(batch))})", batch).fetchone()[0]
+        return count
+
+    # --- Looking up payments ---
+
+    def count(self, search=''):
+        """The number of payments matching a search (see page)."""
+        where, params = _search_clause(search, self._full_text)
+        return self._db.execute(f"SELECT COUNT(*) FROM payments WHERE {where}", params).fetchone()[0]
+
+    def page(self, search='', after_rowid=0, limit=PAGE_SIZE):
+        """
+        Returns the next page of payments matching a search, in import order.
+
+        A search matches names in which every searched word starts a word of
+        the name (case-insensitive, so "sha aar" finds "Aarav Sharma"), and
+        exact admission numbers, transaction IDs and order IDs.
+
+        Args:
+            search (str): The search text; empty for every payment.
+            after_rowid (int): The rowid of the last row of the previous page, or 0 for the first page.
+            limit (int): The number of rows to return at most.
+        Returns:
+            list: LedgerRow tuples.
+        """
+        where, params = _search_clause(search, self._full_text)
+        cursor = self._db.execute(
+            f"SELECT rowid, {', '.join(_COLUMNS)}, source_file, source_sheet, generated_at, printed_at "
+            f"FROM payments WHERE rowid > ? AND {where} ORDER BY rowid LIMIT ?",
+            [after_rowid] + params + [limit])
+        n = len(_COLUMNS)
+        return [LedgerRow(row[0], row[1:n + 1], *row[n + 1:]) for row in cursor]
+
+    def records(self, rowids):
+        """
+        Returns the receipt data of the given payments, in the order asked for.
+
+        Returns:
+            dict: rowid -> {receipt field: value}, ready for pdf_generator. Rowids
+                  that are no longer in the ledger are left out.
+        """
+        rowids = [int(rowid) for rowid in rowids]
+        found = {}
+        # Stay well under SQLite's limit on query parameters
+        for start in range(0, len(rowids), 500):
+            batch = rowids[start:start + 500]
+            cursor = self._db.execute(
+                f"SELECT rowid, {', '.join(_COLUMNS)} FROM payments WHERE rowid IN ({', '.join('?' * len(batch))})",
+                batch)
+            for row in cursor:
+                found[row[0]] = dict(zip(RECEIPT_FIELDS, row[1:]))
+        return {rowid: found[rowid] for rowid in rowids if rowid in found}
+
+    # --- Receipt history ---
+
+    def record_event(self, transaction_ids, event, file_path=None):
+        """
+        Records that the receipts of these payments were generated, printed or failed to print.
+
+        Transaction IDs that are not in the ledger (yet) are recorded too, so a
+        later import of their workbook shows their history.
+        """
+        if event not in EVENTS:
+            raise ValueError(f"Unknown receipt event: {event}")
+        transaction_ids = [str(transaction_id) for transaction_id in transaction_ids if transaction_id]
+        if not transaction_ids:
+            return
+        now = _now()
+        try:
+            self._db.executemany("INSERT INTO receipt_events (transaction_id, event, file_path, at) VALUES (?, ?, ?, ?)",
+                                 [(transaction_id, event, file_path, now) for transaction_id in transaction_ids])
+            if event != 'print_failed':
+                self._db.executemany(f"UPDATE payments SET {event}_at = ? WHERE transaction_id = ?",
+                                     [(now, transaction_id) for transaction_id in transaction_ids])
+            self._db.commit()
+        except sqlite3.Error as e:
+            self._db.rollback()
+            print(f"LEDGER_WARNING: Could not record '{event}' for {len(transaction_ids)} receipt(s). Reason: {e}",
+                  file=sys.stderr)
+
+    def history(self, transaction_id):
+        """
+        Returns every event recorded for one payment's receipt, oldest first.
+
+        Returns:
+            list: (event, file path, time) tuples.
+        """
+        return self._db.execute("SELECT event, file_path, at FROM receipt_events WHERE transaction_id = ? "
+                                "ORDER BY rowid", (str(transaction_id),)).fetchall()
+
+
+def main(argv=None):
+    """Imports workbooks from the command line, e.g. a folder of monthly exports."""
+    import argparse
+    import glob
+
+    parser = argparse.ArgumentParser(description="Import fee workbooks (every sheet) into the receipts ledger.")
+    parser.add_argument('workbooks', nargs='+', help="Workbook files or glob patterns")
+    parser.add_argument('--ledger', default=LEDGER_PATH, help=f"The ledger file (default: {LEDGER_PATH})")
+    args = parser.parse_args(argv)
+
+    files = [path for pattern in args.workbooks for path in (sorted(glob.glob(pattern)) or [pattern])]
+    ledger = ReceiptLedger(args.ledger)
+    failed = 0
+    try:
+        for file_path in files:
+            try:
+                result = ledger.import_workbook(file_path)
+            except Exception as e:
+                print(f"IMPORT_ERROR: Could not import '{file_path}'. Reason: {e}", file=sys.stderr)
+                failed += 1
+                continue
+            print(f"{file_path}: {result.rows} payment(s) from {len(result.sheets)} sheet(s), "
+                  f"{result.added} new, {result.updated} updated"
+                  + (f", {result.duplicates} repeated transaction ID(s)" if result.duplicates else "")
+                  + (f", {result.skipped_rows} without a transaction ID" if result.skipped_rows else "")
+                  + (f"; skipped sheets: {', '.join(result.skipped_sheets)}" if result.skipped_sheets else ""))
+        print(f"The ledger now holds {ledger.count()} payment(s).")
+    finally:
+        ledger.close()
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,154 @@
+"""
+Formats and checks a whole batch of receipts before any of them is rendered.
+
+prepare_receipts() runs once over the selected rows: each receipt column is
+turned into text with one vectorized operation per column (amounts, dates,
+IDs read as floats, categoricals), missing cells become 'N/A', and rows that
+should not get a receipt are flagged. The renderers then receive plain tuples
+of strings in RECEIPT_FIELDS order (see pdf_generator.receipt_field_values),
+so no pandas object is touched per row and a bad row is reported before the
+batch starts instead of turning up as a wrong receipt.
+
+The text is exactly what receipt_field_values() shows for the same row, so
+prepared and unprepared receipts look, and hash (receipt_cache), the same.
+"""
+import os
+from collections import namedtuple
+import numpy as np
+import pandas as pd
+from pandas.api.types import is_string_dtype, is_integer_dtype, is_datetime64_dtype, infer_dtype, CategoricalDtype
+from receipt_schema import RECEIPT_FIELDS, cell_text
+
+MISSING = 'N/A'
+
+# Payment statuses a receipt can be issued for, compared case-insensitively.
+# FEE_RECEIPT_STATUSES replaces them with a comma-separated list, e.g. "Success,Captured,Paid".
+RECEIPT_STATUSES = tuple(status.strip() for status in os.environ.get('FEE_RECEIPT_STATUSES', 'Success').split(',')
+                         if status.strip())
+
+# values: one tuple of strings per row, in the frame's order; problems: row position -> [message]
+PreparedReceipts = namedtuple('PreparedReceipts', ['values', 'problems'])
+
+
+def _format_floats(numbers):
+    """cell_text() of each float in an array, vectorized; NaN becomes MISSING."""
+    whole = np.isfinite(numbers) & (numbers == np.floor(numbers))
+    texts = numbers.astype(str).astype(object)
+    # Whole numbers stored as floats are shown without a trailing ".0", as cell_text() does
+    fits = whole & (np.abs(numbers) < 2.0 ** 63)
+    texts[fits] = numbers[fits].astype(np.int64).astype(str)
+    texts[whole & ~fits] = [str(int(number)) for number in numbers[whole & ~fits]]
+    texts[np.isnan(numbers)] = MISSING
+    return texts
+
+
+def _by_code(codes, texts):
+    """Picks each row's text by its code; code -1 (missing) picks MISSING."""
+    return np.append(np.asarray(texts, dtype=object), MISSING)[codes].tolist()
+
+
+def _format_column(series):
+    """The receipt text of every cell of one column, as a list."""
+    dtype = series.dtype
+    if isinstance(dtype, CategoricalDtype):
+        # Format each category once
+        return _by_code(series.cat.codes.to_numpy(), [cell_text(value, MISSING) for value in dtype.categories])
+    if is_string_dtype(dtype) and dtype != object:
+        return series.fillna(MISSING).tolist()
+    if dtype == object and infer_dtype(series, skipna=True) == 'string':
+        # Plain text with gaps: only the missing cells change
+        return series.where(series.notna(), MISSING).tolist()
+    if dtype == np.float64:
+        # Amounts repeat a lot, so format each distinct value once
+        codes, uniques = pd.factorize(series)
+        return _by_code(codes, _format_floats(np.asarray(uniques, dtype=np.float64)))
+    if is_integer_dtype(dtype) and isinstance(dtype, np.dtype):
+        return series.to_numpy().astype(str).tolist()
+    if is_datetime64_dtype(dtype):
+        # Payments share a handful of dates; str(Timestamp) is what cell_text() shows
+        codes, uniques = pd.factorize(series)
+        return _by_code(codes, [str(value) for value in uniques])
+    return [cell_text(value, MISSING) for value in series.tolist()]
+
+
+def _text_column(texts):
+    column = pd.Series(texts, dtype=object)
+    try:
+        # Arrow-backed strings make strip() and the comparisons several times faster
+        return column.astype('string[pyarrow]')
+    except (ImportError, TypeError):
+        return column
+
+
+def _is_missing(texts):
+    return texts.str.strip().isin(['', MISSING])
+
+
+def _check_rows(texts, accepted_statuses):
+    """Flags the rows that should not get a receipt; returns {row position: [message]}."""
+    problems = {}
+
+    def flag(mask, message):
+        for position in np.flatnonzero(np.asarray(mask, dtype=bool)):
+            problems.setdefault(int(position), []).append(message(position))
+
+    transaction_ids = _text_column(texts['Transaction ID'])
+    flag(_is_missing(transaction_ids), lambda position: "Transaction ID is missing")
+
+    statuses = _text_column(texts['Status'])
+    missing_status = _is_missing(statuses)
+    allowed = {status.strip().casefold() for status in accepted_statuses}
+    flag(missing_status, lambda position: "Status is missing")
+    flag(~missing_status & ~statuses.str.strip().str.casefold().isin(allowed),
+         lambda position: f"Status is '{texts['Status'][position]}'")
+
+    amounts = _text_column(texts['Amount'])
+    missing_amount = _is_missing(amounts)
+    # Parse each distinct amount once; amounts typed as text may use thousands separators ("65,000")
+    codes, uniques = pd.factorize(amounts)
+    parsed = pd.to_numeric(pd.Series(uniques).str.replace(',', '', regex=False).str.strip(), errors='coerce')
+    not_number = np.asarray(parsed.isna(), dtype=bool)[codes]
+    flag(missing_amount, lambda position: "Amount is missing")
+    flag(~missing_amount & not_number, lambda position: f"Amount '{texts['Amount'][position]}' is not a number")
+    return problems
+
+
+def prepare_receipts(df, statuses=None):
+    """
+    Formats the receipt fields of every row of a frame and checks each row.
+
+    A row is flagged when its Transaction ID or Amount is missing, its Amount
+    is not a number, or its Status is not one of the accepted statuses. Flagged
+    rows are still formatted; the caller decides whether to leave them out.
+
+    Args:
+        df (pd.DataFrame): The rows to print, with any columns; missing receipt columns show 'N/A'.
+        statuses (iterable, optional): The accepted payment statuses. Defaults to RECEIPT_STATUSES.
+
+    Returns:
+        PreparedReceipts: values (list of tuples of str, one per row, in RECEIPT_FIELDS order)
+                          and problems (dict: row position -> list of messages).
+    """
+    texts = [_format_column(df[field]) if field in df.columns else [MISSING] * len(df) for field in RECEIPT_FIELDS]
+    problems = _check_rows(dict(zip(RECEIPT_FIELDS, texts)), statuses or RECEIPT_STATUSES)
+    return PreparedReceipts(list(zip(*texts)), problems)
+
+
+def describe_problems(prepared, limit=None):
+    """
+    One line per flagged row, naming the receipt by its student and transaction.
+
+    Args:
+        prepared (PreparedReceipts): The result of prepare_receipts().
+        limit (int, optional): Describe at most this many rows.
+
+    Returns:
+        list: The lines, in row order.
+    """
+    name_at, transaction_at = RECEIPT_FIELDS.index('Name'), RECEIPT_FIELDS.index('Transaction ID')
+    lines = []
+    for position in sorted(prepared.problems)[:limit]:
+        values = prepared.values[position]
+        name, transaction_id = values[name_at].strip() or MISSING, values[transaction_at].strip() or MISSING
+        lines.append(f"{name} ({transaction_id}): {'; '.join(prepared.problems[position])}")
+    return lines
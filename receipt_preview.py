@@ -0,0 +1,245 @@
+"""
+An in-app preview of a row's receipt, painted straight into an image.
+
+Nothing is written to disk: ReceiptPreviewRenderer paints the receipt with
+QPainter at the coordinates the canvas renderer uses for the PDF
+(pdf_generator.CanvasReceiptTemplate). ReceiptPreviewPane keeps the most
+recent previews in an LRU cache keyed on the receipt's field values, and
+renders the rows next to the current one on a thread pool, so moving through
+the table shows each preview without waiting.
+"""
+from collections import OrderedDict
+from PyQt5.QtWidgets import QWidget, QLabel, QVBoxLayout, QSizePolicy
+from PyQt5.QtCore import Qt, QObject, QRunnable, QThreadPool, QThread, QRectF, QPointF, QLineF, pyqtSignal
+from PyQt5.QtGui import QImage, QPixmap, QPainter, QFont, QFontMetricsF, QPen, QColor
+
+# Dots per meter of a 72 dpi image, where one PDF point is one logical pixel
+_POINTS_PER_METER = round(72 / 0.0254)
+
+
+class ReceiptPreviewRenderer:
+    """
+    Paints receipts into QImages, laid out like the canvas renderer's PDFs.
+
+    Only the top of the page, down to the field table, is painted. Values with
+    line breaks (which the PDF renderers give a taller row) are previewed on
+    one line. render() may be called from several threads at once.
+
+    Args:
+        template (pdf_generator.CanvasReceiptTemplate, optional): The layout to follow.
+                                                                  Defaults to the shared one.
+    """
+
+    def __init__(self, template=None):
+        # Imported here so the preview pane can be created before reportlab is loaded
+        from pdf_generator import default_template, CanvasReceiptTemplate
+        from receipt_schema import RECEIPT_FIELDS
+        self.fields = RECEIPT_FIELDS
+        self.template = template or default_template(CanvasReceiptTemplate.name)
+        t = self.template
+        page_width, page_height = t.pagesize
+        # The painted part of the page, in PDF points (y up): half a margin around the receipt
+        self.left = t.margin / 2
+        self.top = page_height - t.margin / 2
+        self.width = page_width - t.margin
+        self.height = self.top - (t.table_bottom - t.margin / 2)
+        self._logos = [(QImage(logo), x, y, width, height) for logo, x, y, width, height in t.logo_positions]
+
+    def field_values(self, record):
+        """The receipt's values as strings, as the PDF shows them."""
+        return tuple(self.template.field_values(record))
+
+    def size_for(self, max_width, max_height):
+        """The (width, height) in pixels of a preview that fits in the given box, keeping the page's proportions."""
+        scale = min(max_width / self.width, max_height / self.height)
+        return max(1, int(self.width * scale)), max(1, int(self.height * scale))
+
+    def render(self, values, width):
+        """
+        Paints one receipt.
+
+        Args:
+            values (tuple): The field values, as returned by field_values().
+            width (int): The width of the image in pixels; the height follows the page's proportions.
+
+        Returns:
+            QImage: The preview.
+        """
+        t = self.template
+        scale = width / self.width
+        image = QImage(width, max(1, int(self.height * scale)), QImage.Format_RGB32)
+        image.fill(Qt.white)
+        # At 72 dpi a font's point size is its size in PDF points
+        image.setDotsPerMeterX(_POINTS_PER_METER)
+        image.setDotsPerMeterY(_POINTS_PER_METER)
+
+        painter = QPainter(image)
+        painter.setRenderHints(QPainter.Antialiasing | QPainter.TextAntialiasing | QPainter.SmoothPixmapTransform)
+        painter.scale(scale, scale)
+
+        def at(x, y):
+            # PDF coordinates (y up, from the page's bottom-left) to the painted area's (y down)
+            return QPointF(x - self.left, self.top - y)
+
+        for logo, x, y, logo_width, logo_height in self._logos:
+            painter.drawImage(QRectF(at(x, y + logo_height), at(x + logo_width, y)), logo)
+
+        painter.setPen(QColor(Qt.black))
+        title_font = self._font(t.title_style.fontSize, bold=True)
+        painter.setFont(title_font)
+        title_width = QFontMetricsF(title_font, image).horizontalAdvance("Fee Receipt")
+        painter.drawText(at(t.title_x - title_width / 2, t.title_y), "Fee Receipt")
+
+        _, font_size, _ = t._FIELD_FONT
+        label_font = self._font(font_size, bold=True)
+        value_font = self._font(font_size)
+        for i, (field, value) in enumerate(zip(self.fields, values)):
+            y = t.first_baseline - i * t.row_height
+            painter.setFont(label_font)
+            painter.drawText(at(t.table_x + t._CELL_PADDING, y), field)
+            painter.setFont(value_font)
+            painter.drawText(at(t.table_x + t._LABEL_WIDTH + t._CELL_PADDING, y), " ".join(value.splitlines()))
+
+        painter.setPen(QPen(Qt.black, 1, Qt.SolidLine, Qt.RoundCap, Qt.RoundJoin))
+        left, right = t.table_x, t.table_x + t._LABEL_WIDTH + t._VALUE_WIDTH
+        for i in range(len(values) + 1):
+            y = t.table_top - i * t.row_height
+            painter.drawLine(QLineF(at(left, y), at(right, y)))
+        for x in (left, t.table_x + t._LABEL_WIDTH, right):
+            painter.drawLine(QLineF(at(x, t.table_top), at(x, t.table_bottom)))
+        painter.end()
+        return image
+
+    @staticmethod
+    def _font(size, bold=False):
+        font = QFont('Helvetica')
+        font.setStyleHint(QFont.SansSerif)
+        font.setPointSizeF(size)
+        font.setBold(bold)
+        return font
+
+
+class _PreviewSignals(QObject):
+    rendered = pyqtSignal(object, QImage)
+
+
+class _PreviewJob(QRunnable):
+    """Renders one preview on the thread pool and reports it back to the pane's thread."""
+
+    def __init__(self, renderer, signals, key):
+        super().__init__()
+        self._renderer = renderer
+        self._signals = signals
+        self._key = key
+
+    def run(self):
+        values, width = self._key
+        self._signals.rendered.emit(self._key, self._renderer.render(values, width))
+
+
+class ReceiptPreviewPane(QWidget):
+    """
+    Shows the receipt of the current table row.
+
+    Previews are cached by field values and size, so going back to a row (or
+    to another row with the same receipt) shows it at once. The rows around
+    the current one are rendered in the background, nearest first.
+    """
+    # Previews kept in memory; each is well under 1 MB at the usual pane sizes
+    CACHE_SIZE = 64
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._renderer = None  # Created on first use; it loads reportlab and the logos
+        self._cache = OrderedDict()  # (values, width) -> QImage, least recently used first
+        self._pending = set()  # Keys being rendered on the pool
+        self._record = None  # The receipt shown, so it can be painted again at a new size
+        self._current_key = None
+        self._pool = QThreadPool(self)
+        self._pool.setMaxThreadCount(max(1, QThread.idealThreadCount() // 2))
+        self._signals = _PreviewSignals(self)
+        self._signals.rendered.connect(self._on_rendered)
+
+        self.image_label = QLabel()
+        self.image_label.setAlignment(Qt.AlignHCenter | Qt.AlignTop)
+        # Ignore the pixmap's size, or showing a preview would resize the pane and render it again
+        self.image_label.setSizePolicy(QSizePolicy.Ignored, QSizePolicy.Ignored)
+        self.image_label.setMinimumSize(200, 150)
+        layout = QVBoxLayout(self)
+        layout.setContentsMargins(0, 0, 0, 0)
+        layout.addWidget(self.image_label)
+        self.clear()
+
+    def clear(self):
+        """Shows the placeholder instead of a receipt."""
+        self._record = None
+        self._current_key = None
+        self.image_label.setText("Select a row to preview its receipt.")
+
+    def show_receipt(self, record, neighbours=()):
+        """
+        Shows a row's receipt and renders its neighbours' in the background.
+
+        Args:
+            record (pd.Series | dict): The row to show.
+            neighbours (iterable): Rows likely to be shown next, most likely first.
+        """
+        if self._renderer is None:
+            self._renderer = ReceiptPreviewRenderer()
+        self._record = record
+        width, height = self._image_size()
+        key = (self._renderer.field_values(record), width)
+        self._current_key = key
+        image = self._cached(key)
+        if image is None:
+            self._pending.discard(key)
+            image = self._renderer.render(*key)
+            self._store(key, image)
+        self._display(image)
+
+        for neighbour in neighbours:
+            neighbour_key = (self._renderer.field_values(neighbour), width)
+            if neighbour_key not in self._cache and neighbour_key not in self._pending:
+                self._pending.add(neighbour_key)
+                self._pool.start(_PreviewJob(self._renderer, self._signals, neighbour_key))
+
+    def _image_size(self):
+        ratio = self.devicePixelRatioF()
+        return self._renderer.size_for(self.image_label.width() * ratio, self.image_label.height() * ratio)
+
+    def _cached(self, key):
+        image = self._cache.get(key)
+        if image is not None:
+            self._cache.move_to_end(key)
+        return image
+
+    def _store(self, key, image):
+        self._cache[key] = image
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.CACHE_SIZE:
+            self._cache.popitem(last=False)
+
+    def _display(self, image):
+        pixmap = QPixmap.fromImage(image)
+        pixmap.setDevicePixelRatio(self.devicePixelRatioF())
+        self.image_label.setPixmap(pixmap)
+
+    def _on_rendered(self, key, image):
+        if key not in self._pending:
+            # Rendered in the meantime for display, or the cache was cleared
+            return
+        self._pending.discard(key)
+        self._store(key, image)
+        if key == self._current_key:
+            self._display(image)
+
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+        if self._record is not None:
+            self.show_receipt(self._record)
+
+    def shutdown(self):
+        """Drops queued renders and waits for the running ones; call before the pane is destroyed."""
+        self._pool.clear()
+        self._pool.waitForDone()
+        self._pending.clear()
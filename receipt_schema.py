@@ -0,0 +1,150 @@
+"""
+The columns of a fee sheet that the app uses, and how each one is stored in memory.
+
+Loading with RECEIPT_SCHEMA keeps only these columns and gives each one a
+compact dtype: categoricals for the few distinct classes and statuses,
+numbers for amounts, datetimes for dates and Arrow-backed strings for text.
+"""
+import datetime
+import pandas as pd
+from pandas.api.types import (is_numeric_dtype, is_float_dtype, is_datetime64_any_dtype, is_bool_dtype,
+                              CategoricalDtype)
+
+# IMPORTANT: These column names must exactly match the headers in your Excel file.
+RECEIPT_FIELDS = [
+    'Name', 'Admission Number', 'Class', 'Bank Reference ID',
+    'Order ID', 'Transaction ID', 'Status', 'Amount', 'Date'
+]
+
+# How each receipt column is stored: 'text', 'category', 'number' or 'datetime'.
+RECEIPT_SCHEMA = {
+    'Name': 'text',
+    'Admission Number': 'text',
+    'Class': 'category',
+    'Bank Reference ID': 'text',
+    'Order ID': 'text',
+    'Transaction ID': 'text',
+    'Status': 'category',
+    'Amount': 'number',
+    'Date': 'datetime',
+}
+
+
+def _string_dtype():
+    try:
+        import pyarrow  # noqa: F401
+        return 'string[pyarrow]'
+    except ImportError:
+        return 'string'
+
+
+def _text(series):
+    if is_float_dtype(series) and series.dropna().map(float.is_integer).all():
+        # IDs read as floats (because of blank cells) shouldn't gain a ".0"
+        series = series.astype('Int64')
+    return series.astype(_string_dtype())
+
+
+def _convert(series, kind):
+    if kind == 'category':
+        return series.astype('category')
+    if kind == 'number':
+        if is_numeric_dtype(series) and not is_bool_dtype(series):
+            return series
+        converted = pd.to_numeric(series, errors='coerce')
+        # Keep the column as typed if some values aren't numbers (e.g. "65,000")
+        return converted if converted.count() == series.count() else _text(series)
+    if kind == 'datetime':
+        if is_datetime64_any_dtype(series):
+            return series
+        # Only cells Excel stored as dates are converted; dates typed as text keep their spelling
+        if series.dropna().map(lambda value: isinstance(value, datetime.date)).all():
+            return pd.to_datetime(series, errors='coerce')
+        return _text(series)
+    return _text(series)
+
+
+def apply_schema(frame, schema):
+    """
+    Converts the schema's columns of a frame to their compact dtypes.
+
+    Columns that aren't in the schema are dropped; schema columns missing from
+    the frame are skipped. The frame's own column order is kept.
+    """
+    return pd.DataFrame({column: _convert(frame[column], schema[column])
+                         for column in frame.columns if column in schema}, index=frame.index)
+
+
+def _shown_text(series):
+    """A column as text, each value spelled as cell_text shows it."""
+    return series.map(cell_text, na_action='ignore').astype(_string_dtype())
+
+
+def concat_frames(frames):
+    """
+    Concatenates chunks of the same sheet, keeping the dtypes apply_schema gave them.
+
+    Categorical columns stay categorical even when the chunks saw different
+    sets of values. A number or date column that one chunk had to keep as text
+    (see _convert) becomes text in every chunk, spelled as the table shows it,
+    rather than a column of mixed objects.
+    """
+    frames = [frame for frame in frames if len(frame)] or list(frames[:1])
+    if len(frames) == 1:
+        return frames[0]
+    frames = list(frames)
+    for column in frames[0].columns:
+        dtypes = [frame[column].dtype for frame in frames if column in frame]
+        as_text = [isinstance(dtype, pd.StringDtype) for dtype in dtypes]
+        if any(as_text) and not all(as_text):
+            for i, frame in enumerate(frames):
+                if column in frame and not isinstance(frame[column].dtype, (pd.StringDtype, CategoricalDtype)):
+                    frame = frame.copy(deep=False)
+                    frame[column] = _shown_text(frame[column])
+                    frames[i] = frame
+        if not all(column in frame and isinstance(frame[column].dtype, CategoricalDtype) for frame in frames):
+            continue
+        categories = frames[0][column].cat.categories
+        for frame in frames[1:]:
+            categories = categories.append(frame[column].cat.categories).unique()
+        for i, frame in enumerate(frames):
+            if not frame[column].cat.categories.equals(categories):
+                frame = frame.copy(deep=False)
+                frame[column] = frame[column].cat.set_categories(categories)
+                frames[i] = frame
+    return pd.concat(frames, ignore_index=True)
+
+
+def cell_text(value, missing=''):
+    """
+    The text shown for one cell: missing values become `missing` and whole
+    numbers stored as floats are shown without a trailing ".0".
+    """
+    if value is None:
+        return missing
+    if isinstance(value, float):
+        if value != value:
+            return missing
+        return str(int(value)) if value.is_integer() else str(value)
+    if value is pd.NA or value is pd.NaT:
+        return missing
+    return str(value)
+
+
+def memory_usage(df):
+    """
+    Returns the memory a frame holds, including the strings it points to.
+
+    Returns:
+        tuple: (total bytes, {column: bytes})
+    """
+    usage = df.memory_usage(deep=True, index=False)
+    return int(usage.sum()), {str(column): int(size) for column, size in usage.items()}
+
+
+def format_memory_report(df):
+    """A one-line summary of a frame's size and its largest columns."""
+    total, by_column = memory_usage(df)
+    largest = sorted(by_column.items(), key=lambda item: item[1], reverse=True)[:3]
+    details = ", ".join(f"{column} {size / 2 ** 20:.1f} MB" for column, size in largest)
+    return f"{len(df)} rows in {total / 2 ** 20:.1f} MB ({details})"
@@ -0,0 +1,67 @@
+"""
+Destinations for receipts rendered in memory.
+
+receipt_batch.generate_receipts can render each receipt into a buffer instead
+of a file and hand the bytes to a sink, which writes them one after another
+from a single thread. A ZipSink turns a whole batch into one sequentially
+written archive, which is far faster than creating thousands of small files
+on a network share.
+
+A sink has write(name, data), close() and abort(). Names are the receipts'
+usual file names (pdf_generator.receipt_file_name).
+"""
+import os
+import sys
+import zipfile
+
+# Bytes buffered before the archive is written out, so a share sees a few large writes
+_WRITE_BUFFER = 1024 * 1024
+
+
+class ZipSink:
+    """
+    Streams receipts into one ZIP archive.
+
+    The archive is written to a temporary file next to path and moved into
+    place by close(), so a cancelled or failed batch never leaves a truncated
+    archive behind. PDFs are already compressed, so entries are stored as they
+    are by default.
+    """
+
+    def __init__(self, path, compression=zipfile.ZIP_STORED):
+        self.path = os.path.abspath(path)
+        self._tmp_path = self.path + '.tmp'
+        self._file = open(self._tmp_path, 'wb', buffering=_WRITE_BUFFER)
+        self._zip = zipfile.ZipFile(self._file, 'w', compression=compression)
+        self.count = 0
+
+    def write(self, name, data):
+        self._zip.writestr(name, data)
+        self.count += 1
+
+    def close(self):
+        """
+        Finishes the archive and moves it into place.
+
+        Returns:
+            bool: True if the archive was written.
+        """
+        try:
+            self._zip.close()
+            self._file.close()
+            os.replace(self._tmp_path, self.path)
+        except OSError as e:
+            print(f"ARCHIVE_ERROR: Could not write '{self.path}'. Reason: {e}", file=sys.stderr)
+            self.abort()
+            return False
+        return True
+
+    def abort(self):
+        """Discards the archive."""
+        try:
+            self._zip.close()
+            self._file.close()
+        except OSError:
+            pass
+        if os.path.exists(self._tmp_path):
+            os.remove(self._tmp_path)
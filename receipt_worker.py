@@ -0,0 +1,126 @@
+from PyQt5.QtCore import QObject, QThread, pyqtSignal
+from receipt_batch import generate_receipts
+from pdf_generator import create_receipts_batch_pdf, BatchCancelled
+
+
+class ReceiptBatchWorker(QObject):
+    """
+    Runs receipt_batch.generate_receipts on a background thread.
+
+    With a sink (e.g. a receipt_sink.ZipSink) the worker also finishes it: the
+    sink is closed when the batch is done and discarded when it is cancelled.
+    If it cannot be closed, every receipt counts as failed.
+
+    Signals:
+        receipt_done (object): A receipt_batch.ReceiptResult for each finished receipt.
+        finished (int, int, bool): Success count, failure count and whether the batch was cancelled.
+    """
+    receipt_done = pyqtSignal(object)
+    finished = pyqtSignal(int, int, bool)
+
+    def __init__(self, jobs, max_workers=None, manifest=None, sink=None):
+        super().__init__()
+        self.jobs = jobs
+        self.max_workers = max_workers
+        self.manifest = manifest
+        self.sink = sink
+        self._cancelled = False
+
+    def cancel(self):
+        """Stops submitting receipts; the ones already being generated still finish."""
+        self._cancelled = True
+
+    def run(self):
+        success_count, error_count, cancelled = generate_receipts(
+            self.jobs,
+            max_workers=self.max_workers,
+            on_result=self.receipt_done.emit,
+            should_cancel=lambda: self._cancelled,
+            manifest=self.manifest,
+            sink=self.sink,
+        )
+        if self.sink is not None:
+            if cancelled:
+                self.sink.abort()
+            elif not self.sink.close():
+                success_count, error_count = 0, success_count + error_count
+        self.finished.emit(success_count, error_count, cancelled)
+
+
+class BatchDocumentWorker(QObject):
+    """
+    Writes a selection of receipts into one multi-page PDF on a background thread.
+
+    Signals:
+        progress (int): The number of receipts written so far.
+        finished (bool, bool): Whether the document was written, and whether the build was cancelled.
+    """
+    progress = pyqtSignal(int)
+    finished = pyqtSignal(bool, bool)
+
+    def __init__(self, records, file_path, manifest=None):
+        super().__init__()
+        self.records = records
+        self.file_path = file_path
+        self.manifest = manifest
+        self._cancelled = False
+
+    def cancel(self):
+        """Stops the build after the current page; the partial file is removed."""
+        self._cancelled = True
+
+    def _on_page(self, pages_done):
+        if self._cancelled:
+            raise BatchCancelled()
+        self.progress.emit(pages_done)
+
+    def run(self):
+        digest = None
+        if self.manifest is not None:
+            digest = self.manifest.batch_digest(self.records)
+            if self.manifest.lookup(self.file_path, digest):
+                # The same receipts were already written to this file
+                self.manifest.save()
+                self.progress.emit(len(self.records))
+                self.finished.emit(True, False)
+                return
+        ok = create_receipts_batch_pdf(self.records, self.file_path, on_page=self._on_page)
+        if ok and digest is not None:
+            self.manifest.record(self.file_path, digest, receipts=len(self.records))
+            self.manifest.save()
+        self.finished.emit(ok, self._cancelled)
+
+
+def _move_to_thread(worker, parent):
+    thread = QThread(parent)
+    worker.moveToThread(thread)
+
+    thread.started.connect(worker.run)
+    worker.finished.connect(thread.quit)
+    thread.finished.connect(worker.deleteLater)
+    thread.finished.connect(thread.deleteLater)
+    return thread, worker
+
+
+def create_batch_document_thread(records, file_path, manifest=None, parent=None):
+    """
+    Creates a BatchDocumentWorker on its own QThread.
+
+    Connect to the worker's signals first, then call thread.start().
+
+    Returns:
+        tuple: (QThread, BatchDocumentWorker)
+    """
+    return _move_to_thread(BatchDocumentWorker(records, file_path, manifest), parent)
+
+
+def create_receipt_batch_thread(jobs, max_workers=None, manifest=None, sink=None, parent=None):
+    """
+    Creates a ReceiptBatchWorker on its own QThread.
+
+    Connect to the worker's signals first, then call thread.start().
+
+    Returns:
+        tuple: (QThread, ReceiptBatchWorker)
+    """
+    return _move_to_thread(ReceiptBatchWorker(jobs, max_workers, manifest, sink), parent)
@@ -0,0 +1,75 @@
+import numpy as np
+
+
+class SelectionStore:
+    """
+    Which table rows are checked, kept as one boolean array.
+
+    Every bulk change (select all, invert, select matching rows...) is a single
+    vectorized numpy operation, however many rows the table has.
+    """
+
+    def __init__(self, size=0):
+        self._selected = np.zeros(size, dtype=bool)
+
+    def __len__(self):
+        return len(self._selected)
+
+    # --- Reading ---
+
+    def is_selected(self, row):
+        return bool(self._selected[row])
+
+    def count(self):
+        """The number of selected rows."""
+        return int(np.count_nonzero(self._selected))
+
+    def rows(self):
+        """Returns the selected row positions in ascending order (np.ndarray)."""
+        return np.flatnonzero(self._selected)
+
+    def mask(self):
+        """A copy of the selection as a boolean array, one entry per row."""
+        return self._selected.copy()
+
+    # --- Single rows ---
+
+    def set(self, row, selected):
+        """Selects or unselects one row. Returns True if that changed anything."""
+        if self._selected[row] == selected:
+            return False
+        self._selected[row] = selected
+        return True
+
+    # --- Bulk changes ---
+
+    def select_all(self):
+        self._selected[:] = True
+
+    def clear(self):
+        self._selected[:] = False
+
+    def invert(self, rows=None):
+        """Inverts the selection of the given rows (np.ndarray of positions), or of every row."""
+        if rows is None:
+            np.logical_not(self._selected, out=self._selected)
+        else:
+            self._selected[rows] = ~self._selected[rows]
+
+    def select(self, rows, selected=True):
+        """Selects (or unselects) the given rows: positions or a boolean mask, one entry per row."""
+        self._selected[rows] = selected
+
+    # --- Keeping up with the table's rows ---
+
+    def append(self, count):
+        """Adds `count` unselected rows at the end."""
+        self._selected = np.concatenate([self._selected, np.zeros(count, dtype=bool)])
+
+    def remove(self, first, last):
+        """Removes rows first..last (inclusive); the rows after them move up."""
+        self._selected = np.delete(self._selected, np.s_[first:last + 1])
+
+    def keep(self, mask):
+        """Keeps only the rows where mask is True, in order."""
+        self._selected = self._selected[mask]
@@ -1,22 +1,476 @@
-from PyQt5.QtWidgets import QTableWidget
+import difflib
+import numpy as np
+import pandas as pd
+from pandas.api.types import is_string_dtype
+from PyQt5.QtCore import Qt, QAbstractProxyModel, QModelIndex
 
 
-def filter_table_by_name(table_widget: QTableWidget, search_text: str, name_column_index: int):
+class NameSearchIndex:
     """
-    Filters the rows of a QTableWidget based on a search text in a specific column.
-    The search is case-insensitive.
+    A lowercased copy of the name column that answers substring searches with
+    one vectorized pass instead of a loop over table rows.
 
-    Args:
-        table_widget (QTableWidget): The table to filter.
-        search_text (str): The text to search for.
-        name_column_index (int): The index of the column to search in.
+    While the user keeps typing, each query usually extends the previous one,
+    so only the rows that matched last time are searched again.
     """
-    search_text = search_text.lower()
-    for row_idx in range(table_widget.rowCount()):
-        item = table_widget.item(row_idx, name_column_index)
-        # Make sure the item exists before trying to access its text
-        if item and search_text in item.text().lower():
-            table_widget.setRowHidden(row_idx, False)
+
+    def __init__(self, names):
+        self._names = self._normalize(names)
+        self._last_query = None
+        self._last_matches = None
+
+    @staticmethod
+    def _normalize(names):
+        names = pd.Series(names, copy=False)
+        if isinstance(names.dtype, pd.CategoricalDtype):
+            names = names.astype(object)
+        # Missing names are blank, not "nan" or "<na>", so they match no search
+        lowered = names.fillna('').astype(str).str.lower().reset_index(drop=True)
+        try:
+            # Arrow-backed strings make str.contains several times faster
+            return lowered.astype('string[pyarrow]')
+        except (ImportError, TypeError):
+            return lowered
+
+    def __len__(self):
+        return len(self._names)
+
+    def extend(self, names):
+        """Adds the names of rows appended to the table (e.g. a newly loaded chunk)."""
+        self._names = pd.concat([self._names, self._normalize(names)], ignore_index=True)
+        self._last_query = None
+        self._last_matches = None
+
+    def apply_diff(self, names, diff):
+        """
+        Brings the index up to date after the table model applied a workbook diff.
+
+        Only the names of updated and added rows are normalized again; the others
+        are kept, with the removed ones dropped in one vectorized step.
+
+        Args:
+            names (pd.Series): The name column of the table's rows after the diff (see workbook_diff.merged_frame).
+            diff (WorkbookDiff): The diff the model applied.
+        """
+        kept = np.ones(len(self._names), dtype=bool)
+        kept[diff.removed] = False
+        self._names = self._names[kept].reset_index(drop=True)
+        if len(diff.updated):
+            # Positions of the updated rows once the removed ones are gone
+            updated = diff.updated - np.searchsorted(diff.removed, diff.updated)
+            self._names.iloc[updated] = self._normalize(names.iloc[updated]).to_numpy()
+        if len(diff.added):
+            self.extend(names.iloc[len(self._names):])
+        self._last_query = None
+        self._last_matches = None
+
+    def match(self, search_text):
+        """
+        Returns the positions of the rows whose name contains search_text (case-insensitive).
+
+        Returns:
+            np.ndarray: Sorted row positions.
+        """
+        query = search_text.lower()
+        if not query:
+            return np.arange(len(self._names))
+
+        narrowing = self._last_query is not None and self._last_query in query
+        if narrowing and len(self._last_matches) < len(self._names):
+            # Narrow the previous result instead of scanning every row again
+            candidates = self._last_matches
+            mask = self._names.take(candidates).str.contains(query, regex=False).to_numpy(dtype=bool, na_value=False)
+            matches = candidates[mask]
         else:
-            # Hide the row if the item doesn't exist or doesn't match
-            table_widget.setRowHidden(row_idx, True)
\ No newline at end of file
+            mask = self._names.str.contains(query, regex=False).to_numpy(dtype=bool, na_value=False)
+            matches = np.flatnonzero(mask)
+
+        self._last_query = query
+        self._last_matches = matches
+        return matches
+
+
+# Columns whose values identify one payment (or one student); scanned or typed at the counter
+KEY_COLUMNS = ('Admission Number', 'Transaction ID', 'Order ID')
+
+
+class KeyLookupIndex:
+    """
+    A hash table from identifier values (admission number, transaction ID,
+    order ID) to the rows holding them, built once when the sheet is loaded.
+
+    An exact lookup is a single dict access, however many rows the sheet has.
+    Keys are compared without surrounding spaces and case-insensitively, and
+    IDs read as floats (e.g. 12345.0) match their typed spelling.
+
+    The tables hold row ids rather than positions: a row keeps its id for as
+    long as it is in the table, and a reload that removes rows only records the
+    removed ids (see apply_diff), so the rows after them need no renumbering.
+    An id's position is the id minus the number of removed ids below it.
+    """
+    # How many keys closest() shortlists by shared trigrams before ranking them with difflib
+    FUZZY_SHORTLIST = 500
+
+    def __init__(self, frame, key_columns=KEY_COLUMNS, fuzzy_columns=('Name',)):
+        self._key_columns = [column for column in key_columns if column in frame.columns]
+        self._fuzzy_columns = [column for column in fuzzy_columns if column in frame.columns]
+        # Normalized value -> row id, or a list of ids when several rows share it
+        self._keys = {}
+        self._names = {}  # The same for names; only used by closest()
+        self._candidates = None  # Every key and name as one Series, for closest(); built on first use
+        self._next_id = 0
+        self._removed = np.empty(0, dtype=np.int64)  # Sorted ids of the rows removed from the table
+        self.extend(frame)
+
+    @staticmethod
+    def normalize(text):
+        return text.strip().lower()
+
+    @staticmethod
+    def _normalized_values(values):
+        if not is_string_dtype(values.dtype) or values.dtype == object:
+            from receipt_schema import cell_text
+            values = values.map(cell_text)
+        try:
+            # Arrow-backed strings make strip() and lower() several times faster
+            text = values.astype('string[pyarrow]')
+        except (ImportError, TypeError):
+            text = values.astype('string')
+        return text.fillna('').str.strip().str.lower()
+
+    @staticmethod
+    def _append(table, key, position):
+        rows = table.get(key)
+        if rows is None:
+            table[key] = position
+        elif isinstance(rows, list):
+            rows.append(position)
+        else:
+            table[key] = [rows, position]
+
+    @staticmethod
+    def _discard(table, key, row_id):
+        rows = table.get(key)
+        if isinstance(rows, list):
+            if row_id in rows:
+                rows.remove(row_id)
+            if len(rows) == 1:
+                table[key] = rows[0]
+            elif not rows:
+                del table[key]
+        elif rows == row_id:
+            del table[key]
+
+    @staticmethod
+    def _rows(table, key):
+        rows = table.get(key, [])
+        return rows if isinstance(rows, list) else [rows]
+
+    @classmethod
+    def _add(cls, table, values, ids):
+        keys = cls._normalized_values(values)
+        present = (keys != '').to_numpy(dtype=bool)
+        keys = keys[present]
+        ids = np.asarray(ids)[present]
+        repeated = keys.duplicated(keep=False).to_numpy(dtype=bool)
+        # Most identifiers belong to one row: add those in one step
+        single = dict(zip(keys[~repeated].tolist(), ids[~repeated].tolist()))
+        for key in single.keys() & table.keys():
+            cls._append(table, key, single.pop(key))
+        table.update(single)
+        for key, row_id in zip(keys[repeated].tolist(), ids[repeated].tolist()):
+            cls._append(table, key, row_id)
+
+    @classmethod
+    def _remove(cls, table, values, ids):
+        keys = cls._normalized_values(values).tolist()
+        for key, row_id in zip(keys, np.asarray(ids).tolist()):
+            if key:
+                cls._discard(table, key, row_id)
+
+    def _positions(self, ids):
+        """The current table positions of row ids."""
+        ids = np.asarray(ids, dtype=np.int64)
+        return ids - np.searchsorted(self._removed, ids)
+
+    def _ids(self, positions):
+        """The row ids at table positions (the inverse of _positions)."""
+        positions = np.asarray(positions, dtype=np.int64)
+        # Live rows before each removed id; a position skips every removed id whose count is at most it
+        live_before = self._removed - np.arange(len(self._removed))
+        return positions + np.searchsorted(live_before, positions, side='right')
+
+    def __len__(self):
+        return self._next_id - len(self._removed)
+
+    def extend(self, frame):
+        """Adds the rows appended to the table (e.g. a newly loaded chunk)."""
+        ids = np.arange(self._next_id, self._next_id + len(frame))
+        for column in self._key_columns:
+            self._add(self._keys, frame[column], ids)
+        for column in self._fuzzy_columns:
+            self._add(self._names, frame[column], ids)
+        self._next_id += len(frame)
+        self._candidates = None
+
+    def apply_diff(self, old_frame, frame, diff):
+        """
+        Brings the index up to date after the table model applied a workbook diff,
+        touching only the removed, updated and added rows.
+
+        Args:
+            old_frame (pd.DataFrame): The table's rows before the diff.
+            frame (pd.DataFrame): The table's rows after it (see workbook_diff.merged_frame).
+            diff (WorkbookDiff): The diff the model applied.
+        """
+        changed = np.union1d(diff.removed, diff.updated).astype(np.int64)
+        changed_ids = self._ids(changed)
+        old_rows = old_frame.iloc[changed]
+        for column in self._key_columns:
+            self._remove(self._keys, old_rows[column], changed_ids)
+        for column in self._fuzzy_columns:
+            self._remove(self._names, old_rows[column], changed_ids)
+
+        # Updated rows keep their ids and take their new values
+        updated_ids = self._ids(diff.updated)
+        self._removed = np.union1d(self._removed, self._ids(diff.removed)).astype(np.int64)
+        new_rows = frame.iloc[self._positions(updated_ids)]
+        for column in self._key_columns:
+            self._add(self._keys, new_rows[column], updated_ids)
+        for column in self._fuzzy_columns:
+            self._add(self._names, new_rows[column], updated_ids)
+
+        self.extend(frame.iloc[len(frame) - len(diff.added):])
+
+    def lookup(self, text):
+        """
+        Returns the rows holding text in one of the key columns.
+
+        Returns:
+            np.ndarray: Sorted row positions; empty if nothing matches exactly.
+        """
+        return np.unique(self._positions(self._rows(self._keys, self.normalize(text))))
+
+    def closest(self, text, limit=20, cutoff=0.6):
+        """
+        Returns the rows whose identifiers or names are most similar to text,
+        for when a scan or a typed ID has no exact match.
+
+        The keys sharing the most three-letter runs with text are shortlisted
+        with vectorized searches, and only those are ranked with difflib.
+
+        Args:
+            text (str): What was scanned or typed.
+            limit (int): The most keys to return the rows of.
+            cutoff (float): The least similarity (0-1) a key needs, see difflib.
+
+        Returns:
+            np.ndarray: Row positions, best match first.
+        """
+        query = self.normalize(text)
+        if not query:
+            return np.empty(0, dtype=np.int64)
+        if self._candidates is None:
+            self._candidates = NameSearchIndex._normalize(list(self._keys.keys() | self._names.keys()))
+        if not len(self._candidates):
+            return np.empty(0, dtype=np.int64)
+
+        grams = {query[i:i + 3] for i in range(max(1, len(query) - 2))}
+        shared = np.zeros(len(self._candidates), dtype=np.int32)
+        for gram in grams:
+            shared += self._candidates.str.contains(gram, regex=False).to_numpy(dtype=bool, na_value=False)
+        shortlist = np.flatnonzero(shared)
+        if len(shortlist) > self.FUZZY_SHORTLIST:
+            shortlist = shortlist[np.argpartition(-shared[shortlist], self.FUZZY_SHORTLIST)[:self.FUZZY_SHORTLIST]]
+
+        rows = []
+        words = self._candidates.take(shortlist).tolist()
+        for key in difflib.get_close_matches(query, words, n=limit, cutoff=cutoff):
+            rows += self._rows(self._keys, key) + self._rows(self._names, key)
+        # Keep the best-first order, each row once
+        return pd.unique(self._positions(rows))
+
+
+class IndexFilterProxyModel(QAbstractProxyModel):
+    """
+    A proxy model that shows only the given source rows.
+
+    Unlike QSortFilterProxyModel it never asks about rows one at a time: the
+    visible rows are replaced in one step with set_visible_rows().
+    """
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._rows = None  # None means every source row is visible
+        self._proxy_rows = None  # Source row -> proxy row, -1 for hidden rows
+        self._removal = None  # How the source rows being removed are forwarded ('rows' or 'reset')
+
+    def setSourceModel(self, source_model):
+        old_model = self.sourceModel()
+        if old_model is not None:
+            old_model.dataChanged.disconnect(self._on_source_data_changed)
+            old_model.rowsAboutToBeInserted.disconnect(self._on_source_rows_about_to_be_inserted)
+            old_model.rowsInserted.disconnect(self._on_source_rows_inserted)
+            old_model.rowsAboutToBeRemoved.disconnect(self._on_source_rows_about_to_be_removed)
+            old_model.rowsRemoved.disconnect(self._on_source_rows_removed)
+            old_model.modelAboutToBeReset.disconnect(self.beginResetModel)
+            old_model.modelReset.disconnect(self._on_source_reset)
+
+        self.beginResetModel()
+        self._rows = None
+        self._proxy_rows = None
+        super().setSourceModel(source_model)
+        if source_model is not None:
+            source_model.dataChanged.connect(self._on_source_data_changed)
+            source_model.rowsAboutToBeInserted.connect(self._on_source_rows_about_to_be_inserted)
+            source_model.rowsInserted.connect(self._on_source_rows_inserted)
+            source_model.rowsAboutToBeRemoved.connect(self._on_source_rows_about_to_be_removed)
+            source_model.rowsRemoved.connect(self._on_source_rows_removed)
+            source_model.modelAboutToBeReset.connect(self.beginResetModel)
+            source_model.modelReset.connect(self._on_source_reset)
+        self.endResetModel()
+
+    def set_visible_rows(self, rows):
+        """
+        Shows only the given source rows, in the given order.
+
+        Args:
+            rows (np.ndarray | None): Source row positions, or None to show every row.
+        """
+        # Remember where the persistent indexes (current cell, selection) point in the source
+        persistent = self.persistentIndexList()
+        source_indexes = [self.mapToSource(index) for index in persistent]
+
+        self.layoutAboutToBeChanged.emit()
+        if rows is None:
+            self._rows = None
+            self._proxy_rows = None
+        else:
+            self._rows = np.asarray(rows, dtype=np.int64)
+            self._proxy_rows = np.full(self.sourceModel().rowCount(), -1, dtype=np.int64)
+            self._proxy_rows[self._rows] = np.arange(len(self._rows))
+        self.changePersistentIndexList(persistent, [self.mapFromSource(index) for index in source_indexes])
+        self.layoutChanged.emit()
+
+    def is_filtered(self):
+        return self._rows is not None
+
+    def accepts_source_row(self, source_row):
+        """Returns True if the source row is currently visible."""
+        return self._proxy_rows is None or (source_row < len(self._proxy_rows) and self._proxy_rows[source_row] >= 0)
+
+    def accepts_source_rows(self, source_rows):
+        """Like accepts_source_row for many rows at once. Returns a boolean np.ndarray."""
+        source_rows = np.asarray(source_rows, dtype=np.int64)
+        if self._proxy_rows is None:
+            return np.ones(len(source_rows), dtype=bool)
+        visible = np.zeros(len(source_rows), dtype=bool)
+        known = source_rows < len(self._proxy_rows)
+        visible[known] = self._proxy_rows[source_rows[known]] >= 0
+        return visible
+
+    def visible_source_rows(self):
+        """Returns the source rows that are shown (np.ndarray), or None if every row is shown."""
+        return None if self._rows is None else self._rows.copy()
+
+    # --- QAbstractProxyModel interface ---
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid() or self.sourceModel() is None:
+            return 0
+        return self.sourceModel().rowCount() if self._rows is None else len(self._rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        if parent.isValid() or self.sourceModel() is None:
+            return 0
+        return self.sourceModel().columnCount()
+
+    def index(self, row, column, parent=QModelIndex()):
+        if parent.isValid() or not self.hasIndex(row, column, parent):
+            return QModelIndex()
+        return self.createIndex(row, column)
+
+    def parent(self, index=QModelIndex()):
+        return QModelIndex()
+
+    def mapToSource(self, proxy_index):
+        if not proxy_index.isValid() or self.sourceModel() is None:
+            return QModelIndex()
+        row = proxy_index.row() if self._rows is None else int(self._rows[proxy_index.row()])
+        return self.sourceModel().index(row, proxy_index.column())
+
+    def mapFromSource(self, source_index):
+        if not source_index.isValid():
+            return QModelIndex()
+        row = source_index.row()
+        if self._proxy_rows is not None:
+            row = int(self._proxy_rows[row]) if row < len(self._proxy_rows) else -1
+            if row < 0:
+                return QModelIndex()
+        return self.index(row, source_index.column())
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if orientation == Qt.Vertical and self._rows is not None and 0 <= section < len(self._rows):
+            # Keep the original spreadsheet row numbers when filtered
+            section = int(self._rows[section])
+        return self.sourceModel().headerData(section, orientation, role) if self.sourceModel() else None
+
+    # --- Source model signals ---
+
+    def _on_source_data_changed(self, top_left, bottom_right, roles=()):
+        if top_left.row() == bottom_right.row():
+            proxy_index = self.mapFromSource(top_left)
+            if proxy_index.isValid():
+                self.dataChanged.emit(proxy_index, self.index(proxy_index.row(), bottom_right.column()), roles)
+        elif self.rowCount() > 0:
+            # A block of rows changed; refresh the same columns for every visible row
+            self.dataChanged.emit(self.index(0, top_left.column()),
+                                  self.index(self.rowCount() - 1, bottom_right.column()), roles)
+
+    def _on_source_rows_about_to_be_inserted(self, parent, first, last):
+        # While filtered, new rows stay hidden until the filter is applied again
+        if self._rows is None:
+            self.beginInsertRows(QModelIndex(), first, last)
+
+    def _on_source_rows_inserted(self, parent, first, last):
+        if self._rows is None:
+            self.endInsertRows()
+        else:
+            # Grow the reverse mapping so the new rows map to "hidden"
+            extra = np.full(last - first + 1, -1, dtype=np.int64)
+            self._proxy_rows = np.concatenate([self._proxy_rows, extra])
+
+    def _on_source_rows_about_to_be_removed(self, parent, first, last):
+        if self._rows is None:
+            self._removal = 'rows'
+            self.beginRemoveRows(QModelIndex(), first, last)
+            return
+        positions = np.flatnonzero((self._rows >= first) & (self._rows <= last))
+        if len(positions) == 0:
+            self._removal = None
+        elif positions[-1] - positions[0] == len(positions) - 1:
+            # The visible rows are in source order, so the removed ones are one proxy block
+            self._removal = 'rows'
+            self.beginRemoveRows(QModelIndex(), int(positions[0]), int(positions[-1]))
+        else:
+            self._removal = 'reset'
+            self.beginResetModel()
+
+    def _on_source_rows_removed(self, parent, first, last):
+        if self._rows is not None:
+            # Drop the removed rows and shift the ones after them up
+            count = last - first + 1
+            rows = self._rows[(self._rows < first) | (self._rows > last)]
+            self._rows = np.where(rows > last, rows - count, rows)
+            self._proxy_rows = np.full(self.sourceModel().rowCount(), -1, dtype=np.int64)
+            self._proxy_rows[self._rows] = np.arange(len(self._rows))
+        if self._removal == 'rows':
+            self.endRemoveRows()
+        elif self._removal == 'reset':
+            self.endResetModel()
+        self._removal = None
+
+    def _on_source_reset(self):
+        self._rows = None
+        self._proxy_rows = None
+        self.endResetModel()
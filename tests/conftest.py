@@ -0,0 +1,9 @@
+"""
+Shared test setup: the app's modules live at the repository root, next to this
+directory, and Qt runs on the offscreen platform so no display is needed.
+"""
+import os
+import sys
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,154 @@
+"""
+PrintSpooler against a stub print command that records each call and fails on demand.
+"""
+import json
+import sys
+import textwrap
+import time
+import pytest
+
+from print_spooler import PrintSpooler
+
+pytestmark = pytest.mark.skipif(sys.platform == 'win32', reason="Windows prints through the shell, not lp")
+
+STUB_LP = textwrap.dedent('''
+    import json, os, sys, time
+    start = time.monotonic()
+    files = sys.argv[1:]
+    counter = os.environ['STUB_LP_LOG'] + '.calls'
+    with open(counter, 'a') as f:
+        f.write('.')
+    call = os.path.getsize(counter)
+    time.sleep(float(os.environ.get('STUB_LP_DELAY', '0')))
+    failed = call <= int(os.environ.get('STUB_LP_FAIL_CALLS', '0')) or any(
+        os.environ.get('STUB_LP_FAIL_FILE', '\\0') in name for name in files)
+    with open(os.environ['STUB_LP_LOG'], 'a') as f:
+        f.write(json.dumps({'files': files, 'start': start, 'end': time.monotonic(), 'failed': failed}) + '\\n')
+    if failed:
+        sys.stderr.write('printer on fire')
+        sys.exit(1)
+''')
+
+
+@pytest.fixture
+def lp(tmp_path, monkeypatch):
+    """The stub print command; lp.calls() returns the calls it recorded, in the order they finished."""
+    script = tmp_path / 'lp.py'
+    script.write_text(STUB_LP)
+    log = tmp_path / 'lp.log'
+    monkeypatch.setenv('STUB_LP_LOG', str(log))
+
+    class Stub:
+        command = [sys.executable, str(script)]
+
+        @staticmethod
+        def calls():
+            return [json.loads(line) for line in log.read_text().splitlines()] if log.exists() else []
+
+    return Stub
+
+
+def _spooler(lp, **options):
+    options = {'batch_window': 0.2, 'retry_delay': 0.05, **options}
+    return PrintSpooler(lp.command, **options)
+
+
+def test_batches_files_into_one_call(lp):
+    spooler = _spooler(lp, batch_size=3)
+    for i in range(7):
+        spooler.submit(f'receipt-{i}.pdf')
+    assert spooler.wait(timeout=10)
+    batches = sorted(call['files'] for call in lp.calls())
+    assert batches == [['receipt-0.pdf', 'receipt-1.pdf', 'receipt-2.pdf'],
+                       ['receipt-3.pdf', 'receipt-4.pdf', 'receipt-5.pdf'], ['receipt-6.pdf']]
+    assert spooler.printed_count == 7
+    assert spooler.failures == []
+    spooler.shutdown()
+
+
+def test_caps_concurrent_calls(lp, monkeypatch):
+    monkeypatch.setenv('STUB_LP_DELAY', '0.4')
+    spooler = _spooler(lp, batch_size=1, max_concurrent_jobs=2)
+    for i in range(6):
+        spooler.submit(f'receipt-{i}.pdf')
+    assert spooler.wait(timeout=20)
+    events = sorted([(call['start'], 1) for call in lp.calls()] + [(call['end'], -1) for call in lp.calls()])
+    running, most = 0, 0
+    for _, change in events:
+        running += change
+        most = max(most, running)
+    assert len(lp.calls()) == 6
+    assert most == 2
+    spooler.shutdown()
+
+
+def test_retries_with_backoff(lp, monkeypatch):
+    monkeypatch.setenv('STUB_LP_FAIL_CALLS', '2')
+    spooler = _spooler(lp, batch_size=2, max_retries=3, retry_delay=0.2)
+    spooler.submit('a.pdf')
+    spooler.submit('b.pdf')
+    assert spooler.wait(timeout=10)
+    calls = lp.calls()
+    assert [call['failed'] for call in calls] == [True, True, False]
+    assert all(call['files'] == ['a.pdf', 'b.pdf'] for call in calls)
+    # The delay doubles after each failed attempt
+    assert calls[1]['start'] - calls[0]['end'] >= 0.2
+    assert calls[2]['start'] - calls[1]['end'] >= 0.4
+    assert spooler.printed_count == 2
+    assert spooler.failures == []
+    spooler.shutdown()
+
+
+def test_falls_back_to_one_file_per_call(lp, monkeypatch):
+    monkeypatch.setenv('STUB_LP_FAIL_FILE', 'bad')
+    failed = []
+    spooler = _spooler(lp, batch_size=3, max_retries=1, on_failure=failed.append)
+    for name in ('a.pdf', 'bad.pdf', 'c.pdf'):
+        spooler.submit(name)
+    assert spooler.wait(timeout=10)
+    batches = [call['files'] for call in lp.calls()]
+    # The batch, its retry, then each file on its own
+    assert batches[:2] == [['a.pdf', 'bad.pdf', 'c.pdf']] * 2
+    assert sorted(batches[2:]) == [['a.pdf'], ['bad.pdf'], ['c.pdf']]
+    assert spooler.printed_count == 2
+    assert [failure.files for failure in spooler.failures] == [['bad.pdf']]
+    assert 'printer on fire' in spooler.failures[0].error
+    assert failed == spooler.failures
+    spooler.clear_failures()
+    assert spooler.failures == []
+    spooler.shutdown()
+
+
+def test_pending_counts_queued_files(lp, monkeypatch):
+    monkeypatch.setenv('STUB_LP_DELAY', '0.3')
+    spooler = _spooler(lp, batch_size=2, max_concurrent_jobs=1)
+    for i in range(5):
+        spooler.submit(f'receipt-{i}.pdf')
+    assert spooler.pending == 5
+    assert spooler.wait(timeout=20)
+    assert spooler.pending == 0
+    assert spooler.printed_count == 5
+    spooler.shutdown()
+
+
+def test_shutdown_sends_queued_files_then_refuses_more(lp):
+    spooler = _spooler(lp, batch_size=10, batch_window=1)
+    spooler.submit('a.pdf')
+    spooler.shutdown()
+    assert [call['files'] for call in lp.calls()] == [['a.pdf']]
+    with pytest.raises(RuntimeError):
+        spooler.submit('b.pdf')
+
+
+def test_shutdown_abandons_jobs_after_timeout(lp, monkeypatch):
+    monkeypatch.setenv('STUB_LP_DELAY', '30')
+    failed = []
+    spooler = _spooler(lp, batch_size=1, max_retries=3, on_failure=failed.append)
+    spooler.submit('a.pdf')
+    spooler.submit('b.pdf')
+    started = time.monotonic()
+    assert spooler.shutdown(timeout=0.5) is False
+    assert time.monotonic() - started < 5
+    # The running print commands were killed rather than left to finish or retry
+    assert lp.calls() == []
+    assert failed == []
@@ -0,0 +1,50 @@
+"""
+ReceiptLedger imports: counts of new, updated and repeated payments, and receipt history.
+"""
+import pandas as pd
+import pytest
+
+from receipt_ledger import ReceiptLedger
+
+
+@pytest.fixture
+def ledger(tmp_path):
+    ledger = ReceiptLedger(str(tmp_path / 'ledger.sqlite3'))
+    yield ledger
+    ledger.close()
+
+
+def _payments(transaction_ids, name='Aarav Sharma'):
+    return pd.DataFrame({'Name': [name] * len(transaction_ids), 'Transaction ID': transaction_ids,
+                         'Status': ['Success'] * len(transaction_ids), 'Amount': [1000.0] * len(transaction_ids)})
+
+
+def test_import_counts(ledger):
+    result = ledger.import_frame(_payments(['T1', 'T2', 'T1', None]), 'june.xlsx')
+    assert (result.rows, result.added, result.updated, result.duplicates, result.skipped_rows) == (3, 2, 0, 1, 1)
+
+    result = ledger.import_frame(_payments(['T2', 'T3', 'T3', 'T3'], name='Riya Patel'), 'july.xlsx')
+    assert (result.rows, result.added, result.updated, result.duplicates, result.skipped_rows) == (4, 1, 1, 2, 0)
+    assert ledger.count() == 3
+    assert ledger.count('riya') == 2
+
+
+def test_import_workbook_counts_repeats_across_sheets(ledger, tmp_path):
+    path = tmp_path / 'fees.xlsx'
+    with pd.ExcelWriter(path) as writer:
+        _payments(['T1', 'T2']).to_excel(writer, sheet_name='June', index=False)
+        _payments(['T2', 'T3']).to_excel(writer, sheet_name='July', index=False)
+        pd.DataFrame({'Note': ['x']}).to_excel(writer, sheet_name='Notes', index=False)
+    ledger.import_frame(_payments(['T1']), 'earlier.xlsx')
+    result = ledger.import_workbook(str(path))
+    assert result.sheets == ['June', 'July'] and result.skipped_sheets == ['Notes']
+    assert (result.rows, result.added, result.updated, result.duplicates) == (4, 2, 1, 1)
+
+
+def test_history(ledger):
+    ledger.import_frame(_payments(['T1']), 'june.xlsx')
+    ledger.record_event(['T1'], 'generated', '/out/receipt_T1.pdf')
+    ledger.record_event(['T1'], 'printed', '/out/receipt_T1.pdf')
+    assert [(event, file_path) for event, file_path, _ in ledger.history('T1')] == [
+        ('generated', '/out/receipt_T1.pdf'), ('printed', '/out/receipt_T1.pdf')]
+    assert ledger.history('T2') == []
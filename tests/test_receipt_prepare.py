@@ -0,0 +1,82 @@
+"""
+prepare_receipts() must produce exactly the text receipt_field_values() gives
+row by row, since receipt digests (receipt_cache) are computed from it.
+"""
+import datetime
+import numpy as np
+import pandas as pd
+import pytest
+
+from pdf_generator import receipt_field_values
+from receipt_prepare import prepare_receipts
+from receipt_schema import RECEIPT_SCHEMA, apply_schema
+
+
+def _frame():
+    return pd.DataFrame({
+        'Name': ['Aarav Sharma', None, 'Zoë Fernández', 'D', ' '],
+        'Admission Number': [1.0, np.nan, 3.5, 1e20, 0.1 + 0.2],
+        'Class': pd.Categorical(['MBA', None, 'BCA', 'MBA', 'BBA']),
+        'Bank Reference ID': [5051686260, 2, 3, 2 ** 62, -5],
+        'Order ID': ['ORD1', 'ORD2', None, 'ORD4', 'ORD5'],
+        'Transaction ID': ['TXN1', '', 'TXN3', None, 'N/A'],
+        'Status': ['Success', 'failed', None, 'SUCCESS', 'Pending'],
+        'Amount': [65000.0, 97500.5, np.nan, float('inf'), -0.25],
+        'Date': pd.to_datetime(['2025-07-05', '2025-07-05 10:11:12', None, '2025-07-05 10:11:12.5',
+                                '2025-07-05'], format='mixed'),
+    })
+
+
+def _expected(df):
+    return [tuple(receipt_field_values(record)) for record in df.to_dict('records')]
+
+
+def _variants():
+    df = _frame()
+    text = df.copy()
+    text['Name'] = text['Name'].astype('string[pyarrow]')
+    text['Order ID'] = text['Order ID'].astype('string')
+    text['Amount'] = ['65,000', 'abc', None, '1', 2]
+    mixed = df.astype(object)
+    mixed.loc[0, 'Date'] = datetime.date(2025, 1, 2)
+    return [
+        pytest.param(df, id='numpy-dtypes'),
+        pytest.param(text, id='string-columns'),
+        pytest.param(mixed, id='object-columns'),
+        pytest.param(apply_schema(df.astype(object), RECEIPT_SCHEMA), id='receipt-schema'),
+        pytest.param(df.drop(columns=['Status', 'Date']), id='missing-columns'),
+        pytest.param(df.iloc[:0], id='empty'),
+        pytest.param(pd.DataFrame({'Amount': [np.nan, np.nan], 'Date': pd.to_datetime([None, None])}), id='all-missing'),
+    ]
+
+
+@pytest.mark.parametrize('df', _variants())
+def test_values_match_receipt_field_values(df):
+    assert prepare_receipts(df).values == _expected(df)
+
+
+def test_values_match_per_row_series():
+    df = _frame()
+    assert prepare_receipts(df).values == [tuple(receipt_field_values(df.iloc[i])) for i in range(len(df))]
+
+
+def test_flags_invalid_rows():
+    problems = prepare_receipts(_frame()).problems
+    assert 0 not in problems
+    assert problems[1] == ["Transaction ID is missing", "Status is 'failed'"]
+    assert problems[2] == ["Status is missing", "Amount is missing"]
+    assert problems[3] == ["Transaction ID is missing"]
+    assert problems[4] == ["Transaction ID is missing", "Status is 'Pending'"]
+
+
+def test_accepted_statuses():
+    df = _frame()
+    assert 4 in prepare_receipts(df).problems
+    problems = prepare_receipts(df, statuses=['success', 'Pending ']).problems
+    assert problems[4] == ["Transaction ID is missing"]
+
+
+def test_text_amounts():
+    df = pd.DataFrame({'Transaction ID': ['a', 'b', 'c'], 'Status': ['Success'] * 3,
+                       'Amount': ['65,000', ' 12.5 ', 'twelve']})
+    assert prepare_receipts(df).problems == {2: ["Amount 'twelve' is not a number"]}
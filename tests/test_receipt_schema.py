@@ -0,0 +1,39 @@
+"""
+Chunks converted with apply_schema one at a time must join into one frame with
+a single dtype per column, whatever each chunk inferred.
+"""
+import datetime
+import pandas as pd
+
+from excel_loader import iter_excel_chunks
+from receipt_schema import RECEIPT_SCHEMA, apply_schema, concat_frames
+
+
+def _chunks():
+    first = pd.DataFrame({'Name': ['Aarav Sharma', 'Riya Patel'], 'Class': ['MBA', 'BCA'],
+                          'Amount': [65000.0, 2.5], 'Date': [datetime.datetime(2025, 7, 5), None]}, dtype=object)
+    # Typed text in the number and date columns, a class the first chunk didn't have
+    second = pd.DataFrame({'Name': ['Kabir Singh', None], 'Class': ['BBA', None],
+                           'Amount': ['65,000', None], 'Date': ['5 July', None]}, dtype=object)
+    return [apply_schema(first, RECEIPT_SCHEMA), apply_schema(second, RECEIPT_SCHEMA)]
+
+
+def test_text_fallback_applies_to_every_chunk():
+    df = concat_frames(_chunks())
+    assert not (df.dtypes == object).any()
+    assert isinstance(df['Amount'].dtype, pd.StringDtype) and isinstance(df['Date'].dtype, pd.StringDtype)
+    assert df['Amount'].tolist()[:3] == ['65000', '2.5', '65,000']
+    assert df['Date'].tolist()[:3] == ['2025-07-05 00:00:00', pd.NA, '5 July']
+    assert list(df['Class'].cat.categories) == ['BCA', 'MBA', 'BBA']
+
+
+def test_chunked_load_matches_dtypes_of_whole_load(tmp_path):
+    path = tmp_path / 'fees.xlsx'
+    rows = [['Aarav Sharma', 'MBA', 65000, datetime.datetime(2025, 7, 5)]] * 3 + [['Riya Patel', 'BCA', '65,000', 'soon']]
+    pd.DataFrame(rows, columns=['Name', 'Class', 'Amount', 'Date']).to_excel(path, index=False)
+    chunks = [chunk for chunk, _, _ in iter_excel_chunks(str(path), chunk_size=2, first_chunk_size=None,
+                                                         use_cache=False)]
+    assert len(chunks) == 2
+    whole = [chunk for chunk, _, _ in iter_excel_chunks(str(path), chunk_size=100, first_chunk_size=None,
+                                                        use_cache=False)]
+    assert concat_frames(chunks).dtypes.tolist() == concat_frames(whole).dtypes.tolist()
@@ -0,0 +1,53 @@
+"""
+The canvas renderer must draw exactly what the platypus renderer draws.
+
+Each case is rendered by both templates, rasterized with PyMuPDF and compared
+pixel by pixel.
+"""
+import io
+import os
+import datetime
+import pytest
+
+fitz = pytest.importorskip('fitz')  # PyMuPDF
+
+from pdf_generator import ReceiptTemplate, CanvasReceiptTemplate  # noqa: E402
+
+RENDER_SAMPLES = [
+    {'Name': 'Aarav Sharma', 'Admission Number': 'ADM2025001', 'Class': 'BCA', 'Bank Reference ID': 'BR987654321',
+     'Order ID': 'ORD100001', 'Transaction ID': 'TXN500001', 'Status': 'Success', 'Amount': 65000,
+     'Date': datetime.datetime(2025, 9, 16)},
+    {'Name': 'Zoë Fernández-Núñez', 'Amount': 1234.5, 'Status': None, 'Date': '16/09/2025'},
+    {'Name': 'A' * 150, 'Admission Number': 0, 'Transaction ID': '(escaped) \\ chars', 'Amount': float('nan')},
+]
+# Resolution the pages are rasterized at for the comparison
+RENDER_CHECK_DPI = 150
+
+
+def _rasterize(pdf_bytes):
+    document = fitz.open(stream=pdf_bytes, filetype='pdf')
+    return [page.get_pixmap(dpi=RENDER_CHECK_DPI).samples for page in document]
+
+
+def _render(template, build_name, data):
+    buffer = io.BytesIO()
+    getattr(template, build_name)(data, buffer)
+    return _rasterize(buffer.getvalue())
+
+
+def _cases(tmp_dir):
+    missing_logo = os.path.join(tmp_dir, 'no-such-logo.jpg')
+    cases = [pytest.param({}, 'build', sample, id=f"sample-{i + 1}") for i, sample in enumerate(RENDER_SAMPLES)]
+    cases.append(pytest.param({}, 'build_many', RENDER_SAMPLES, id="multi-page"))
+    cases.append(pytest.param({'logo_left_path': missing_logo, 'logo_center_path': missing_logo}, 'build',
+                              RENDER_SAMPLES[0], id="no-logos"))
+    return cases
+
+
+@pytest.mark.parametrize('options, build_name, data', _cases(os.path.dirname(os.path.abspath(__file__))))
+def test_canvas_matches_platypus(options, build_name, data):
+    expected = _render(ReceiptTemplate(**options), build_name, data)
+    actual = _render(CanvasReceiptTemplate(**options), build_name, data)
+    assert len(actual) == len(expected)
+    for page, (a, b) in enumerate(zip(expected, actual), 1):
+        assert a == b, f"page {page}: {sum(x != y for x, y in zip(a, b))} of {len(a)} pixel bytes differ"
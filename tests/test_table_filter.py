@@ -0,0 +1,83 @@
+"""
+The lookup indexes updated from a reload diff must answer exactly like indexes
+built from scratch over the merged table.
+"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from table_filter import KeyLookupIndex, NameSearchIndex
+from workbook_diff import diff_frames, merged_frame
+
+NAMES = ['Aarav Sharma', 'Zoë Fernández', 'Riya Patel', 'Kabir Singh', None, 'riya patel']
+
+
+def _sheet(rng, transaction_ids):
+    count = len(transaction_ids)
+    return pd.DataFrame({
+        'Name': rng.choice(np.array(NAMES, dtype=object), count),
+        'Admission Number': rng.integers(1, 40, count).astype(float),
+        'Transaction ID': transaction_ids,
+        'Order ID': [f'ORD{value}' for value in rng.integers(1, 60, count)],
+        'Amount': rng.integers(1, 5, count) * 1000.0,
+    })
+
+
+def _edit(rng, df, next_id):
+    """A new version of the sheet: some rows dropped, some edited, some added, shuffled."""
+    df = df[rng.random(len(df)) > 0.2].copy()
+    edited = rng.random(len(df)) < 0.3
+    df.loc[edited, 'Name'] = rng.choice(np.array(NAMES, dtype=object), edited.sum())
+    df.loc[edited, 'Order ID'] = [f'ORD{value}' for value in rng.integers(1, 60, edited.sum())]
+    added = _sheet(rng, [f'TXN{next_id + i}' for i in range(rng.integers(0, 8))])
+    df = pd.concat([df, added], ignore_index=True)
+    return df.iloc[rng.permutation(len(df))].reset_index(drop=True)
+
+
+def _queries(df):
+    keys = pd.concat([df['Admission Number'], df['Transaction ID'], df['Order ID']]).dropna()
+    return sorted({str(key) for key in keys}) + ['12', 'TXN999', 'ORD', 'riya', 'aarav sharma']
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_incremental_indexes_match_rebuilt(seed):
+    rng = np.random.default_rng(seed)
+    df = _sheet(rng, [f'TXN{i}' for i in range(40)])
+    key_index, name_index = KeyLookupIndex(df), NameSearchIndex(df['Name'])
+    next_id = 40
+    for _ in range(6):
+        new_df = _edit(rng, df, next_id)
+        next_id += 8
+        diff = diff_frames(df, new_df)
+        merged = merged_frame(new_df, diff)
+        key_index.apply_diff(df, merged, diff)
+        name_index.apply_diff(merged['Name'], diff)
+        df = merged
+
+        rebuilt_keys, rebuilt_names = KeyLookupIndex(df), NameSearchIndex(df['Name'])
+        assert len(key_index) == len(rebuilt_keys) == len(df)
+        for query in _queries(df):
+            assert key_index.lookup(query).tolist() == rebuilt_keys.lookup(query).tolist(), query
+            assert sorted(key_index.closest(query)) == sorted(rebuilt_keys.closest(query)), query
+        for query in ['riya', 'SHARMA', 'zoe', 'fernández', 'k', '']:
+            assert np.array_equal(name_index.match(query), rebuilt_names.match(query)), query
+
+
+def test_lookup_after_removing_rows():
+    df = _sheet(np.random.default_rng(0), ['TXN0', 'TXN1', 'TXN2', 'TXN3'])
+    index = KeyLookupIndex(df)
+    new_df = df.drop(index=[0, 2]).reset_index(drop=True)
+    diff = diff_frames(df, new_df)
+    index.apply_diff(df, merged_frame(new_df, diff), diff)
+    assert index.lookup('TXN0').tolist() == []
+    assert index.lookup('txn1').tolist() == [0]
+    assert index.lookup('TXN3').tolist() == [1]
+
+
+@pytest.mark.parametrize('dtype', [object, 'string[pyarrow]', 'category'])
+def test_missing_names_match_nothing(dtype):
+    index = NameSearchIndex(pd.Series(['Aarav Sharma', None, 'Nora Noone'], dtype=dtype))
+    for query in ['na', 'no', 'n']:
+        assert 1 not in index.match(query).tolist(), query
+    assert index.match('no').tolist() == [2]
+    assert index.match('').tolist() == [0, 1, 2]
@@ -0,0 +1,104 @@
+"""
+Sidecars must come back with the dtypes they were stored with, and a workbook
+is only hashed again when its size or modification time changes.
+"""
+import os
+import pandas as pd
+import pytest
+
+pytest.importorskip('pyarrow')
+
+import workbook_cache
+from receipt_schema import RECEIPT_SCHEMA, apply_schema
+
+
+@pytest.fixture
+def cache_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(workbook_cache, 'CACHE_DIR', str(tmp_path / 'cache'))
+    monkeypatch.setattr(workbook_cache, '_content_hashes', None)
+    return tmp_path
+
+
+@pytest.fixture
+def hashed(monkeypatch):
+    """Records the files workbook_cache hashes."""
+    files = []
+    content_hash = workbook_cache._content_hash
+    monkeypatch.setattr(workbook_cache, '_content_hash', lambda path: files.append(path) or content_hash(path))
+    return files
+
+
+def _workbook(directory, text='a,b\n1,2\n'):
+    path = directory / 'fees.csv'
+    path.write_text(text)
+    return str(path)
+
+
+def test_round_trip_keeps_dtypes(cache_dir):
+    path = _workbook(cache_dir)
+    df = apply_schema(pd.DataFrame({
+        'Name': ['Aarav Sharma', None],
+        'Class': ['MBA', 'BCA'],
+        'Amount': [65000.0, None],
+        'Date': pd.to_datetime(['2025-07-05', None]),
+    }), RECEIPT_SCHEMA)
+    df['Note'] = ['paid', None]
+    assert workbook_cache.store(path, df)
+    cached = workbook_cache.load_cached(path)
+    assert cached.dtypes.astype(str).tolist() == df.dtypes.astype(str).tolist()
+    assert type(cached['Name'].array) is type(df['Name'].array)
+    pd.testing.assert_frame_equal(cached, df)
+
+
+def test_hashes_only_changed_files(cache_dir, hashed):
+    path = _workbook(cache_dir)
+    key = workbook_cache.cache_key(path)
+    assert workbook_cache.cache_key(path) == key
+    assert workbook_cache.cache_key(path, variant='compact') != key
+    assert len(hashed) == 1
+
+    # The recorded hash outlives the process
+    workbook_cache._content_hashes = None
+    assert workbook_cache.cache_key(path) == key
+    assert len(hashed) == 1
+
+    # Saved again without changes: hashed again, same key
+    os.utime(path, ns=(0, 12345))
+    assert workbook_cache.cache_key(path) == key
+    assert len(hashed) == 2
+
+    _workbook(cache_dir, 'a,b\n1,3\n')
+    assert workbook_cache.cache_key(path) != key
+    assert len(hashed) == 3
+
+
+def test_clear_cache(cache_dir):
+    path = _workbook(cache_dir)
+    workbook_cache.store(path, pd.DataFrame({'a': [1]}))
+    assert workbook_cache.clear_cache() == 1
+    assert not os.path.exists(workbook_cache._index_path())
+    assert workbook_cache.load_cached(path) is None
+
+
+def test_eviction_prunes_the_index(cache_dir):
+    frame = pd.DataFrame({'a': range(1000)})
+    paths = []
+    for i in range(3):
+        path = cache_dir / f'fees-{i}.csv'
+        path.write_text(f'a\n{i}\n')
+        paths.append(str(path))
+        workbook_cache.store(str(path), frame)
+        workbook_cache.store(str(path), frame, key=workbook_cache.cache_key(str(path), variant='compact'))
+        # Distinct modification times, oldest first
+        for entry in workbook_cache._sidecars():
+            if entry.name.startswith(workbook_cache._content_hashes[os.path.abspath(path)][1]):
+                os.utime(entry.path, (i, i))
+    assert len(workbook_cache._load_content_hashes()) == 3
+
+    # Room for the newest workbook's two sidecars only
+    size = max(entry.stat().st_size for entry in workbook_cache._sidecars())
+    workbook_cache.evict(max_bytes=2 * size)
+    assert sorted(workbook_cache._load_content_hashes()) == [os.path.abspath(paths[2])]
+    workbook_cache._content_hashes = None
+    assert sorted(workbook_cache._load_content_hashes()) == [os.path.abspath(paths[2])]
+    assert workbook_cache.load_cached(paths[2]) is not None
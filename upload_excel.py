@@ -1,8 +1,9 @@
 from PyQt5.QtWidgets import QFileDialog
-import pandas as pd
 
 
 def upload_file(parent):
+    # Imported here: excel_loader loads pandas, which the window doesn't need before the first upload
+    from excel_loader import file_dialog_filter
     file_dialog = QFileDialog()
-    file_path, _ = file_dialog.getOpenFileName(parent, "Open Excel File", "", "Excel Files (*.xlsx *.xls)")
+    file_path, _ = file_dialog.getOpenFileName(parent, "Open Excel or CSV File", "", file_dialog_filter())
     return file_path
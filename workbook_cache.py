@@ -0,0 +1,200 @@
+import os
+import sys
+import json
+import hashlib
+
+# Parsed workbooks are kept as Arrow IPC (Feather) files in this directory.
+CACHE_DIR = os.environ.get('FEE_RECEIPT_CACHE_DIR') or os.path.join(
+    os.environ.get('LOCALAPPDATA') or os.path.join(os.path.expanduser('~'), '.cache'), 'fee-receipt-manager', 'workbooks')
+# Once the sidecars together exceed this size, the least recently used ones are removed.
+MAX_CACHE_BYTES = int(os.environ.get('FEE_RECEIPT_CACHE_MAX_BYTES', 512 * 1024 * 1024))
+
+_SIDECAR_EXT = '.arrow'
+# Maps each workbook's path, size and modification time to its content hash, so unchanged files are not re-read
+_INDEX_NAME = 'content-hashes.json'
+_content_hashes = None  # The index, loaded on first use
+
+
+def _pyarrow_feather():
+    """Returns pyarrow.feather, or None if pyarrow is not installed (the cache is then disabled)."""
+    try:
+        from pyarrow import feather
+        return feather
+    except ImportError:
+        return None
+
+
+def _content_hash(file_path):
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _index_path():
+    return os.path.join(CACHE_DIR, _INDEX_NAME)
+
+
+def _load_content_hashes():
+    global _content_hashes
+    if _content_hashes is None:
+        try:
+            with open(_index_path(), encoding='utf-8') as f:
+                _content_hashes = json.load(f)
+        except (OSError, ValueError):
+            _content_hashes = {}
+    return _content_hashes
+
+
+def _save_content_hashes():
+    tmp_path = _index_path() + '.tmp'
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(_content_hashes, f)
+        os.replace(tmp_path, _index_path())
+    except OSError as e:
+        print(f"CACHE_WARNING: Could not save the cache index. Reason: {e}", file=sys.stderr)
+
+
+def cache_key(file_path, variant=''):
+    """
+    Builds the cache key from the file's content hash.
+
+    The file is only hashed when its path, size or modification time differ from
+    the last time it was seen; otherwise the recorded hash is reused. A file
+    that was saved again without changes still finds its sidecar.
+
+    variant tells apart differently parsed copies of the same file (e.g. only some columns).
+    """
+    path = os.path.abspath(file_path)
+    stat = os.stat(path)
+    signature = f"{stat.st_size}|{stat.st_mtime_ns}"
+    hashes = _load_content_hashes()
+    entry = hashes.get(path)
+    if entry is None or entry[0] != signature:
+        entry = hashes[path] = [signature, _content_hash(path)]
+        _save_content_hashes()
+    # The sidecar's name starts with the content hash, so eviction can tell which index entries it served
+    if not variant:
+        return entry[1]
+    return f"{entry[1]}-{hashlib.sha256(variant.encode('utf-8')).hexdigest()[:16]}"
+
+
+def _sidecar_path(key):
+    return os.path.join(CACHE_DIR, key + _SIDECAR_EXT)
+
+
+def load_cached(file_path, key=None):
+    """
+    Returns the DataFrame cached for this exact file, or None on a cache miss.
+
+    The sidecar is memory-mapped, and Arrow-backed text columns (string[pyarrow])
+    keep pointing into the mapping instead of being copied; other columns are
+    converted one at a time, releasing the Arrow data as they go.
+    """
+    feather = _pyarrow_feather()
+    if feather is None:
+        return None
+
+    # Deferred like pyarrow: main.py imports this module before the first window is shown
+    import pandas as pd
+    import pyarrow as pa
+
+    path = _sidecar_path(key or cache_key(file_path))
+    if not os.path.exists(path):
+        return None
+    try:
+        # pandas writes string[pyarrow] columns as large_string; map them back without converting each value
+        df = feather.read_table(path, memory_map=True).to_pandas(
+            split_blocks=True, self_destruct=True, types_mapper={pa.large_string(): pd.StringDtype('pyarrow')}.get)
+    except Exception as e:
+        print(f"CACHE_WARNING: Ignoring unreadable cache file '{path}'. Reason: {e}", file=sys.stderr)
+        return None
+    # Touch the sidecar so eviction treats it as recently used
+    os.utime(path)
+    return df
+
+
+def store(file_path, df, key=None):
+    """Writes a parsed workbook to the cache. Returns True if it was stored."""
+    feather = _pyarrow_feather()
+    if feather is None:
+        return False
+
+    path = _sidecar_path(key or cache_key(file_path))
+    tmp_path = path + '.tmp'
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        # Arrow needs string column names; uncompressed files can be memory-mapped directly
+        frame = df.rename(columns=str).reset_index(drop=True)
+        feather.write_feather(frame, tmp_path, compression='uncompressed')
+        os.replace(tmp_path, path)
+    except Exception as e:
+        # e.g. a column mixing numbers and text cannot be stored as Arrow
+        print(f"CACHE_WARNING: Could not cache '{os.path.basename(file_path)}'. Reason: {e}", file=sys.stderr)
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        return False
+
+    evict()
+    return True
+
+
+def _sidecars():
+    if not os.path.isdir(CACHE_DIR):
+        return []
+    return [entry for entry in os.scandir(CACHE_DIR) if entry.is_file() and entry.name.endswith(_SIDECAR_EXT)]
+
+
+def _remove(path):
+    """Deletes a sidecar; returns False if it is still open (Windows keeps memory-mapped files locked)."""
+    try:
+        os.remove(path)
+        return True
+    except OSError as e:
+        print(f"CACHE_WARNING: Could not remove cache file '{path}'. Reason: {e}", file=sys.stderr)
+        return False
+
+
+def _prune_content_hashes():
+    """Drops the index entries of workbooks that no longer have a sidecar."""
+    cached = {entry.name[:-len(_SIDECAR_EXT)].split('-')[0] for entry in _sidecars()}
+    hashes = _load_content_hashes()
+    stale = [path for path, (_, content_hash) in hashes.items() if content_hash not in cached]
+    for path in stale:
+        del hashes[path]
+    if stale:
+        _save_content_hashes()
+
+
+def evict(max_bytes=None):
+    """
+    Removes the least recently used sidecars until the cache fits in max_bytes,
+    and forgets the content hashes of workbooks left without a sidecar.
+    """
+    max_bytes = MAX_CACHE_BYTES if max_bytes is None else max_bytes
+    entries = sorted(_sidecars(), key=lambda entry: entry.stat().st_mtime)
+    total = sum(entry.stat().st_size for entry in entries)
+    for entry in entries:
+        if total <= max_bytes:
+            break
+        size = entry.stat().st_size
+        if _remove(entry.path):
+            total -= size
+    _prune_content_hashes()
+
+
+def clear_cache():
+    """Deletes every cached workbook and the content hash index. Returns the number of sidecars removed."""
+    global _content_hashes
+    removed = sum(_remove(entry.path) for entry in _sidecars())
+    _content_hashes = {}
+    try:
+        os.remove(_index_path())
+    except FileNotFoundError:
+        pass
+    except OSError as e:
+        print(f"CACHE_WARNING: Could not remove the cache index. Reason: {e}", file=sys.stderr)
+    return removed
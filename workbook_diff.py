@@ -0,0 +1,124 @@
+"""
+Row-level differences between two versions of the same fee sheet.
+
+Rows are matched on a stable key column (e.g. 'Transaction ID'), so a
+re-exported sheet can be applied to the table as a few inserts, updates and
+removals instead of replacing every row.
+"""
+from collections import namedtuple
+import numpy as np
+import pandas as pd
+
+# Columns that identify a payment, in order of preference
+KEY_COLUMNS = ['Transaction ID', 'Order ID']
+
+# removed: positions in the old frame that are gone from the new one.
+# updated: positions in the old frame whose values changed.
+# kept: for every old row that is still present (in old order), its position in the new frame.
+# added: positions in the new frame of rows that were not in the old one.
+WorkbookDiff = namedtuple('WorkbookDiff', ['key_column', 'removed', 'updated', 'kept', 'added'])
+
+
+def _keys(df, key_column):
+    """Returns the key column as an Index, or None if it is missing or not a usable key."""
+    if key_column not in df.columns:
+        return None
+    keys = pd.Index(df[key_column])
+    if keys.hasnans or keys.has_duplicates:
+        return None
+    return keys
+
+
+def find_key_column(df, candidates=KEY_COLUMNS):
+    """
+    Returns the first candidate column whose values are present and unique in df.
+
+    Returns:
+        str | None: The column name, or None if no candidate can identify rows.
+    """
+    for column in candidates:
+        if _keys(df, column) is not None:
+            return column
+    return None
+
+
+def diff_frames(old_df, new_df, key_column=None):
+    """
+    Compares two versions of a sheet row by row, matching rows on key_column.
+
+    Every step is vectorized, so the cost is a few passes over the columns
+    rather than Python work per row.
+
+    Args:
+        old_df (pd.DataFrame): The rows currently shown.
+        new_df (pd.DataFrame): The freshly read sheet.
+        key_column (str, optional): The column to match rows on. Defaults to the
+                                    first usable column in KEY_COLUMNS.
+    Returns:
+        WorkbookDiff | None: The changes, or None if the two frames cannot be matched
+                             row by row (different columns, or no unique key).
+    """
+    if list(old_df.columns) != list(new_df.columns):
+        return None
+    key_column = key_column or find_key_column(new_df)
+    if key_column is None:
+        return None
+    old_keys = _keys(old_df, key_column)
+    new_keys = _keys(new_df, key_column)
+    if old_keys is None or new_keys is None:
+        return None
+
+    # New position of every old row, -1 where the key is gone
+    positions = new_keys.get_indexer(old_keys)
+    removed = np.flatnonzero(positions < 0)
+    kept_old = np.flatnonzero(positions >= 0)
+    kept = positions[kept_old]
+
+    is_new = np.ones(len(new_df), dtype=bool)
+    is_new[kept] = False
+    added = np.flatnonzero(is_new)
+
+    # Compare the matched rows column by column; NaN counts as equal to NaN
+    old_values = old_df.iloc[kept_old].reset_index(drop=True)
+    new_values = new_df.iloc[kept].reset_index(drop=True)
+    changed = np.zeros(len(kept_old), dtype=bool)
+    for column in old_df.columns:
+        a, b = old_values[column], new_values[column]
+        try:
+            equal = (a == b) | (a.isna() & b.isna())
+        except TypeError:
+            # e.g. categoricals with different categories; compare what the table shows
+            equal = a.astype(str) == b.astype(str)
+        changed |= ~equal.to_numpy(dtype=bool)
+    updated = kept_old[changed]
+
+    return WorkbookDiff(key_column, removed, updated, kept, added)
+
+
+def is_empty(diff):
+    """Returns True if the diff has no changes to apply."""
+    return not (len(diff.removed) or len(diff.updated) or len(diff.added))
+
+
+def merged_frame(new_df, diff):
+    """
+    Returns the new sheet's rows in table order: surviving rows keep their old
+    order and the added rows follow at the end.
+    """
+    order = np.concatenate([diff.kept, diff.added])
+    return new_df.iloc[order].reset_index(drop=True)
+
+
+def runs(positions):
+    """
+    Splits sorted positions into (first, last) runs of consecutive values.
+
+    Returns:
+        list: [(first, last), ...] in ascending order.
+    """
+    if len(positions) == 0:
+        return []
+    breaks = np.flatnonzero(np.diff(positions) != 1) + 1
+    starts = np.concatenate([[0], breaks])
+    ends = np.concatenate([breaks - 1, [len(positions) - 1]])
+    return [(int(positions[s]), int(positions[e])) for s, e in zip(starts, ends)]